@@ -2,39 +2,113 @@
 Database connection and session management
 """
 import os
+import time
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 
+from metrics import metrics
+
 # .env 파일 로드
 load_dotenv()
 
 # 데이터베이스 URL 가져오기
 DATABASE_URL = os.getenv("DB_URL", "sqlite:///./analysis_records.db")
 
+# 연결 풀 설정 (동기/비동기 엔진 각각에 적용)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))  # 연결 풀 크기
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))  # 풀 크기를 넘어 추가로 허용할 연결 수
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # 연결을 얻기까지 최대 대기 시간 (초)
+
+# 비동기 드라이버 (PostgreSQL: asyncpg, SQLite: aiosqlite)
+_ASYNC_DRIVERS = {"postgresql": "asyncpg", "postgres": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def to_async_url(url: str) -> str:
+    """동기 DB URL을 비동기 드라이버 URL로 변환 (postgresql://… → postgresql+asyncpg://…)"""
+    scheme, rest = url.split("://", 1)
+    dialect = scheme.split("+", 1)[0]
+    driver = _ASYNC_DRIVERS.get(dialect)
+    if driver is None:
+        return url
+    if dialect == "postgres":
+        dialect = "postgresql"
+    return f"{dialect}+{driver}://{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DB_URL", to_async_url(DATABASE_URL))
+
+
+class _PoolWaitTimer:
+    """커넥션 획득에 걸린 시간(풀 대기 + 새 연결 생성)을 메트릭으로 기록"""
+    wait_metric = "db_pool_wait_ms"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe(self.wait_metric, (time.perf_counter() - start) * 1000)
+
+
+class TimedQueuePool(_PoolWaitTimer, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(_PoolWaitTimer, AsyncAdaptedQueuePool):
+    wait_metric = "db_async_pool_wait_ms"
+
+
+_pool_options = dict(
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+
 # SQLAlchemy 엔진 생성 (PostgreSQL 연결 풀 설정)
 if "postgresql" in DATABASE_URL or "postgres" in DATABASE_URL:
     # PostgreSQL 연결 풀 설정
     engine = create_engine(
         DATABASE_URL,
-        pool_size=10,  # 연결 풀 크기
-        max_overflow=20,  # 추가 연결 허용
+        poolclass=TimedQueuePool,
         pool_pre_ping=True,  # 연결 유효성 검사 (자동 재연결)
         pool_recycle=3600,  # 1시간마다 연결 재생성
-        echo=False  # SQL 쿼리 로깅 (개발 시 True로 설정 가능)
+        echo=False,  # SQL 쿼리 로깅 (개발 시 True로 설정 가능)
+        **_pool_options
+    )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=TimedAsyncQueuePool,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        echo=False,
+        **_pool_options
     )
 else:
     # SQLite 설정
     engine = create_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False},
-        echo=False
+        poolclass=TimedQueuePool,
+        echo=False,
+        **_pool_options
+    )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        poolclass=TimedAsyncQueuePool,
+        echo=False,
+        **_pool_options
     )
 
 # 세션 로컬 클래스 생성
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 비동기 세션 (커밋 후에도 속성을 다시 읽지 않도록 expire_on_commit=False)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base 클래스 생성 (모든 모델이 상속받을 베이스)
 Base = declarative_base()
 
@@ -51,11 +125,42 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """
+    비동기 데이터베이스 세션 의존성
+    쿼리 중에도 이벤트 루프를 막지 않는다 (엔드포인트에서 await로 사용)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_stats() -> dict:
+    """동기/비동기 연결 풀 상태"""
+    def describe(pool) -> dict:
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "timeout": DB_POOL_TIMEOUT,
+        }
+    return {"sync": describe(engine.pool), "async": describe(async_engine.sync_engine.pool)}
+
+
+async def close_db():
+    """
+    연결 풀 정리 (서버 종료 시)
+    aiosqlite 연결은 각각 스레드를 가지므로 닫지 않으면 프로세스가 종료되지 않을 수 있음
+    """
+    await async_engine.dispose()
+    engine.dispose()
+
+
 def init_db():
     """
     데이터베이스 초기화
     모든 테이블 생성
     """
-    from models import AnalysisRecord  # 순환 import 방지
+    from models import AnalysisRecord, AnalysisImage, Document, Job, PromptText  # 순환 import 방지
     Base.metadata.create_all(bind=engine)
 
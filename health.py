@@ -0,0 +1,176 @@
+"""
+헬스 상태 스냅샷
+백그라운드 폴러가 주기적으로 Ollama 노드 상태, 로드된 모델, 대기열 길이, DB 연결을 모아
+메모리 스냅샷으로 보관하고, /health 계열 엔드포인트는 이 스냅샷만 읽어 즉시 응답한다.
+"""
+import os
+import time
+import asyncio
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from database import async_engine
+from jobs import job_queue
+from model_routing import MODEL_NAME
+from ollama_client import ollama_client, model_matches
+from scheduler import ollama_scheduler
+from warmup import model_warmer
+
+# .env 파일 로드
+load_dotenv()
+
+# 헬스 폴러 설정
+HEALTH_POLL_INTERVAL = float(os.getenv("HEALTH_POLL_INTERVAL", "5"))  # 스냅샷 갱신 주기 (초)
+HEALTH_STALE_SECONDS = float(os.getenv("HEALTH_STALE_SECONDS", "30"))  # 이보다 오래된 스냅샷은 비정상
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "3"))
+
+
+async def _check_db() -> None:
+    """DB 연결 확인"""
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+class HealthMonitor:
+    """
+    주기적으로 갱신되는 헬스 스냅샷
+
+    Ollama 노드 상태는 OllamaPool의 능동 점검 결과를 그대로 사용하므로
+    프로브 횟수와 관계없이 Ollama로 가는 점검 요청은 폴링 주기당 한 번뿐이다.
+    """
+
+    def __init__(self, interval: float = HEALTH_POLL_INTERVAL, stale_seconds: float = HEALTH_STALE_SECONDS):
+        self.interval = interval
+        self.stale_seconds = stale_seconds
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._updated_at: Optional[float] = None  # monotonic
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None  # 주기를 기다리지 않고 바로 갱신 (이벤트 루프 안에서 생성)
+
+    async def refresh(self):
+        """스냅샷 갱신"""
+        if ollama_client.health_interval <= 0 or self._snapshot is None:
+            # 노드 능동 점검이 꺼져 있거나 첫 스냅샷이면 폴러가 직접 점검
+            await asyncio.gather(*(ollama_client.check(b) for b in ollama_client.backends))
+
+        db_error = None
+        try:
+            await asyncio.wait_for(_check_db(), timeout=HEALTH_DB_TIMEOUT)
+        except asyncio.TimeoutError:
+            db_error = "DB 응답 시간 초과"
+        except Exception as e:
+            db_error = str(e)
+
+        backends = ollama_client.stats()
+        reachable = [b for b in backends if b["available"] and b["available_models"] is not None]
+        available_models = sorted({m for b in reachable for m in b["available_models"]})
+        loaded_models = sorted({m for b in reachable for m in b["loaded_models"]})
+        scheduler = ollama_scheduler.stats()
+
+        self._snapshot = {
+            "ollama_connected": bool(reachable),
+            "model_installed": model_matches(MODEL_NAME, set(available_models)),
+            "model_resident": model_matches(MODEL_NAME, set(loaded_models)),
+            "available_models": available_models,
+            "loaded_models": loaded_models,
+            "backends": backends,
+            "db_connected": db_error is None,
+            "db_error": db_error,
+            "scheduler_queue": scheduler["queued"],
+            "scheduler_queue_full": scheduler["queued"] >= scheduler["max_queue"],
+            "scheduler_active": scheduler["active"],
+            "job_queue": job_queue.depth(),
+            "warmup_ready": model_warmer.ready(),
+            "checked_at": time.time(),
+        }
+        self._updated_at = time.monotonic()
+
+    async def _loop(self):
+        while True:
+            self._wake.clear()
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️  헬스 스냅샷 갱신 실패: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def request_refresh(self):
+        """다음 주기를 기다리지 않고 스냅샷 갱신 (예열 완료 등 상태가 바뀐 직후)"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        """폴러 시작 (lifespan에서 호출)"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            # 예열이 끝나면 바로 갱신하여 readiness가 한 주기 동안 warming으로 남지 않도록
+            model_warmer.on_ready(self.request_refresh)
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def age(self) -> Optional[float]:
+        """스냅샷 경과 시간 (초, 아직 없으면 None)"""
+        if self._updated_at is None:
+            return None
+        return time.monotonic() - self._updated_at
+
+    def is_stale(self) -> bool:
+        age = self.age()
+        return age is None or age > self.stale_seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """마지막 스냅샷 + 경과 시간"""
+        age = self.age()
+        return {
+            **(self._snapshot or {}),
+            "snapshot_age_seconds": round(age, 3) if age is not None else None,
+        }
+
+    def liveness(self) -> Dict[str, Any]:
+        """프로세스 생존 여부 (폴러가 멈추지 않았는지)"""
+        age = self.age()
+        # 첫 스냅샷 전(시작 직후)은 살아 있는 것으로 본다
+        alive = age is None or age <= self.stale_seconds
+        return {
+            "status": "alive" if alive else "stalled",
+            "snapshot_age_seconds": round(age, 3) if age is not None else None,
+        }
+
+    def readiness(self) -> Dict[str, Any]:
+        """트래픽 수신 가능 여부와 불가 사유"""
+        snapshot = self.snapshot()
+        reasons = []
+        if self._snapshot is None:
+            reasons.append("starting")
+        else:
+            if self.is_stale():
+                reasons.append("stale_snapshot")
+            if not snapshot["ollama_connected"]:
+                reasons.append("ollama_unreachable")
+            if not snapshot["db_connected"]:
+                reasons.append("db_unreachable")
+            if not snapshot["warmup_ready"]:
+                reasons.append("warming")
+            if snapshot["scheduler_queue_full"]:
+                reasons.append("queue_full")
+        if not reasons:
+            status = "ready"
+        elif reasons == ["warming"]:
+            status = "warming"
+        else:
+            status = "not_ready"
+        return {"status": status, "ready": not reasons, "reasons": reasons, **snapshot}
+
+
+# 서버 전역 헬스 모니터
+health_monitor = HealthMonitor()
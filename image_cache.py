@@ -0,0 +1,245 @@
+"""
+이미지 캐시 (메모리 LRU + 선택적 디스크 계층)
+URL로 조회하고 SHA-256 콘텐츠 해시로 중복을 제거하며,
+검증과 base64 인코딩이 끝난 페이로드를 저장해 캐시 히트 시 다운로드/검증/인코딩을 모두 건너뛴다.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+# .env 파일 로드
+load_dotenv()
+
+# 캐시 설정
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_MEMORY_BYTES = int(os.getenv("IMAGE_CACHE_MEMORY_BYTES", str(256 * 1024 * 1024)))  # 기본 256MB
+IMAGE_CACHE_MAX_URLS = int(os.getenv("IMAGE_CACHE_MAX_URLS", "10000"))
+IMAGE_CACHE_FRESH_SECONDS = float(os.getenv("IMAGE_CACHE_FRESH_SECONDS", "300"))  # 재검증 없이 사용할 시간
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "")  # 비어 있으면 디스크 계층 비활성화
+IMAGE_CACHE_DISK_BYTES = int(os.getenv("IMAGE_CACHE_DISK_BYTES", str(2 * 1024 * 1024 * 1024)))  # 기본 2GB
+
+
+def sha256_hex(data: bytes) -> str:
+    """콘텐츠 해시 (캐시 키)"""
+    return hashlib.sha256(data).hexdigest()
+
+
+@dataclass
+class CachedImage:
+    """검증 및 인코딩이 끝난 이미지 페이로드"""
+    sha256: str
+    image_base64: str
+    size: int  # 원본 바이트 수
+    processed_size: int = 0  # 전처리 후 바이트 수 (Ollama로 전송되는 크기)
+    # 검증 단계 메타데이터 (원본 기준)
+    format: str = ""
+    width: int = 0
+    height: int = 0
+    mode: str = ""
+
+
+@dataclass
+class UrlEntry:
+    """URL → 콘텐츠 해시 매핑과 재검증 정보"""
+    sha256: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    validated_at: float = 0.0
+
+    def is_fresh(self, fresh_seconds: float = IMAGE_CACHE_FRESH_SECONDS) -> bool:
+        return time.time() - self.validated_at < fresh_seconds
+
+
+class _DiskTier:
+    """
+    디스크 계층
+    blobs/<sha256>.b64 에 메타데이터 헤더(JSON 한 줄)와 페이로드, urls/<sha256(url)>.json 에 URL 매핑을 저장한다.
+    모든 메서드는 블로킹 I/O이므로 asyncio.to_thread로 호출한다.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.blob_dir = os.path.join(directory, "blobs")
+        self.url_dir = os.path.join(directory, "urls")
+        self.max_bytes = max_bytes
+        os.makedirs(self.blob_dir, exist_ok=True)
+        os.makedirs(self.url_dir, exist_ok=True)
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, f"{sha256}.b64")
+
+    def _url_path(self, url: str) -> str:
+        return os.path.join(self.url_dir, f"{sha256_hex(url.encode())}.json")
+
+    def get_url(self, url: str) -> Optional[UrlEntry]:
+        try:
+            with open(self._url_path(url), "r", encoding="utf-8") as f:
+                return UrlEntry(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def put_url(self, url: str, entry: UrlEntry):
+        path = self._url_path(url)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(entry), f)
+        os.replace(tmp_path, path)
+
+    def get_blob(self, sha256: str) -> Optional[CachedImage]:
+        path = self._blob_path(sha256)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                image_base64 = f.read()
+            os.utime(path)  # LRU 순서 갱신
+            return CachedImage(sha256=sha256, image_base64=image_base64, **header)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def put_blob(self, image: CachedImage):
+        path = self._blob_path(image.sha256)
+        if os.path.exists(path):
+            os.utime(path)
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            header = {k: v for k, v in asdict(image).items() if k not in ("sha256", "image_base64")}
+            f.write(json.dumps(header) + "\n")
+            f.write(image.image_base64)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        """용량 초과 시 가장 오래 사용되지 않은 blob부터 삭제"""
+        entries = []
+        total = 0
+        with os.scandir(self.blob_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".b64"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class ImageCache:
+    """
+    URL 및 콘텐츠 해시 기반 이미지 캐시
+
+    - 메모리 계층: 페이로드를 sha256 키로 보관하고 바이트 예산 기준으로 LRU 제거
+    - 디스크 계층: IMAGE_CACHE_DIR 설정 시 활성화, 메모리에서 밀려난 항목을 보관
+    - 같은 콘텐츠를 가리키는 여러 URL은 하나의 페이로드를 공유
+    """
+
+    def __init__(
+        self,
+        memory_bytes: int = IMAGE_CACHE_MEMORY_BYTES,
+        max_urls: int = IMAGE_CACHE_MAX_URLS,
+        directory: str = IMAGE_CACHE_DIR,
+        disk_bytes: int = IMAGE_CACHE_DISK_BYTES,
+    ):
+        self.memory_bytes = memory_bytes
+        self.max_urls = max_urls
+        self._urls: "OrderedDict[str, UrlEntry]" = OrderedDict()
+        self._blobs: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self._memory_used = 0
+        self._disk = _DiskTier(directory, disk_bytes) if directory else None
+
+    async def get_url(self, url: str) -> Optional[UrlEntry]:
+        """URL 매핑 조회"""
+        entry = self._urls.get(url)
+        if entry is not None:
+            self._urls.move_to_end(url)
+            return entry
+        if self._disk is not None:
+            entry = await asyncio.to_thread(self._disk.get_url, url)
+            if entry is not None:
+                self._remember_url(url, entry)
+        return entry
+
+    async def get_blob(self, sha256: str) -> Optional[CachedImage]:
+        """콘텐츠 해시로 페이로드 조회"""
+        image = self._blobs.get(sha256)
+        if image is not None:
+            self._blobs.move_to_end(sha256)
+            metrics.inc("image_cache_memory_hits")
+            return image
+        if self._disk is not None:
+            image = await asyncio.to_thread(self._disk.get_blob, sha256)
+            if image is not None:
+                metrics.inc("image_cache_disk_hits")
+                self._remember_blob(image)
+        return image
+
+    async def put(self, url: str, entry: UrlEntry, image: CachedImage):
+        """URL 매핑과 페이로드 저장"""
+        self._remember_url(url, entry)
+        self._remember_blob(image)
+        if self._disk is not None:
+            try:
+                await asyncio.to_thread(self._disk.put_blob, image)
+                await asyncio.to_thread(self._disk.put_url, url, entry)
+            except OSError as e:
+                print(f"⚠️  이미지 디스크 캐시 저장 실패: {e}")
+
+    async def revalidated(self, url: str, entry: UrlEntry):
+        """304 응답 후 재검증 시각 갱신"""
+        entry.validated_at = time.time()
+        self._remember_url(url, entry)
+        if self._disk is not None:
+            try:
+                await asyncio.to_thread(self._disk.put_url, url, entry)
+            except OSError:
+                pass
+
+    def _remember_url(self, url: str, entry: UrlEntry):
+        self._urls[url] = entry
+        self._urls.move_to_end(url)
+        while len(self._urls) > self.max_urls:
+            self._urls.popitem(last=False)
+
+    def _remember_blob(self, image: CachedImage):
+        if image.sha256 in self._blobs:
+            self._blobs.move_to_end(image.sha256)
+            return
+        cost = len(image.image_base64)
+        if cost > self.memory_bytes:
+            return
+        self._blobs[image.sha256] = image
+        self._memory_used += cost
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._blobs.popitem(last=False)
+            self._memory_used -= len(evicted.image_base64)
+            metrics.inc("image_cache_evictions")
+
+    def stats(self) -> dict:
+        """캐시 상태"""
+        return {
+            "urls": len(self._urls),
+            "blobs": len(self._blobs),
+            "memory_bytes": self._memory_used,
+            "memory_budget": self.memory_bytes,
+            "disk_enabled": self._disk is not None,
+        }
+
+
+# 서버 전역 이미지 캐시
+image_cache = ImageCache()
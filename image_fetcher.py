@@ -0,0 +1,208 @@
+"""
+비동기 이미지 다운로더
+호스트별 커넥션 풀을 재사용하고, 응답 본문을 크기 제한이 있는 버퍼로 스트리밍한다.
+"""
+import os
+import time
+import asyncio
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Optional
+
+import httpx
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+# .env 파일 로드
+load_dotenv()
+
+# 다운로드 제한 설정
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))  # 기본 20MB
+IMAGE_CONNECT_TIMEOUT = float(os.getenv("IMAGE_CONNECT_TIMEOUT", "10"))
+IMAGE_DOWNLOAD_TIMEOUT = float(os.getenv("IMAGE_DOWNLOAD_TIMEOUT", "30"))  # 다운로드 전체
+IMAGE_MAX_CONNECTIONS = int(os.getenv("IMAGE_MAX_CONNECTIONS", "50"))
+IMAGE_MAX_KEEPALIVE = int(os.getenv("IMAGE_MAX_KEEPALIVE", "20"))
+
+
+class ImageFetchError(Exception):
+    """이미지 다운로드 실패"""
+
+
+class ImageTooLargeError(ImageFetchError):
+    """이미지 크기가 제한을 초과"""
+
+
+@dataclass
+class FetchResult:
+    """다운로드 결과 (조건부 요청에서 304이면 content는 비어 있음)"""
+    content: bytes
+    not_modified: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class ImageFetcher:
+    """
+    공유 커넥션 풀 기반 이미지 다운로더
+
+    httpx는 origin(호스트)별로 keep-alive 연결을 재사용하므로
+    같은 R2 버킷에 대한 반복 요청은 TLS 핸드셰이크 없이 처리된다.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = IMAGE_MAX_BYTES,
+        connect_timeout: float = IMAGE_CONNECT_TIMEOUT,
+        download_timeout: float = IMAGE_DOWNLOAD_TIMEOUT,
+        max_connections: int = IMAGE_MAX_CONNECTIONS,
+        max_keepalive: int = IMAGE_MAX_KEEPALIVE,
+    ):
+        self.max_bytes = max_bytes
+        self.download_timeout = download_timeout
+        self._timeout = httpx.Timeout(download_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """공유 AsyncClient 반환 (없으면 생성)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self._timeout,
+                limits=self._limits,
+                follow_redirects=True,
+            )
+        return self._client
+
+    async def close(self):
+        """커넥션 풀 정리"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _download(self, url: str, headers: Dict[str, str]) -> FetchResult:
+        client = self._get_client()
+        async with client.stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                return FetchResult(
+                    content=b"",
+                    not_modified=True,
+                    etag=response.headers.get("etag"),
+                    last_modified=response.headers.get("last-modified"),
+                )
+            response.raise_for_status()
+
+            # Content-Length로 본문을 받기 전에 조기 차단
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+                raise ImageTooLargeError(
+                    f"이미지 크기({int(content_length)} bytes)가 제한({self.max_bytes} bytes)을 초과합니다."
+                )
+
+            buffer = bytearray()
+            async for chunk in response.aiter_bytes():
+                buffer.extend(chunk)
+                # Content-Length가 없거나 거짓인 경우를 대비해 수신 중에도 확인
+                if len(buffer) > self.max_bytes:
+                    raise ImageTooLargeError(
+                        f"이미지 크기가 제한({self.max_bytes} bytes)을 초과합니다."
+                    )
+            return FetchResult(
+                content=bytes(buffer),
+                etag=response.headers.get("etag"),
+                last_modified=response.headers.get("last-modified"),
+            )
+
+    async def fetch_conditional(
+        self,
+        url: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> FetchResult:
+        """
+        URL에서 이미지를 다운로드 (ETag/Last-Modified 재검증 지원)
+
+        다운로드 시간(ms)과 바이트 수를 메트릭으로 기록한다.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._download(url, headers), timeout=self.download_timeout)
+        except ImageTooLargeError:
+            metrics.inc("image_download_too_large")
+            raise
+        except asyncio.TimeoutError as e:
+            metrics.inc("image_download_errors")
+            raise ImageFetchError("이미지 다운로드 시간 초과") from e
+        except Exception as e:
+            metrics.inc("image_download_errors")
+            raise ImageFetchError(str(e)) from e
+
+        if result.not_modified:
+            metrics.inc("image_download_not_modified")
+        else:
+            metrics.observe("image_download_ms", (time.perf_counter() - start) * 1000)
+            metrics.observe("image_download_bytes", len(result.content))
+        return result
+
+    async def download_to_file(
+        self,
+        url: str,
+        fileobj: BinaryIO,
+        max_bytes: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """
+        URL 본문을 파일로 스트리밍 (PDF 등 큰 문서용)
+
+        Returns:
+            기록한 바이트 수
+        """
+        limit = max_bytes or self.max_bytes
+
+        async def _stream() -> int:
+            client = self._get_client()
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+                content_length = response.headers.get("content-length")
+                if content_length and content_length.isdigit() and int(content_length) > limit:
+                    raise ImageTooLargeError(
+                        f"파일 크기({int(content_length)} bytes)가 제한({limit} bytes)을 초과합니다."
+                    )
+                total = 0
+                async for chunk in response.aiter_bytes():
+                    total += len(chunk)
+                    if total > limit:
+                        raise ImageTooLargeError(f"파일 크기가 제한({limit} bytes)을 초과합니다.")
+                    fileobj.write(chunk)
+                return total
+
+        start = time.perf_counter()
+        try:
+            total = await asyncio.wait_for(_stream(), timeout=timeout or self.download_timeout)
+        except ImageTooLargeError:
+            raise
+        except asyncio.TimeoutError as e:
+            raise ImageFetchError("다운로드 시간 초과") from e
+        except Exception as e:
+            raise ImageFetchError(str(e)) from e
+
+        metrics.observe("file_download_ms", (time.perf_counter() - start) * 1000)
+        metrics.observe("file_download_bytes", total)
+        return total
+
+    async def fetch(self, url: str) -> bytes:
+        """URL에서 이미지를 다운로드"""
+        result = await self.fetch_conditional(url)
+        return result.content
+
+
+# 모든 엔드포인트가 공유하는 기본 다운로더
+image_fetcher = ImageFetcher()
@@ -0,0 +1,226 @@
+"""
+이미지 검증 및 전처리 단계
+포맷 확인과 무결성 검증(픽셀 수/바이트 제한 포함)을 한 번만 수행한 뒤,
+비전 인코더 입력 크기에 맞춰 축소하고 메타데이터/불필요한 알파 채널을 제거하여
+JPEG/WebP로 재인코딩한다. Pillow 작업은 모두 프로세스 풀에서 실행되어 이벤트 루프를 막지 않는다.
+"""
+import os
+import asyncio
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from io import BytesIO
+from typing import Optional, Tuple
+
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+
+from image_fetcher import IMAGE_MAX_BYTES
+from metrics import metrics
+
+# .env 파일 로드
+load_dotenv()
+
+# 전처리 설정
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS_ENABLED", "true").lower() == "true"
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "896"))  # Gemma3 비전 입력 해상도
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()  # JPEG 또는 WEBP
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+IMAGE_QUEUE_LIMIT = int(os.getenv("IMAGE_QUEUE_LIMIT", str(IMAGE_WORKERS * 4)))  # 풀에 동시에 제출할 최대 작업 수
+
+# 검증 제한
+IMAGE_MAX_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(50_000_000)))  # 디컴프레션 폭탄 방지
+
+
+class InvalidImageError(Exception):
+    """유효하지 않거나 제한을 초과한 이미지"""
+
+
+@dataclass
+class ImageInfo:
+    """검증 단계에서 얻은 이미지 메타데이터 (이후 단계와 AnalysisRecord에서 재사용)"""
+    format: str
+    width: int
+    height: int
+    mode: str
+    size: int  # 원본 바이트 수
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class PreprocessResult:
+    """전처리 결과"""
+    content: bytes
+    original_bytes: int
+    processed_bytes: int
+    width: int
+    height: int
+    format: str
+
+
+def _has_meaningful_alpha(img: Image.Image) -> bool:
+    """투명 픽셀이 실제로 있는지 확인"""
+    if img.mode in ("RGBA", "LA"):
+        return img.getchannel("A").getextrema()[0] < 255
+    if img.mode == "P" and "transparency" in img.info:
+        return True
+    return False
+
+
+def preprocess_image_bytes(
+    image_bytes: bytes,
+    max_edge: int = IMAGE_MAX_EDGE,
+    output_format: str = IMAGE_OUTPUT_FORMAT,
+    quality: int = IMAGE_OUTPUT_QUALITY,
+) -> PreprocessResult:
+    """
+    이미지를 한 번 디코딩하여 축소/정리/재인코딩 (프로세스 풀 워커에서 실행)
+
+    재인코딩 결과가 원본보다 크고 축소가 필요 없었다면 원본을 그대로 사용한다.
+    """
+    img = Image.open(BytesIO(image_bytes))
+    source_format = img.format or ""
+    # JPEG는 디코딩 단계에서 바로 축소 (DCT 스케일링)
+    img.draft("RGB", (max_edge, max_edge))
+    # EXIF 회전을 픽셀에 반영한 뒤 메타데이터는 저장하지 않음
+    img = ImageOps.exif_transpose(img)
+
+    keep_alpha = output_format == "WEBP" and _has_meaningful_alpha(img)
+    if keep_alpha:
+        img = img.convert("RGBA")
+    elif img.mode in ("RGBA", "LA", "P"):
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        img = background
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    resized = max(img.size) > max_edge
+    if resized:
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    output = BytesIO()
+    save_kwargs = {"quality": quality}
+    if output_format == "JPEG":
+        save_kwargs["optimize"] = True
+    img.save(output, format=output_format, **save_kwargs)
+    content = output.getvalue()
+
+    use_original = not resized and len(content) >= len(image_bytes)
+    if use_original:
+        content = image_bytes
+
+    return PreprocessResult(
+        content=content,
+        original_bytes=len(image_bytes),
+        processed_bytes=len(content),
+        width=img.width,
+        height=img.height,
+        format=source_format if use_original else output_format,
+    )
+
+
+def inspect_image_bytes(
+    image_bytes: bytes,
+    max_pixels: int = IMAGE_MAX_PIXELS,
+    max_bytes: int = IMAGE_MAX_BYTES,
+) -> ImageInfo:
+    """
+    포맷 확인 및 무결성 검증 (픽셀 데이터는 디코딩하지 않음)
+
+    헤더만 읽어 크기를 확인하므로 디컴프레션 폭탄은 디코딩 전에 거부된다.
+    """
+    if len(image_bytes) > max_bytes:
+        raise InvalidImageError(f"이미지 크기({len(image_bytes)} bytes)가 제한({max_bytes} bytes)을 초과합니다.")
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", Image.DecompressionBombWarning)
+            img = Image.open(BytesIO(image_bytes))
+            info = ImageInfo(
+                format=img.format or "",
+                width=img.width,
+                height=img.height,
+                mode=img.mode,
+                size=len(image_bytes),
+            )
+            if info.width * info.height > max_pixels:
+                raise InvalidImageError(
+                    f"이미지 픽셀 수({info.width}x{info.height})가 제한({max_pixels})을 초과합니다."
+                )
+            img.verify()
+    except InvalidImageError:
+        raise
+    except Exception as e:
+        raise InvalidImageError(f"유효하지 않은 이미지 형식입니다: {e}") from e
+    return info
+
+
+def validate_and_preprocess(image_bytes: bytes, preprocess: bool = True) -> Tuple[ImageInfo, bytes]:
+    """
+    검증과 전처리를 한 번의 워커 호출로 수행 (프로세스 풀 워커에서 실행)
+
+    Returns:
+        (ImageInfo, Ollama로 보낼 바이트)
+    """
+    info = inspect_image_bytes(image_bytes)
+    if not preprocess:
+        return info, image_bytes
+    try:
+        return info, preprocess_image_bytes(image_bytes).content
+    except Exception:
+        # 헤더/무결성 검증은 통과했으므로 원본을 그대로 전송
+        return info, image_bytes
+
+
+class ImagePreprocessor:
+    """프로세스 풀에서 이미지 검증/전처리를 실행 (제출 수 제한)"""
+
+    def __init__(self, workers: int = IMAGE_WORKERS, queue_limit: int = IMAGE_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, fn, *args):
+        """프로세스 풀에서 함수 실행 (fn은 모듈 최상위 함수여야 함)"""
+        loop = asyncio.get_running_loop()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_limit)
+        async with self._slots:
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+
+    async def prepare(self, image_bytes: bytes, preprocess: bool = IMAGE_PREPROCESS_ENABLED) -> Tuple[ImageInfo, bytes]:
+        """
+        검증 + 전처리 (단일 워커 호출)
+
+        Raises:
+            InvalidImageError: 유효하지 않거나 제한을 초과한 이미지
+        """
+        try:
+            info, content = await self.run(validate_and_preprocess, image_bytes, preprocess)
+        except InvalidImageError:
+            metrics.inc("image_validation_failures")
+            raise
+        metrics.observe("image_preprocess_original_bytes", len(image_bytes))
+        metrics.observe("image_preprocess_processed_bytes", len(content))
+        return info, content
+
+    def shutdown(self):
+        """프로세스 풀 종료"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 서버 전역 전처리기
+image_preprocessor = ImagePreprocessor()
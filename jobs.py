@@ -0,0 +1,305 @@
+"""
+비동기 작업 큐
+POST /api/jobs로 받은 생성 요청을 jobs 테이블에 저장하고, 워커 풀이 순서대로 Ollama로 처리한다.
+작업 상태가 DB에 있으므로 서버를 재시작해도 대기 중이던 작업이 다시 큐에 들어가고,
+실행 중인 작업은 리스(lease)를 갱신하는 프로세스가 사라져 만료된 경우에만 다시 큐에 들어간다.
+"""
+import os
+import json
+import uuid
+import socket
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal
+from metrics import metrics
+from models import AnalysisRecord, Job
+
+# .env 파일 로드
+load_dotenv()
+
+# 작업 큐 설정
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))  # 중단된 작업의 최대 재시도 횟수
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))  # 이 시간 동안 갱신이 없으면 실행 프로세스가 죽은 것으로 간주
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("JOB_WEBHOOK_TIMEOUT", "10"))
+JOB_WEBHOOK_RETRIES = int(os.getenv("JOB_WEBHOOK_RETRIES", "3"))
+
+# (kind, 요청 본문) → 응답 본문
+JobExecutor = Callable[[str, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+# 이 서버 프로세스의 작업 소유자 표시 (같은 호스트에서 재시작해도 겹치지 않도록 임의 값 포함)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lease_deadline() -> datetime:
+    return _now() + timedelta(seconds=JOB_LEASE_SECONDS)
+
+
+class JobQueue:
+    """
+    DB 기반 작업 큐
+
+    메모리 큐에는 작업 ID만 두고, 실행 전 조건부 UPDATE로 작업을 선점하므로
+    같은 DB를 쓰는 여러 서버 프로세스가 하나의 작업을 중복 실행하지 않는다.
+    실행 중에는 JOB_LEASE_SECONDS의 1/3마다 리스를 갱신하며, 리스가 만료된 작업만 다시 대기 상태로 돌린다
+    (다른 프로세스가 실행 중인 작업은 건드리지 않음).
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._executor: Optional[JobExecutor] = None
+        self._http: Optional[httpx.AsyncClient] = None
+
+    async def start(self, executor: JobExecutor):
+        """미완료 작업 복구 후 워커 시작"""
+        self._executor = executor
+        self._queue = asyncio.Queue()
+        self._http = httpx.AsyncClient(timeout=JOB_WEBHOOK_TIMEOUT)
+
+        # 리스가 만료된(실행하던 프로세스가 사라진) 작업은 다시 대기 상태로
+        await self._recover_expired()
+        async with AsyncSessionLocal() as db:
+            queued = (
+                await db.execute(select(Job.id).where(Job.status == "queued").order_by(Job.created_at))
+            ).all()
+            for (job_id,) in queued:
+                self._queue.put_nowait(job_id)
+            if queued:
+                print(f"📥 대기 중인 작업 {len(queued)}건 복구")
+
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._reaper()))
+
+    async def stop(self):
+        """워커 중지 (실행 중이던 작업은 바로 다시 대기 상태로)"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.status == "running", Job.worker_id == WORKER_ID)
+                    .values(status="queued", lease_expires_at=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception as e:
+            print(f"⚠️  실행 중 작업 반환 실패 (리스 만료 후 복구됨): {e}")
+
+    async def _recover_expired(self) -> List[str]:
+        """리스가 만료된 실행 중 작업 → 대기 상태 (최대 시도 횟수에 도달했으면 실패), 다시 대기시킨 작업 ID 반환"""
+        now = _now()
+        # 리스 컬럼이 없던 때 실행되던 작업(NULL)도 만료된 것으로 간주
+        expired = or_(Job.lease_expires_at.is_(None), Job.lease_expires_at < now)
+        requeued = []
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Job.id, Job.attempts).where(Job.status == "running", expired))).all()
+            for job_id, attempts in rows:
+                exhausted = (attempts or 0) >= JOB_MAX_ATTEMPTS
+                if exhausted:
+                    values = dict(
+                        status="failed",
+                        error_message="최대 재시도 횟수 초과 (실행 중 서버가 중단됨)",
+                        finished_at=now,
+                    )
+                else:
+                    values = dict(status="queued")
+                # 같은 조건으로 다시 확인하므로 여러 프로세스가 동시에 복구해도 한 번만 반영된다
+                result = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "running", expired)
+                    .values(lease_expires_at=None, **values)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount == 1 and not exhausted:
+                    requeued.append(job_id)
+            await db.commit()
+        if requeued:
+            metrics.inc("jobs_requeued", len(requeued))
+        return requeued
+
+    async def _reaper(self):
+        """다른 프로세스가 죽어 리스가 만료된 작업을 주기적으로 가져옴"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS)
+            try:
+                for job_id in await self._recover_expired():
+                    self._queue.put_nowait(job_id)
+            except Exception as e:
+                print(f"⚠️  만료된 작업 복구 실패: {e}")
+
+    async def submit(
+        self, db: AsyncSession, kind: str, request: Dict[str, Any], webhook_url: Optional[str] = None
+    ) -> Job:
+        """작업 저장 후 큐에 추가"""
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            status="queued",
+            request=json.dumps(request, ensure_ascii=False),
+            webhook_url=webhook_url,
+            attempts=0
+        )
+        db.add(job)
+        await db.commit()
+        await db.refresh(job)
+        if self._queue is not None:
+            self._queue.put_nowait(job.id)
+        metrics.inc("jobs_submitted")
+        return job
+
+    def depth(self) -> int:
+        """메모리 큐에 대기 중인 작업 수"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️  작업 처리 실패 ({job_id}): {e}")
+
+    async def _claim(self, db: AsyncSession, job_id: str) -> bool:
+        """queued → running 조건부 전환 (다른 프로세스가 선점했으면 False)"""
+        result = await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(
+                status="running",
+                started_at=_now(),
+                attempts=Job.attempts + 1,
+                worker_id=WORKER_ID,
+                lease_expires_at=_lease_deadline()
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def _heartbeat(self, job_id: str):
+        """실행 중인 작업의 리스 갱신"""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.status == "running", Job.worker_id == WORKER_ID)
+                        .values(lease_expires_at=_lease_deadline())
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"⚠️  작업 리스 갱신 실패 ({job_id}): {e}")
+
+    async def _fail(self, job_id: str, message: str):
+        """선점한 뒤 처리 중 오류가 난 작업을 실패로 기록 (running으로 남지 않도록)"""
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, Job.status == "running", Job.worker_id == WORKER_ID)
+                    .values(status="failed", error_message=message, finished_at=_now(), lease_expires_at=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+            metrics.inc("jobs_failed")
+        except Exception as e:
+            print(f"⚠️  작업 실패 기록 불가 ({job_id}, 리스 만료 후 재시도됨): {e}")
+
+    async def _run(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            if not await self._claim(db, job_id):
+                return
+        heartbeat = asyncio.ensure_future(self._heartbeat(job_id))
+        try:
+            await self._execute(job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  작업 처리 실패 ({job_id}): {e}")
+            await self._fail(job_id, f"작업 처리 오류: {e}")
+        finally:
+            heartbeat.cancel()
+
+    async def _existing_record_id(self, db: AsyncSession, record_id: Optional[int]) -> Optional[int]:
+        """저장된 분석 기록 id만 (write-behind 큐에서 버려졌거나 저장에 실패한 기록은 참조하지 않음)"""
+        if record_id is None:
+            return None
+        found = (await db.execute(select(AnalysisRecord.id).where(AnalysisRecord.id == record_id))).scalar()
+        if found is None:
+            print(f"⚠️  작업 결과의 분석 기록이 저장되지 않았습니다 (record_id={record_id})")
+        return found
+
+    async def _execute(self, job_id: str):
+        async with AsyncSessionLocal() as db:
+            job = (await db.execute(select(Job).where(Job.id == job_id))).scalar_one()
+            request = json.loads(job.request)
+            await db.commit()  # 생성 중에는 연결을 풀에 반환
+
+            try:
+                result = await self._executor(job.kind, request)
+                job.status = "completed"
+                job.result = json.dumps(result, ensure_ascii=False)
+                job.record_id = await self._existing_record_id(db, result.get("record_id"))
+                metrics.inc("jobs_completed")
+            except HTTPException as e:
+                job.status = "failed"
+                job.error_message = str(e.detail)
+                metrics.inc("jobs_failed")
+            except Exception as e:
+                job.status = "failed"
+                job.error_message = str(e)
+                metrics.inc("jobs_failed")
+            job.finished_at = _now()
+            job.lease_expires_at = None
+            await db.commit()
+            await db.refresh(job)  # updated_at 등 DB에서 채워진 값
+
+            if job.webhook_url:
+                job.webhook_status = await self._notify(job)
+                await db.commit()
+
+    async def _notify(self, job: Job) -> Optional[int]:
+        """완료 웹훅 전송 (실패 시 지수 백오프로 재시도)"""
+        body = job.to_dict()
+        status = None
+        for attempt in range(JOB_WEBHOOK_RETRIES):
+            try:
+                response = await self._http.post(job.webhook_url, json=body)
+                status = response.status_code
+                if status < 500:
+                    break
+            except httpx.HTTPError as e:
+                print(f"⚠️  웹훅 전송 실패 ({job.id}, 시도 {attempt + 1}): {e}")
+            if attempt < JOB_WEBHOOK_RETRIES - 1:
+                await asyncio.sleep(2 ** attempt)
+        if status is None or status >= 400:
+            metrics.inc("job_webhook_failures")
+        return status
+
+
+# 서버 전역 작업 큐
+job_queue = JobQueue()
@@ -0,0 +1,70 @@
+"""
+프로세스 내 경량 메트릭 레지스트리
+카운터와 요약 통계(count/sum/min/max/last)를 모아 /metrics 엔드포인트로 노출
+"""
+import threading
+from typing import Any, Dict
+
+
+class _Summary:
+    """관측값 요약 통계"""
+
+    __slots__ = ("count", "total", "min", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.last = value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "avg": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "last": self.last,
+        }
+
+
+class Metrics:
+    """스레드 안전한 카운터/요약 통계 모음"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._summaries: Dict[str, _Summary] = {}
+
+    def inc(self, name: str, value: float = 1):
+        """카운터 증가"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """요약 통계에 관측값 추가"""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                summary = self._summaries[name] = _Summary()
+            summary.observe(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """현재 메트릭 스냅샷"""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "summaries": {name: s.to_dict() for name, s in self._summaries.items()},
+            }
+
+
+# 서버 전역 메트릭
+metrics = Metrics()
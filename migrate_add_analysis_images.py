@@ -0,0 +1,60 @@
+"""
+데이터베이스 마이그레이션: analysis_images 테이블 추가
+한 번의 호출에 보낸 여러 이미지를 이미지별로 기록하고, 기존 단일 이미지 레코드도 같은 테이블로 옮겨 적음
+"""
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# 환경 변수 로드
+load_dotenv()
+
+def migrate_database():
+    """analysis_images 테이블 생성 및 기존 이미지 레코드 백필"""
+    
+    # 데이터베이스 URL 가져오기
+    database_url = os.getenv("DB_URL")
+    
+    if not database_url:
+        print("⚠️  DB_URL 환경 변수가 설정되지 않았습니다.")
+        print("기본 SQLite 데이터베이스를 사용합니다.")
+        database_url = "sqlite:///./analysis_records.db"
+    
+    print(f"🔗 데이터베이스 연결: {database_url}")
+    
+    # 엔진 생성
+    engine = create_engine(database_url)
+    
+    try:
+        # analysis_images 테이블 생성 (없는 경우에만)
+        from models import AnalysisImage
+        AnalysisImage.__table__.create(bind=engine, checkfirst=True)
+        print("✅ analysis_images 테이블 확인 완료")
+        
+        with engine.connect() as conn:
+            # 기존 이미지 레코드를 position 0 행으로 백필 (이미 옮긴 레코드는 건너뜀)
+            result = conn.execute(text("""
+                INSERT INTO analysis_images
+                    (record_id, position, image_url, filename, image_format, image_width, image_height, image_size)
+                SELECT id, 0, image_url, image_filename, image_format, image_width, image_height, image_size
+                FROM analysis_records
+                WHERE has_image = :has_image
+                  AND id NOT IN (SELECT record_id FROM analysis_images)
+            """), {"has_image": True})
+            conn.commit()
+            print(f"✅ 기존 이미지 레코드 {result.rowcount}건 백필 완료")
+            
+            print("✨ 마이그레이션 완료!")
+            print("\n📊 레코드별 이미지 수 조회 예시:")
+            print("  SELECT record_id, COUNT(*) FROM analysis_images GROUP BY record_id ORDER BY record_id DESC;")
+            
+    except Exception as e:
+        print(f"❌ 마이그레이션 실패: {e}")
+        print("\n만약 테이블이 존재하지 않는다면, 먼저 init_db.py를 실행하세요:")
+        print("  python init_db.py")
+
+
+if __name__ == "__main__":
+    print("\n🔧 데이터베이스 마이그레이션 시작\n")
+    migrate_database()
+    print()
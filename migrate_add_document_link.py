@@ -0,0 +1,85 @@
+"""
+데이터베이스 마이그레이션: documents 테이블 및 문서 연결 컬럼 추가
+PDF 요약의 페이지별 호출을 부모 문서에 연결하기 위한 document_id, page_number 컬럼
+"""
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# 환경 변수 로드
+load_dotenv()
+
+def migrate_database():
+    """documents 테이블 생성 및 analysis_records에 문서 연결 컬럼 추가"""
+    
+    # 데이터베이스 URL 가져오기
+    database_url = os.getenv("DB_URL")
+    
+    if not database_url:
+        print("⚠️  DB_URL 환경 변수가 설정되지 않았습니다.")
+        print("기본 SQLite 데이터베이스를 사용합니다.")
+        database_url = "sqlite:///./analysis_records.db"
+    
+    print(f"🔗 데이터베이스 연결: {database_url}")
+    
+    # 엔진 생성
+    engine = create_engine(database_url)
+    
+    try:
+        # documents 테이블 생성 (없는 경우에만)
+        from models import Document
+        Document.__table__.create(bind=engine, checkfirst=True)
+        print("✅ documents 테이블 확인 완료")
+        
+        with engine.connect() as conn:
+            # 기존 컬럼 확인
+            if "postgresql" in database_url or "postgres" in database_url:
+                # PostgreSQL
+                result = conn.execute(text("""
+                    SELECT column_name 
+                    FROM information_schema.columns 
+                    WHERE table_name='analysis_records'
+                """))
+                columns = [row[0] for row in result.fetchall()]
+                db_type = "PostgreSQL"
+                
+            elif "sqlite" in database_url:
+                # SQLite
+                result = conn.execute(text("PRAGMA table_info(analysis_records)"))
+                columns = [row[1] for row in result.fetchall()]
+                db_type = "SQLite"
+            
+            else:
+                print("⚠️  지원하지 않는 데이터베이스 타입입니다.")
+                return
+            
+            if 'document_id' not in columns:
+                conn.execute(text(
+                    "ALTER TABLE analysis_records ADD COLUMN document_id INTEGER REFERENCES documents(id)"
+                ))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_analysis_records_document_id ON analysis_records (document_id)"
+                ))
+                print(f"✅ {db_type}: document_id 컬럼 추가 완료")
+            else:
+                print("✅ document_id 컬럼이 이미 존재합니다.")
+            
+            if 'page_number' not in columns:
+                conn.execute(text("ALTER TABLE analysis_records ADD COLUMN page_number INTEGER"))
+                print(f"✅ {db_type}: page_number 컬럼 추가 완료")
+            else:
+                print("✅ page_number 컬럼이 이미 존재합니다.")
+            
+            conn.commit()
+            print("✨ 마이그레이션 완료!")
+            
+    except Exception as e:
+        print(f"❌ 마이그레이션 실패: {e}")
+        print("\n만약 테이블이 존재하지 않는다면, 먼저 init_db.py를 실행하세요:")
+        print("  python init_db.py")
+
+
+if __name__ == "__main__":
+    print("\n🔧 데이터베이스 마이그레이션 시작\n")
+    migrate_database()
+    print()
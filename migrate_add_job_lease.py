@@ -0,0 +1,87 @@
+"""
+데이터베이스 마이그레이션: 작업 리스(lease) 컬럼 추가
+jobs 테이블에 실행 중인 프로세스(worker_id)와 리스 만료 시각(lease_expires_at)을 기록하여,
+여러 서버 프로세스가 있을 때 리스가 만료된 작업만 다시 대기 상태로 돌리도록 함
+"""
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# 환경 변수 로드
+load_dotenv()
+
+# 추가할 컬럼 (이름, PostgreSQL 타입, SQLite 타입)
+COLUMNS = [
+    ("worker_id", "VARCHAR(64)", "VARCHAR(64)"),
+    ("lease_expires_at", "TIMESTAMP WITH TIME ZONE", "DATETIME"),
+]
+
+def migrate_database():
+    """worker_id, lease_expires_at 컬럼(및 인덱스)을 jobs 테이블에 추가"""
+    
+    # 데이터베이스 URL 가져오기
+    database_url = os.getenv("DB_URL")
+    
+    if not database_url:
+        print("⚠️  DB_URL 환경 변수가 설정되지 않았습니다.")
+        print("기본 SQLite 데이터베이스를 사용합니다.")
+        database_url = "sqlite:///./analysis_records.db"
+    
+    print(f"🔗 데이터베이스 연결: {database_url}")
+    
+    # 엔진 생성
+    engine = create_engine(database_url)
+    
+    try:
+        with engine.connect() as conn:
+            # 컬럼 존재 여부 확인
+            if "postgresql" in database_url or "postgres" in database_url:
+                # PostgreSQL
+                result = conn.execute(text("""
+                    SELECT column_name 
+                    FROM information_schema.columns 
+                    WHERE table_name='jobs'
+                """))
+                columns = [row[0] for row in result.fetchall()]
+                
+                for name, pg_type, _ in COLUMNS:
+                    if name in columns:
+                        print(f"✅ {name} 컬럼이 이미 존재합니다.")
+                        continue
+                    conn.execute(text(f"ALTER TABLE jobs ADD COLUMN {name} {pg_type}"))
+                    print(f"✅ PostgreSQL: {name} 컬럼 추가 완료")
+                
+            elif "sqlite" in database_url:
+                # SQLite
+                result = conn.execute(text("PRAGMA table_info(jobs)"))
+                columns = [row[1] for row in result.fetchall()]
+                
+                for name, _, sqlite_type in COLUMNS:
+                    if name in columns:
+                        print(f"✅ {name} 컬럼이 이미 존재합니다.")
+                        continue
+                    conn.execute(text(f"ALTER TABLE jobs ADD COLUMN {name} {sqlite_type}"))
+                    print(f"✅ SQLite: {name} 컬럼 추가 완료")
+            
+            else:
+                print("⚠️  지원하지 않는 데이터베이스 타입입니다.")
+                return
+            
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_jobs_lease_expires_at ON jobs (lease_expires_at)"
+            ))
+            conn.commit()
+            
+            print("✨ 마이그레이션 완료!")
+            print("\nℹ️  리스가 없는 기존 running 작업은 다음 서버 시작 시 만료된 것으로 보고 다시 대기시킵니다.")
+            
+    except Exception as e:
+        print(f"❌ 마이그레이션 실패: {e}")
+        print("\n만약 테이블이 존재하지 않는다면, 먼저 init_db.py를 실행하세요:")
+        print("  python init_db.py")
+
+
+if __name__ == "__main__":
+    print("\n🔧 데이터베이스 마이그레이션 시작\n")
+    migrate_database()
+    print()
@@ -0,0 +1,72 @@
+"""
+데이터베이스 마이그레이션: 기록 목록 keyset 페이지네이션 인덱스 추가
+/api/records가 (created_at, id) 커서로 페이지를 넘길 때 정렬과 endpoint 필터를 인덱스 범위 조회로 처리하도록 함
+"""
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# 환경 변수 로드
+load_dotenv()
+
+# 추가할 인덱스 (이름, 컬럼)
+INDEXES = [
+    ("ix_analysis_records_created_at_id", "created_at, id"),
+    ("ix_analysis_records_endpoint_created_at_id", "endpoint, created_at, id"),
+]
+
+def migrate_database():
+    """analysis_records 테이블에 (created_at, id), (endpoint, created_at, id) 복합 인덱스 추가"""
+    
+    # 데이터베이스 URL 가져오기
+    database_url = os.getenv("DB_URL")
+    
+    if not database_url:
+        print("⚠️  DB_URL 환경 변수가 설정되지 않았습니다.")
+        print("기본 SQLite 데이터베이스를 사용합니다.")
+        database_url = "sqlite:///./analysis_records.db"
+    
+    print(f"🔗 데이터베이스 연결: {database_url}")
+    
+    # 엔진 생성
+    engine = create_engine(database_url)
+    
+    try:
+        if "postgresql" in database_url or "postgres" in database_url:
+            # PostgreSQL: 쓰기를 막지 않도록 CONCURRENTLY로 생성 (트랜잭션 밖에서 실행해야 함)
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                for name, columns in INDEXES:
+                    conn.execute(text(
+                        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON analysis_records ({columns})"
+                    ))
+                    print(f"✅ PostgreSQL: {name} 인덱스 생성 완료")
+                conn.execute(text("ANALYZE analysis_records"))
+                
+        elif "sqlite" in database_url:
+            # SQLite
+            with engine.connect() as conn:
+                for name, columns in INDEXES:
+                    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON analysis_records ({columns})"))
+                    print(f"✅ SQLite: {name} 인덱스 생성 완료")
+                conn.commit()
+        
+        else:
+            print("⚠️  지원하지 않는 데이터베이스 타입입니다.")
+            return
+        
+        print("✨ 마이그레이션 완료!")
+        print("\n📊 페이지 조회 예시:")
+        print("  GET /api/records?limit=50")
+        print("  GET /api/records?limit=50&cursor=<이전 응답의 next_cursor>")
+            
+    except Exception as e:
+        print(f"❌ 마이그레이션 실패: {e}")
+        print("\n만약 테이블이 존재하지 않는다면, 먼저 init_db.py를 실행하세요:")
+        print("  python init_db.py")
+        print("CONCURRENTLY 생성이 중단되면 INVALID 인덱스가 남을 수 있으니 DROP INDEX 후 다시 실행하세요.")
+
+
+if __name__ == "__main__":
+    print("\n🔧 데이터베이스 마이그레이션 시작\n")
+    migrate_database()
+    print()
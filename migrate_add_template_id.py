@@ -0,0 +1,91 @@
+"""
+데이터베이스 마이그레이션: template_id, prompt_eval_duration 컬럼 추가
+템플릿별 프롬프트 평가 토큰/시간을 비교하여 고정 접두부가 프롬프트 캐시로 재사용되는지 확인할 수 있도록 함
+"""
+import os
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# 환경 변수 로드
+load_dotenv()
+
+# 추가할 컬럼 (이름, PostgreSQL 타입, SQLite 타입)
+COLUMNS = [
+    ("template_id", "VARCHAR(100)", "VARCHAR(100)"),
+    ("prompt_eval_duration", "BIGINT", "BIGINT"),
+]
+
+def migrate_database():
+    """template_id(및 인덱스), prompt_eval_duration 컬럼을 analysis_records 테이블에 추가"""
+    
+    # 데이터베이스 URL 가져오기
+    database_url = os.getenv("DB_URL")
+    
+    if not database_url:
+        print("⚠️  DB_URL 환경 변수가 설정되지 않았습니다.")
+        print("기본 SQLite 데이터베이스를 사용합니다.")
+        database_url = "sqlite:///./analysis_records.db"
+    
+    print(f"🔗 데이터베이스 연결: {database_url}")
+    
+    # 엔진 생성
+    engine = create_engine(database_url)
+    
+    try:
+        with engine.connect() as conn:
+            # 컬럼 존재 여부 확인
+            if "postgresql" in database_url or "postgres" in database_url:
+                # PostgreSQL
+                result = conn.execute(text("""
+                    SELECT column_name 
+                    FROM information_schema.columns 
+                    WHERE table_name='analysis_records'
+                """))
+                columns = [row[0] for row in result.fetchall()]
+                
+                for name, pg_type, _ in COLUMNS:
+                    if name in columns:
+                        print(f"✅ {name} 컬럼이 이미 존재합니다.")
+                        continue
+                    conn.execute(text(f"ALTER TABLE analysis_records ADD COLUMN {name} {pg_type}"))
+                    print(f"✅ PostgreSQL: {name} 컬럼 추가 완료")
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_analysis_records_template_id ON analysis_records (template_id)"
+                ))
+                conn.commit()
+                
+            elif "sqlite" in database_url:
+                # SQLite
+                result = conn.execute(text("PRAGMA table_info(analysis_records)"))
+                columns = [row[1] for row in result.fetchall()]
+                
+                for name, _, sqlite_type in COLUMNS:
+                    if name in columns:
+                        print(f"✅ {name} 컬럼이 이미 존재합니다.")
+                        continue
+                    conn.execute(text(f"ALTER TABLE analysis_records ADD COLUMN {name} {sqlite_type}"))
+                    print(f"✅ SQLite: {name} 컬럼 추가 완료")
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_analysis_records_template_id ON analysis_records (template_id)"
+                ))
+                conn.commit()
+            
+            else:
+                print("⚠️  지원하지 않는 데이터베이스 타입입니다.")
+                return
+            
+            print("✨ 마이그레이션 완료!")
+            print("\n📊 템플릿별 프롬프트 평가 조회 예시:")
+            print("  SELECT template_id, COUNT(*), AVG(prompt_eval_count), AVG(prompt_eval_duration) / 1e6 AS ms")
+            print("  FROM analysis_records GROUP BY template_id;")
+            
+    except Exception as e:
+        print(f"❌ 마이그레이션 실패: {e}")
+        print("\n만약 테이블이 존재하지 않는다면, 먼저 init_db.py를 실행하세요:")
+        print("  python init_db.py")
+
+
+if __name__ == "__main__":
+    print("\n🔧 데이터베이스 마이그레이션 시작\n")
+    migrate_database()
+    print()
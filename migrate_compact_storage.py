@@ -0,0 +1,151 @@
+"""
+데이터베이스 마이그레이션: 프롬프트 중복 제거 / 응답 압축 저장 (compact 저장 모드)
+prompt_texts 테이블과 prompt_id, response_compressed 컬럼을 추가하고,
+RECORD_STORAGE_MODE=compact(또는 --backfill)이면 기존 레코드를 청크 단위로 옮겨 적음
+"""
+import os
+import sys
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# 환경 변수 로드
+load_dotenv()
+
+# 한 트랜잭션에서 옮겨 적을 레코드 수
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", "1000"))
+
+# 추가할 컬럼 (이름, PostgreSQL 타입, SQLite 타입)
+COLUMNS = [
+    ("prompt_id", "INTEGER REFERENCES prompt_texts(id)", "INTEGER REFERENCES prompt_texts(id)"),
+    ("response_compressed", "BYTEA", "BLOB"),
+]
+
+def backfill(engine):
+    """기존 레코드의 프롬프트를 prompt_texts로 옮기고 큰 응답을 압축 (id 순서로 청크 단위 커밋)"""
+    from record_storage import compress_text, prompt_store
+
+    last_id = 0
+    prompts = 0
+    responses = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text("""
+                SELECT id, prompt, prompt_id, response
+                FROM analysis_records
+                WHERE id > :last_id
+                ORDER BY id
+                LIMIT :limit
+            """), {"last_id": last_id, "limit": BACKFILL_CHUNK_SIZE}).fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for record_id, prompt, prompt_id, response in rows:
+                values = {"id": record_id, "prompt": prompt, "prompt_id": prompt_id, "response": response, "blob": None}
+                if prompt and prompt_id is None:
+                    values["prompt_id"] = prompt_store.resolve(conn, prompt)
+                    values["prompt"] = ""
+                    prompts += 1
+                blob = compress_text(response) if response else None
+                if blob is not None:
+                    values["response"] = None
+                    values["blob"] = blob
+                    responses += 1
+                if values["prompt_id"] != prompt_id or blob is not None:
+                    updates.append(values)
+
+            if updates:
+                conn.execute(text("""
+                    UPDATE analysis_records
+                    SET prompt = :prompt, prompt_id = :prompt_id,
+                        response = :response, response_compressed = COALESCE(:blob, response_compressed)
+                    WHERE id = :id
+                """), updates)
+            last_id = rows[-1][0]
+        print(f"  ... id {last_id}까지 처리 (프롬프트 {prompts}건, 응답 압축 {responses}건)")
+
+    print(f"✅ 백필 완료: 프롬프트 {prompts}건 중복 제거, 응답 {responses}건 압축")
+
+
+def migrate_database():
+    """prompt_texts 테이블, prompt_id / response_compressed 컬럼 추가 및 기존 레코드 백필"""
+
+    # 데이터베이스 URL 가져오기
+    database_url = os.getenv("DB_URL")
+
+    if not database_url:
+        print("⚠️  DB_URL 환경 변수가 설정되지 않았습니다.")
+        print("기본 SQLite 데이터베이스를 사용합니다.")
+        database_url = "sqlite:///./analysis_records.db"
+
+    print(f"🔗 데이터베이스 연결: {database_url}")
+
+    # 엔진 생성
+    engine = create_engine(database_url)
+
+    try:
+        # prompt_texts 테이블 생성 (없는 경우에만)
+        from models import PromptText
+        PromptText.__table__.create(bind=engine, checkfirst=True)
+        print("✅ prompt_texts 테이블 확인 완료")
+
+        with engine.connect() as conn:
+            # 컬럼 존재 여부 확인
+            if "postgresql" in database_url or "postgres" in database_url:
+                # PostgreSQL
+                result = conn.execute(text("""
+                    SELECT column_name
+                    FROM information_schema.columns
+                    WHERE table_name='analysis_records'
+                """))
+                columns = [row[0] for row in result.fetchall()]
+
+                for name, pg_type, _ in COLUMNS:
+                    if name in columns:
+                        print(f"✅ {name} 컬럼이 이미 존재합니다.")
+                        continue
+                    conn.execute(text(f"ALTER TABLE analysis_records ADD COLUMN {name} {pg_type}"))
+                    print(f"✅ PostgreSQL: {name} 컬럼 추가 완료")
+
+            elif "sqlite" in database_url:
+                # SQLite
+                result = conn.execute(text("PRAGMA table_info(analysis_records)"))
+                columns = [row[1] for row in result.fetchall()]
+
+                for name, _, sqlite_type in COLUMNS:
+                    if name in columns:
+                        print(f"✅ {name} 컬럼이 이미 존재합니다.")
+                        continue
+                    conn.execute(text(f"ALTER TABLE analysis_records ADD COLUMN {name} {sqlite_type}"))
+                    print(f"✅ SQLite: {name} 컬럼 추가 완료")
+
+            else:
+                print("⚠️  지원하지 않는 데이터베이스 타입입니다.")
+                return
+
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_analysis_records_prompt_id ON analysis_records (prompt_id)"
+            ))
+            conn.commit()
+
+        if os.getenv("RECORD_STORAGE_MODE") == "compact" or "--backfill" in sys.argv:
+            print(f"\n📦 기존 레코드 백필 시작 (청크 {BACKFILL_CHUNK_SIZE}건)")
+            backfill(engine)
+            if "postgresql" in database_url or "postgres" in database_url:
+                print("\n💡 줄어든 공간을 반환하려면 VACUUM (FULL, ANALYZE) analysis_records; 를 실행하세요.")
+        else:
+            print("\nℹ️  RECORD_STORAGE_MODE=compact가 아니므로 기존 레코드는 그대로 둡니다. (백필: --backfill)")
+
+        print("✨ 마이그레이션 완료!")
+
+    except Exception as e:
+        print(f"❌ 마이그레이션 실패: {e}")
+        print("\n만약 테이블이 존재하지 않는다면, 먼저 init_db.py를 실행하세요:")
+        print("  python init_db.py")
+        print("백필이 중간에 멈췄다면 다시 실행하세요. 이미 옮긴 레코드는 건너뜁니다.")
+
+
+if __name__ == "__main__":
+    print("\n🔧 데이터베이스 마이그레이션 시작\n")
+    migrate_database()
+    print()
@@ -0,0 +1,81 @@
+"""
+요청별 모델 선택
+요청에 model이 있으면 그대로, tier가 있으면 해당 등급 모델을,
+둘 다 없으면 라우팅 정책(프롬프트 길이, 이미지 여부)에 따라 모델을 고른다.
+"""
+import os
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from summarization import estimate_tokens
+
+# .env 파일 로드
+load_dotenv()
+
+# 기본 모델 (라우팅을 끄면 모든 요청에 사용)
+MODEL_NAME = os.getenv("MODEL_NAME", "gemma3:27b")
+
+# 등급별 모델
+MODEL_SMALL = os.getenv("MODEL_SMALL", "gemma3:4b")
+MODEL_LARGE = os.getenv("MODEL_LARGE", MODEL_NAME)
+MODEL_TIERS: Dict[str, str] = {"small": MODEL_SMALL, "large": MODEL_LARGE}
+
+# 라우팅 정책: 이미지가 없고 프롬프트가 짧으면 small, 나머지는 large
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "false").lower() == "true"
+MODEL_ROUTING_SMALL_TOKENS = int(os.getenv("MODEL_ROUTING_SMALL_TOKENS", "500"))
+MODEL_ROUTING_IMAGE_TIER = os.getenv("MODEL_ROUTING_IMAGE_TIER", "large")  # 이미지 요청의 등급
+
+# 요청에서 직접 지정할 수 있는 모델 (쉼표 구분, 기본/등급 모델은 항상 허용)
+MODEL_ALLOWED: List[str] = [
+    m.strip() for m in os.getenv("MODEL_ALLOWED", "").split(",") if m.strip()
+]
+
+
+class ModelSelectionError(ValueError):
+    """허용되지 않은 모델 또는 등급"""
+
+
+def allowed_models() -> List[str]:
+    """요청에서 지정할 수 있는 모델 목록"""
+    models = [MODEL_NAME, *MODEL_TIERS.values(), *MODEL_ALLOWED]
+    return list(dict.fromkeys(models))
+
+
+def select_model(
+    model: Optional[str] = None,
+    tier: Optional[str] = None,
+    prompt: str = "",
+    has_image: bool = False,
+) -> str:
+    """
+    요청에 사용할 모델 결정
+
+    Args:
+        model: 요청에 지정된 모델 (허용 목록에 있어야 함)
+        tier: 요청에 지정된 등급 (small, large)
+        prompt: 프롬프트 (라우팅 정책의 길이 기준)
+        has_image: 이미지 포함 여부
+
+    Raises:
+        ModelSelectionError: 허용되지 않은 모델 또는 알 수 없는 등급
+    """
+    if model:
+        if model not in allowed_models():
+            raise ModelSelectionError(
+                f"허용되지 않은 모델입니다: {model} (사용 가능: {', '.join(allowed_models())})"
+            )
+        return model
+    if tier:
+        if tier not in MODEL_TIERS:
+            raise ModelSelectionError(
+                f"알 수 없는 모델 등급입니다: {tier} (사용 가능: {', '.join(MODEL_TIERS)})"
+            )
+        return MODEL_TIERS[tier]
+    if not MODEL_ROUTING_ENABLED:
+        return MODEL_NAME
+    if has_image:
+        return MODEL_TIERS.get(MODEL_ROUTING_IMAGE_TIER, MODEL_LARGE)
+    if estimate_tokens(prompt) <= MODEL_ROUTING_SMALL_TOKENS:
+        return MODEL_SMALL
+    return MODEL_LARGE
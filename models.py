@@ -1,9 +1,32 @@
 """
 Database models for storing analysis records
 """
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Float, DateTime, Boolean
+import json
+from datetime import datetime
+from typing import Iterable, Optional
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Text, Float, DateTime, Boolean, ForeignKey, Index, LargeBinary, event, select
+)
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
+from record_storage import COMPACT_STORAGE, compress_text, decompress_text, prompt_store
+
+
+class PromptText(Base):
+    """
+    중복 제거된 프롬프트 본문 (compact 저장 모드에서 analysis_records.prompt_id가 참조)
+    """
+    __tablename__ = "prompt_texts"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    sha256 = Column(String(64), nullable=False, unique=True)  # 본문 해시
+    content = Column(Text, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f"<PromptText(id={self.id}, sha256='{self.sha256[:12]}')>"
 
 
 class AnalysisRecord(Base):
@@ -11,6 +34,11 @@ class AnalysisRecord(Base):
     분석 요청과 결과를 저장하는 모델
     """
     __tablename__ = "analysis_records"
+    __table_args__ = (
+        # 기록 목록 keyset 페이지네이션용 (최신순 정렬, endpoint 필터)
+        Index("ix_analysis_records_created_at_id", "created_at", "id"),
+        Index("ix_analysis_records_endpoint_created_at_id", "endpoint", "created_at", "id"),
+    )
 
     # 기본 필드
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -19,32 +47,113 @@ class AnalysisRecord(Base):
     
     # 요청 정보
     endpoint = Column(String(100), nullable=False, index=True)  # API 엔드포인트
-    prompt = Column(Text, nullable=False)  # 입력 프롬프트
+    _prompt = Column("prompt", Text, nullable=False)  # 입력 프롬프트 (compact 모드에서는 빈 문자열, 본문은 prompt_texts)
+    prompt_id = Column(Integer, ForeignKey("prompt_texts.id"), index=True)  # 중복 제거된 프롬프트 (compact 모드)
     has_image = Column(Boolean, default=False)  # 이미지 포함 여부
     image_filename = Column(String(255))  # 이미지 파일명 (있는 경우) - 레거시
     image_url = Column(Text)  # 이미지 URL (Cloudflare R2 등)
+    image_format = Column(String(20))  # 이미지 포맷 (JPEG, PNG 등)
+    image_width = Column(Integer)  # 원본 가로 픽셀
+    image_height = Column(Integer)  # 원본 세로 픽셀
+    image_size = Column(Integer)  # 원본 바이트 수
+    
+    # 문서 요약 연결 (PDF 페이지/통합 단계 호출인 경우)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    page_number = Column(Integer)  # 페이지 번호 (1부터, 통합 단계는 NULL)
+    
+    # 대화 세션 (후속 질문인 경우)
+    session_id = Column(String(36), index=True)
+    
+    # 프롬프트 템플릿 (서버 템플릿으로 만든 요청인 경우)
+    template_id = Column(String(100), index=True)
     
     # 생성 옵션
     temperature = Column(Float)
     max_tokens = Column(Integer)
     
     # 응답 정보
-    response = Column(Text)  # 모델의 응답
+    _response = Column("response", Text)  # 모델의 응답 (압축해서 저장한 경우 NULL)
+    response_compressed = Column(LargeBinary)  # 압축된 응답 (compact 모드, zstd 또는 zlib)
     model = Column(String(100))  # 사용된 모델명
     success = Column(Boolean, default=True)  # 성공 여부
     error_message = Column(Text)  # 에러 메시지 (실패 시)
+    cache_hit = Column(Boolean, default=False)  # 결과 캐시 히트 여부
+    backend = Column(String(255), index=True)  # 처리한 Ollama 노드 (캐시 히트는 NULL)
     
     # 성능 메트릭
     total_duration = Column(BigInteger)  # 총 처리 시간 (나노초)
     load_duration = Column(BigInteger)  # 모델 로드 시간 (나노초)
     prompt_eval_count = Column(Integer)  # 프롬프트 평가 토큰 수
+    prompt_eval_duration = Column(BigInteger)  # 프롬프트 평가 시간 (나노초)
     eval_count = Column(Integer)  # 생성된 토큰 수
     
+    # 요청에 포함된 이미지 (여러 장이면 image_* 컬럼에는 첫 이미지가 기록됨)
+    images = relationship(
+        "AnalysisImage",
+        order_by="AnalysisImage.position",
+        cascade="all, delete-orphan",
+        back_populates="record"
+    )
+    
+    # 중복 제거된 프롬프트 본문 (기본은 JOIN하지 않음, 본문이 필요한 조회에서 joinedload)
+    prompt_text = relationship("PromptText", lazy="select", viewonly=True)
+    
+    @hybrid_property
+    def prompt(self):
+        """입력 프롬프트 (저장 방식과 관계없이 원문)"""
+        if self.prompt_id is None:
+            return self._prompt
+        value = self.__dict__.get("_prompt_value")
+        if value is None and self.prompt_text is not None:
+            value = self.prompt_text.content
+        return value
+    
+    @prompt.setter
+    def prompt(self, value):
+        self._prompt = value
+        self.prompt_id = None
+        self.__dict__.pop("_prompt_value", None)
+    
+    @prompt.expression
+    def prompt(cls):
+        return func.coalesce(
+            select(PromptText.content).where(PromptText.id == cls.prompt_id).scalar_subquery(),
+            cls._prompt
+        )
+    
+    @hybrid_property
+    def response(self):
+        """모델의 응답 (압축해서 저장한 경우 복원)"""
+        if self.response_compressed is not None:
+            return decompress_text(self.response_compressed)
+        return self._response
+    
+    @response.setter
+    def response(self, value):
+        self._response = value
+        self.response_compressed = None
+    
+    @response.expression
+    def response(cls):
+        # 압축된 응답은 SQL에서 읽을 수 없으므로 원문 컬럼만
+        return cls._response
+    
     def __repr__(self):
         return f"<AnalysisRecord(id={self.id}, endpoint='{self.endpoint}', created_at='{self.created_at}')>"
     
-    def to_dict(self):
-        """딕셔너리로 변환"""
+    def to_dict(self, fields: Optional[Iterable[str]] = None):
+        """
+        딕셔너리로 변환
+
+        Args:
+            fields: 넣을 필드 (load_only로 일부 컬럼만 로드한 경우, 나머지 컬럼은 읽지 않음)
+        """
+        if fields is not None:
+            values = {name: getattr(self, name) for name in fields}
+            return {
+                name: value.isoformat() if isinstance(value, datetime) else value
+                for name, value in values.items()
+            }
         return {
             "id": self.id,
             "created_at": self.created_at.isoformat() if self.created_at else None,
@@ -54,15 +163,202 @@ class AnalysisRecord(Base):
             "has_image": self.has_image,
             "image_filename": self.image_filename,
             "image_url": self.image_url,
+            "image_format": self.image_format,
+            "image_width": self.image_width,
+            "image_height": self.image_height,
+            "image_size": self.image_size,
+            "document_id": self.document_id,
+            "page_number": self.page_number,
+            "session_id": self.session_id,
+            "template_id": self.template_id,
             "temperature": self.temperature,
             "max_tokens": self.max_tokens,
             "response": self.response,
             "model": self.model,
             "success": self.success,
             "error_message": self.error_message,
+            "cache_hit": self.cache_hit,
+            "backend": self.backend,
             "total_duration": self.total_duration,
             "load_duration": self.load_duration,
             "prompt_eval_count": self.prompt_eval_count,
+            "prompt_eval_duration": self.prompt_eval_duration,
             "eval_count": self.eval_count,
         }
 
+
+@event.listens_for(AnalysisRecord, "before_insert")
+@event.listens_for(AnalysisRecord, "before_update")
+def _compact_record_text(mapper, connection, target):
+    """compact 저장 모드: 프롬프트는 prompt_texts로 중복 제거, 큰 응답은 압축해서 저장"""
+    if not COMPACT_STORAGE:
+        return
+    if target._prompt and target.prompt_id is None:
+        # 저장 후에도 DB 조회 없이 원문을 읽을 수 있도록 보관
+        target.__dict__["_prompt_value"] = target._prompt
+        target.prompt_id = prompt_store.resolve(connection, target._prompt)
+        target._prompt = ""
+    if target._response:
+        blob = compress_text(target._response)
+        if blob is not None:
+            target.response_compressed = blob
+            target._response = None
+
+
+def restore_record_text(record: AnalysisRecord):
+    """
+    저장에 실패한 레코드를 compact 변환 전으로 되돌림
+
+    변환 중 추가한 prompt_texts 행은 레코드와 함께 롤백되므로, 같은 레코드를 다시 저장하기 전에 호출해야
+    롤백된 prompt_id를 가리키지 않고 다음 INSERT에서 다시 변환된다.
+    """
+    value = record.__dict__.pop("_prompt_value", None)
+    if value is not None:
+        record._prompt = value
+        record.prompt_id = None
+    if record.response_compressed is not None and record._response is None:
+        record._response = decompress_text(record.response_compressed)
+        record.response_compressed = None
+
+
+class AnalysisImage(Base):
+    """
+    분석 요청에 포함된 이미지 (한 번의 호출에 여러 장을 보낸 경우 장마다 한 행)
+    """
+    __tablename__ = "analysis_images"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    record_id = Column(Integer, ForeignKey("analysis_records.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)  # 요청 내 순서 (0부터, Ollama에 보낸 순서)
+    
+    # 이미지 출처
+    image_url = Column(Text)  # 이미지 URL (업로드인 경우 NULL)
+    filename = Column(String(255))  # 업로드 파일명
+    sha256 = Column(String(64), index=True)  # 원본 콘텐츠 해시
+    
+    # 검증 단계 메타데이터
+    image_format = Column(String(20))
+    image_width = Column(Integer)
+    image_height = Column(Integer)
+    image_size = Column(Integer)  # 원본 바이트 수
+    processed_size = Column(Integer)  # 전처리 후 바이트 수 (Ollama로 전송된 크기)
+    
+    record = relationship("AnalysisRecord", back_populates="images")
+    
+    def __repr__(self):
+        return f"<AnalysisImage(id={self.id}, record_id={self.record_id}, position={self.position})>"
+    
+    def to_dict(self):
+        """딕셔너리로 변환"""
+        return {
+            "id": self.id,
+            "record_id": self.record_id,
+            "position": self.position,
+            "image_url": self.image_url,
+            "filename": self.filename,
+            "sha256": self.sha256,
+            "image_format": self.image_format,
+            "image_width": self.image_width,
+            "image_height": self.image_height,
+            "image_size": self.image_size,
+            "processed_size": self.processed_size,
+        }
+
+
+class Document(Base):
+    """
+    요약 대상 문서 (PDF) 모델
+    페이지별 호출은 AnalysisRecord.document_id로 연결된다.
+    """
+    __tablename__ = "documents"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # 문서 정보
+    source_url = Column(Text)  # PDF URL (업로드인 경우 NULL)
+    filename = Column(String(255))  # 업로드 파일명
+    page_count = Column(Integer)  # 전체 페이지 수
+    text_pages = Column(Integer)  # 텍스트 레이어로 처리한 페이지 수
+    image_pages = Column(Integer)  # 렌더링하여 이미지로 처리한 페이지 수
+    
+    # 결과
+    status = Column(String(20), nullable=False, default="processing")  # processing, completed, failed
+    summary = Column(Text)  # 최종 요약
+    model = Column(String(100))
+    success = Column(Boolean)
+    error_message = Column(Text)
+    
+    def __repr__(self):
+        return f"<Document(id={self.id}, status='{self.status}', page_count={self.page_count})>"
+    
+    def to_dict(self):
+        """딕셔너리로 변환"""
+        return {
+            "id": self.id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "source_url": self.source_url,
+            "filename": self.filename,
+            "page_count": self.page_count,
+            "text_pages": self.text_pages,
+            "image_pages": self.image_pages,
+            "status": self.status,
+            "summary": self.summary,
+            "model": self.model,
+            "success": self.success,
+            "error_message": self.error_message,
+        }
+
+
+class Job(Base):
+    """
+    비동기 생성 작업 모델
+    큐 상태를 DB에 두어 서버 재시작 후에도 대기 중인 작업이 이어서 처리된다.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(String(36), primary_key=True)  # UUID
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+    
+    # 작업 정보
+    kind = Column(String(20), nullable=False)  # generate(이미지), text
+    status = Column(String(20), nullable=False, default="queued", index=True)  # queued, running, completed, failed
+    request = Column(Text, nullable=False)  # 요청 본문 (JSON)
+    webhook_url = Column(Text)  # 완료 시 알림 URL
+    attempts = Column(Integer, default=0)  # 실행 시도 횟수
+    worker_id = Column(String(64))  # 실행 중인 서버 프로세스
+    lease_expires_at = Column(DateTime(timezone=True), index=True)  # 이 시각까지 갱신이 없으면 다시 대기 상태로
+    
+    # 결과
+    record_id = Column(Integer, ForeignKey("analysis_records.id"))  # 생성된 AnalysisRecord
+    result = Column(Text)  # 응답 본문 (JSON)
+    error_message = Column(Text)
+    webhook_status = Column(Integer)  # 마지막 웹훅 응답 코드
+    
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}')>"
+    
+    def to_dict(self):
+        """딕셔너리로 변환"""
+        return {
+            "id": self.id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "kind": self.kind,
+            "status": self.status,
+            "request": json.loads(self.request) if self.request else None,
+            "webhook_url": self.webhook_url,
+            "attempts": self.attempts,
+            "worker_id": self.worker_id,
+            "record_id": self.record_id,
+            "result": json.loads(self.result) if self.result else None,
+            "error_message": self.error_message,
+            "webhook_status": self.webhook_status,
+        }
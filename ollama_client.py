@@ -0,0 +1,475 @@
+"""
+Ollama 비동기 클라이언트
+모든 엔드포인트가 하나의 커넥션 풀(keep-alive)을 공유하도록 httpx.AsyncClient를 감싼 모듈
+OLLAMA_HOSTS에 여러 노드를 지정하면 OllamaPool이 요청을 노드 간에 분배한다.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+from dotenv import load_dotenv
+
+from metrics import metrics
+from scheduler import ollama_scheduler, resolve_priority, PRIORITY_INTERACTIVE
+
+# .env 파일 로드
+load_dotenv()
+
+# Ollama 연결 설정
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# 여러 Ollama 노드 (쉼표 구분, 없으면 OLLAMA_HOST 하나)
+OLLAMA_HOSTS = [h.strip() for h in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if h.strip()]
+
+# 단계별 타임아웃 (초)
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "10"))  # TCP 연결
+OLLAMA_FIRST_BYTE_TIMEOUT = float(os.getenv("OLLAMA_FIRST_BYTE_TIMEOUT", "300"))  # 응답 첫 바이트 (청크 간 대기)
+OLLAMA_TOTAL_TIMEOUT = float(os.getenv("OLLAMA_TOTAL_TIMEOUT", "300"))  # 요청 전체
+
+# 커넥션 풀 설정
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+OLLAMA_MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "20"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+
+# 노드 헬스체크/제외 설정
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10"))  # 능동 점검 주기 (초)
+OLLAMA_EJECT_FAILURES = int(os.getenv("OLLAMA_EJECT_FAILURES", "3"))  # 연속 실패 시 제외
+OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))  # 최초 제외 시간 (반복 시 2배씩)
+OLLAMA_EJECT_MAX_SECONDS = float(os.getenv("OLLAMA_EJECT_MAX_SECONDS", "300"))
+
+# 호출 후 모델을 메모리에 유지할 시간 (Ollama keep_alive, 예: "30m", 비우면 Ollama 기본값)
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+# load_duration이 이 값(ms)을 넘으면 콜드 스타트로 집계
+OLLAMA_COLD_START_MS = float(os.getenv("OLLAMA_COLD_START_MS", "1000"))
+
+
+class OllamaError(Exception):
+    """Ollama 호출 실패의 기본 예외"""
+
+
+class OllamaTimeoutError(OllamaError):
+    """연결/첫 바이트/전체 타임아웃 초과"""
+
+
+class OllamaConnectionError(OllamaError):
+    """Ollama 서버에 연결할 수 없음"""
+
+
+class OllamaAPIError(OllamaError):
+    """Ollama가 200이 아닌 상태 코드를 반환"""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Ollama API 오류 ({status_code}): {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class OllamaClient:
+    """
+    공유 커넥션 풀을 사용하는 Ollama 비동기 클라이언트
+
+    httpx.AsyncClient는 첫 호출 시 생성되어 프로세스 수명 동안 재사용되며,
+    lifespan 종료 시 close()로 정리한다.
+    """
+
+    def __init__(
+        self,
+        host: str = OLLAMA_HOST,
+        connect_timeout: float = OLLAMA_CONNECT_TIMEOUT,
+        first_byte_timeout: float = OLLAMA_FIRST_BYTE_TIMEOUT,
+        total_timeout: float = OLLAMA_TOTAL_TIMEOUT,
+        max_connections: int = OLLAMA_MAX_CONNECTIONS,
+        max_keepalive: int = OLLAMA_MAX_KEEPALIVE,
+        keepalive_expiry: float = OLLAMA_KEEPALIVE_EXPIRY,
+    ):
+        self.host = host.rstrip("/")
+        self.total_timeout = total_timeout
+        self._timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=first_byte_timeout,
+            write=connect_timeout,
+            pool=connect_timeout,
+        )
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """공유 AsyncClient 반환 (없으면 생성)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.host,
+                timeout=self._timeout,
+                limits=self._limits,
+            )
+        return self._client
+
+    async def close(self):
+        """커넥션 풀 정리"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def _request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """전체 타임아웃을 적용해 요청을 보내고 httpx 예외를 Ollama 예외로 변환"""
+        client = self._get_client()
+        try:
+            response = await asyncio.wait_for(
+                client.request(method, path, **kwargs),
+                timeout=timeout or self.total_timeout,
+            )
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            raise OllamaTimeoutError("Ollama 서버 응답 시간 초과") from e
+        except httpx.TransportError as e:
+            raise OllamaConnectionError(f"Ollama 서버에 연결할 수 없습니다: {e}") from e
+
+        if response.status_code != 200:
+            raise OllamaAPIError(response.status_code, response.text)
+        return response
+
+    async def generate(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """/api/generate 비스트리밍 호출"""
+        payload = {**payload, "stream": False}
+        response = await self._request("POST", "/api/generate", json=payload)
+        return response.json()
+
+    async def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """/api/chat 비스트리밍 호출"""
+        payload = {**payload, "stream": False}
+        response = await self._request("POST", "/api/chat", json=payload)
+        return response.json()
+
+    async def generate_stream(self, payload: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        /api/generate 스트리밍 호출
+
+        Ollama가 보내는 NDJSON 라인을 그대로 yield 한다.
+        청크 간 대기는 첫 바이트 타임아웃, 스트림 전체는 전체 타임아웃으로 제한한다.
+        """
+        payload = {**payload, "stream": True}
+        client = self._get_client()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.total_timeout
+
+        try:
+            async with client.stream("POST", "/api/generate", json=payload) as response:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    raise OllamaAPIError(response.status_code, body.decode("utf-8", errors="replace"))
+
+                lines = response.aiter_lines()
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise OllamaTimeoutError("Ollama 서버 응답 시간 초과")
+                    try:
+                        line = await asyncio.wait_for(lines.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    if line:
+                        yield line
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            raise OllamaTimeoutError("Ollama 서버 응답 시간 초과") from e
+        except httpx.TransportError as e:
+            raise OllamaConnectionError(f"Ollama 서버에 연결할 수 없습니다: {e}") from e
+
+    async def tags(self, timeout: float = 5) -> Dict[str, Any]:
+        """/api/tags 호출 (설치된 모델 목록)"""
+        response = await self._request("GET", "/api/tags", timeout=timeout)
+        return response.json()
+
+    async def load(self, model: str, keep_alive: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """프롬프트 없이 /api/generate를 호출해 모델을 메모리에 로드 (keep_alive 갱신)"""
+        payload = {"model": model, "keep_alive": keep_alive, "stream": False}
+        response = await self._request("POST", "/api/generate", timeout=timeout, json=payload)
+        return response.json()
+
+    async def ps(self, timeout: float = 5) -> Dict[str, Any]:
+        """/api/ps 호출 (메모리에 로드된 모델 목록)"""
+        response = await self._request("GET", "/api/ps", timeout=timeout)
+        return response.json()
+
+
+def _model_names(body: Dict[str, Any]) -> Set[str]:
+    return {m.get("name") or m.get("model") for m in body.get("models", [])} - {None}
+
+
+def model_matches(model: str, names: Set[str]) -> bool:
+    """태그 생략(gemma3 ↔ gemma3:latest)을 고려한 모델 이름 비교"""
+    if model in names:
+        return True
+    return ":" not in model and f"{model}:latest" in names
+
+
+class Backend:
+    """Ollama 노드 하나의 상태 (진행 중 요청 수, 연속 실패, 로드된 모델)"""
+
+    def __init__(self, host: str):
+        self.host = host.rstrip("/")
+        self.client = OllamaClient(host=host)
+        self.outstanding = 0
+        self.failures = 0  # 연속 실패 횟수
+        self.ejections = 0  # 연속 제외 횟수 (제외 시간 백오프)
+        self.ejected_until = 0.0
+        self.loaded_models: Set[str] = set()
+        self.available_models: Optional[Set[str]] = None  # 점검 전에는 알 수 없음
+        self.requests = 0
+        self.errors = 0
+        self.avg_latency = None  # 성공 호출 지연 시간 EWMA (초)
+        self.cold_starts = 0  # load_duration이 임계값을 넘은 호출 수
+        self.last_checked = None
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def affinity(self, model: str) -> int:
+        """모델 선호도: 2=이미 로드됨, 1=설치됨 또는 미확인, 0=없음"""
+        if model_matches(model, self.loaded_models):
+            return 2
+        if self.available_models is None or model_matches(model, self.available_models):
+            return 1
+        return 0
+
+    def record_success(self, elapsed: Optional[float] = None, model: Optional[str] = None):
+        if self.ejected_until:
+            print(f"✅ Ollama 노드 복귀: {self.host}")
+            metrics.inc("ollama_backend_readmitted")
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        if model:
+            self.loaded_models.add(model)  # 방금 응답했으므로 로드된 상태
+        if elapsed is not None:
+            self.avg_latency = elapsed if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * elapsed
+
+    def record_failure(self):
+        self.errors += 1
+        self.failures += 1
+        if self.failures >= OLLAMA_EJECT_FAILURES and self.available:
+            duration = min(OLLAMA_EJECT_SECONDS * 2 ** self.ejections, OLLAMA_EJECT_MAX_SECONDS)
+            self.ejections += 1
+            self.failures = 0
+            self.ejected_until = time.monotonic() + duration
+            self.loaded_models = set()
+            metrics.inc("ollama_backend_ejected")
+            print(f"⚠️  Ollama 노드 제외 ({duration:.0f}초): {self.host}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "host": self.host,
+            "available": self.available,
+            "ejected_for_seconds": round(max(0.0, self.ejected_until - time.monotonic()), 1),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "cold_starts": self.cold_starts,
+            "consecutive_failures": self.failures,
+            "avg_latency_ms": round(self.avg_latency * 1000, 1) if self.avg_latency is not None else None,
+            "loaded_models": sorted(self.loaded_models),
+            "available_models": sorted(self.available_models) if self.available_models is not None else None,
+        }
+
+
+class OllamaPool:
+    """
+    여러 Ollama 노드에 요청을 분배하는 클라이언트 (OllamaClient와 같은 인터페이스)
+
+    - 노드 선택: 요청 모델이 이미 로드된 노드 → 설치된 노드 순으로, 그 안에서 진행 중 요청이 가장 적은 노드
+    - 수동 점검: 연결 실패/타임아웃/5xx가 연속되면 일정 시간 제외 (반복 시 제외 시간 2배)
+    - 능동 점검: 주기적으로 /api/ps, /api/tags를 호출해 로드된 모델을 갱신하고 제외된 노드를 복귀시킴
+    - 연결 실패는 생성이 시작되지 않았으므로 다른 노드로 한 번씩 재시도
+    - 모든 생성 호출은 스케줄러 슬롯을 얻은 뒤 실행되며, 응답에는 처리한 노드(backend)가 포함됨
+    """
+
+    def __init__(self, hosts: List[str] = OLLAMA_HOSTS, health_interval: float = OLLAMA_HEALTH_INTERVAL):
+        self.backends = [Backend(host) for host in hosts]
+        self.health_interval = health_interval
+        self._health_task: Optional[asyncio.Task] = None
+
+    def _pick(self, model: Optional[str], exclude: Set[Backend]) -> Optional[Backend]:
+        candidates = [b for b in self.backends if b not in exclude and b.available]
+        if not candidates:
+            # 모두 제외된 상태면 제외가 가장 먼저 끝나는 노드에 시도
+            remaining = [b for b in self.backends if b not in exclude]
+            return min(remaining, key=lambda b: b.ejected_until) if remaining else None
+        return min(
+            candidates,
+            key=lambda b: (-b.affinity(model) if model else 0, b.outstanding, random.random())
+        )
+
+    def _with_keep_alive(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """모델이 호출 사이에 언로드되지 않도록 keep_alive 지정 (요청에 있으면 유지)"""
+        if OLLAMA_KEEP_ALIVE and "keep_alive" not in payload:
+            return {**payload, "keep_alive": OLLAMA_KEEP_ALIVE}
+        return payload
+
+    def _observe_load(self, backend: Backend, result: Dict[str, Any]):
+        """요청별 모델 로드 시간 집계 (콜드 스타트 감지)"""
+        load_ms = (result.get("load_duration") or 0) / 1e6
+        metrics.observe("ollama_load_ms", load_ms)
+        if load_ms >= OLLAMA_COLD_START_MS:
+            backend.cold_starts += 1
+            metrics.inc("ollama_cold_starts")
+
+    def _is_backend_failure(self, error: Exception) -> bool:
+        if isinstance(error, OllamaAPIError):
+            return error.status_code >= 500
+        return isinstance(error, OllamaError)
+
+    async def generate(self, payload: Dict[str, Any], priority: Optional[int] = None) -> Dict[str, Any]:
+        """
+        /api/generate 비스트리밍 호출
+
+        스케줄러의 실행 슬롯을 얻은 뒤 노드를 골라 호출한다.
+
+        Raises:
+            SchedulerRejectedError: 대기열이 가득 찼거나 대기 기한 초과
+        """
+        return await self._call("generate", payload, priority)
+
+    async def chat(self, payload: Dict[str, Any], priority: Optional[int] = None) -> Dict[str, Any]:
+        """/api/chat 비스트리밍 호출 (generate와 같은 스케줄링/노드 선택)"""
+        return await self._call("chat", payload, priority)
+
+    async def _call(self, method: str, payload: Dict[str, Any], priority: Optional[int]) -> Dict[str, Any]:
+        payload = self._with_keep_alive(payload)
+        model = payload.get("model")
+        loop = asyncio.get_running_loop()
+        tried: Set[Backend] = set()
+        async with ollama_scheduler.slot(resolve_priority(priority), model=model):
+            while True:
+                backend = self._pick(model, tried)
+                if backend is None:
+                    raise OllamaConnectionError("사용 가능한 Ollama 노드가 없습니다.")
+                tried.add(backend)
+                backend.outstanding += 1
+                backend.requests += 1
+                start = loop.time()
+                try:
+                    result = await getattr(backend.client, method)(payload)
+                except OllamaConnectionError:
+                    backend.record_failure()
+                    if len(tried) < len(self.backends):
+                        metrics.inc("ollama_backend_failover")
+                        continue
+                    raise
+                except Exception as e:
+                    if self._is_backend_failure(e):
+                        backend.record_failure()
+                    raise
+                finally:
+                    backend.outstanding -= 1
+                elapsed = loop.time() - start
+                backend.record_success(elapsed, model)
+                self._observe_load(backend, result)
+                ollama_scheduler.observe(result, elapsed)
+                result["backend"] = backend.host
+                return result
+
+    async def generate_stream(self, payload: Dict[str, Any], priority: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        /api/generate 스트리밍 호출
+
+        스트림이 끝날 때까지 스케줄러 슬롯을 점유하며 기본 우선순위는 interactive이다.
+        첫 라인을 받기 전의 연결 실패만 다른 노드로 재시도하며,
+        마지막(done) 라인에 처리한 노드(backend)를 덧붙인다.
+        """
+        payload = self._with_keep_alive(payload)
+        model = payload.get("model")
+        loop = asyncio.get_running_loop()
+        tried: Set[Backend] = set()
+        async with ollama_scheduler.slot(resolve_priority(priority, PRIORITY_INTERACTIVE), model=model):
+            while True:
+                backend = self._pick(model, tried)
+                if backend is None:
+                    raise OllamaConnectionError("사용 가능한 Ollama 노드가 없습니다.")
+                tried.add(backend)
+                backend.outstanding += 1
+                backend.requests += 1
+                start = loop.time()
+                started = False
+                try:
+                    async for line in backend.client.generate_stream(payload):
+                        started = True
+                        if '"done":true' in line.replace(" ", ""):
+                            try:
+                                chunk = json.loads(line)
+                            except ValueError:
+                                chunk = None
+                            if chunk is not None:
+                                # 마지막 청크의 eval 메트릭을 적응형 한도에 반영
+                                ollama_scheduler.observe(chunk, loop.time() - start)
+                                self._observe_load(backend, chunk)
+                                chunk["backend"] = backend.host
+                                line = json.dumps(chunk, ensure_ascii=False)
+                        yield line
+                except OllamaConnectionError:
+                    backend.record_failure()
+                    if not started and len(tried) < len(self.backends):
+                        metrics.inc("ollama_backend_failover")
+                        continue
+                    raise
+                except Exception as e:
+                    if self._is_backend_failure(e):
+                        backend.record_failure()
+                    raise
+                finally:
+                    backend.outstanding -= 1
+                backend.record_success(loop.time() - start, model)
+                return
+
+    async def tags(self, timeout: float = 5) -> Dict[str, Any]:
+        """/api/tags 호출 (사용 가능한 노드 중 처음 응답한 노드 기준)"""
+        last_error: Optional[Exception] = None
+        for backend in sorted(self.backends, key=lambda b: not b.available):
+            try:
+                return await backend.client.tags(timeout=timeout)
+            except OllamaError as e:
+                last_error = e
+        raise last_error or OllamaConnectionError("사용 가능한 Ollama 노드가 없습니다.")
+
+    async def check(self, backend: Backend):
+        """노드 하나 능동 점검 (로드/설치된 모델 갱신)"""
+        try:
+            loaded = await backend.client.ps(timeout=5)
+            installed = await backend.client.tags(timeout=5)
+        except OllamaError:
+            backend.record_failure()
+            return
+        backend.loaded_models = _model_names(loaded)
+        backend.available_models = _model_names(installed)
+        backend.last_checked = time.time()
+        backend.record_success()
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self.check(b) for b in self.backends), return_exceptions=True)
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        """능동 헬스체크 시작 (lifespan에서 호출)"""
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def close(self):
+        """헬스체크 중지 및 모든 노드의 커넥션 풀 정리"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for backend in self.backends:
+            await backend.client.close()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [b.stats() for b in self.backends]
+
+
+# 모든 엔드포인트가 공유하는 기본 클라이언트
+ollama_client = OllamaPool()
@@ -0,0 +1,250 @@
+"""
+기록 목록 keyset 페이지네이션, 필드 선택, 개수 추정
+(created_at, id) 커서로 다음 페이지를 찾으므로 페이지 깊이와 관계없이 인덱스 범위 조회 한 번으로 끝나고,
+목록에는 고른 컬럼과 큰 텍스트의 앞부분만 읽어 보내며, 전체 개수는 요청할 때만 정확히 센다.
+"""
+import os
+import json
+import time
+import base64
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import String, func, literal, select, text, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only
+
+from metrics import metrics
+from models import AnalysisRecord
+from record_storage import RECORDS_PREVIEW_CHARS, decompress_preview, decompress_text, preview_prefix_bytes
+
+# .env 파일 로드
+load_dotenv()
+
+# 개수 캐시 유지 시간 (초) / 최대 필터 수 (필터는 클라이언트가 정하므로 오래된 것부터 제거)
+RECORDS_COUNT_CACHE_SECONDS = float(os.getenv("RECORDS_COUNT_CACHE_SECONDS", "60"))
+RECORDS_COUNT_CACHE_MAX_ENTRIES = int(os.getenv("RECORDS_COUNT_CACHE_MAX_ENTRIES", "256"))
+
+# 저장 방식에 따라 나뉜 필드가 실제로 읽는 컬럼 (to_dict에는 원문 필드 하나로 나옴)
+RECORD_FIELD_COLUMNS = {
+    "prompt": ("_prompt", "prompt_id"),
+    "response": ("_response", "response_compressed"),
+}
+RECORD_STORAGE_COLUMNS = ("prompt_id", "response_compressed")
+
+# 목록에서 고를 수 있는 필드 (to_dict 키와 동일)
+RECORD_FIELDS = tuple(
+    column.name for column in AnalysisRecord.__table__.columns if column.name not in RECORD_STORAGE_COLUMNS
+)
+
+# 목록에서 앞부분만 잘라 보내는 큰 텍스트 필드 (전체는 /api/records/{record_id})
+RECORD_PREVIEW_FIELDS = ("prompt", "response", "error_message")
+
+# 이름 있는 필드 묶음 (full은 미리보기 없이 전체 컬럼)
+RECORD_VIEWS = {
+    "summary": (
+        "id", "created_at", "endpoint", "model", "success", "cache_hit", "has_image", "image_url",
+        "template_id", "session_id", "document_id", "total_duration", "eval_count",
+        "prompt", "response", "error_message",
+    ),
+    "full": RECORD_FIELDS,
+}
+
+# 전체 개수 모드: exact(정확히 세기), estimate(추정치/캐시), none(생략)
+COUNT_MODES = ("exact", "estimate", "none")
+
+
+class InvalidCursorError(ValueError):
+    """해석할 수 없는 커서"""
+
+
+class InvalidFieldsError(ValueError):
+    """알 수 없는 view 또는 필드"""
+
+
+def resolve_fields(view: str = "summary", fields: Optional[str] = None) -> List[str]:
+    """
+    view 이름 또는 쉼표로 구분한 fields → 응답에 넣을 필드 목록 (id는 항상 포함)
+
+    Raises:
+        InvalidFieldsError: 알 수 없는 view 또는 필드
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in RECORD_FIELDS]
+        if unknown:
+            raise InvalidFieldsError(
+                f"알 수 없는 필드입니다: {', '.join(unknown)} (사용 가능: {', '.join(RECORD_FIELDS)})"
+            )
+    elif view in RECORD_VIEWS:
+        names = list(RECORD_VIEWS[view])
+    else:
+        raise InvalidFieldsError(f"view는 {', '.join(RECORD_VIEWS)} 중 하나여야 합니다: {view}")
+    if "id" not in names:
+        names.insert(0, "id")
+    return list(dict.fromkeys(names))
+
+
+def encode_cursor(created_at: datetime, record_id: int) -> str:
+    """마지막 행의 (created_at, id) → 불투명한 커서 문자열"""
+    raw = json.dumps([created_at.isoformat(), record_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    커서 → (created_at, id)
+
+    Raises:
+        InvalidCursorError: 형식이 잘못된 커서
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"잘못된 cursor입니다: {cursor}") from e
+
+
+def load_options(names) -> list:
+    """필드 목록 → 해당 컬럼만 로드하는 옵션"""
+    columns = [
+        getattr(AnalysisRecord, column)
+        for name in names
+        for column in RECORD_FIELD_COLUMNS.get(name, (name,))
+    ]
+    options = [load_only(*columns)]
+    if "prompt" in names:
+        # 중복 제거된 프롬프트 본문은 전체 프롬프트를 보낼 때만 JOIN
+        options.append(joinedload(AnalysisRecord.prompt_text))
+    return options
+
+
+def preview_columns(names) -> list:
+    """미리보기 필드 → 앞부분(잘렸는지 알 수 있게 한 글자 더)만 읽는 SQL 식"""
+    columns = []
+    for name in names:
+        columns.append(func.substr(getattr(AnalysisRecord, name), 1, RECORDS_PREVIEW_CHARS + 1))
+        if name == "response":
+            # 압축된 응답은 압축 데이터 앞부분만 읽어 복원
+            columns.append(func.substr(AnalysisRecord.response_compressed, 1, preview_prefix_bytes()))
+    return columns
+
+
+def _preview(text_value: Optional[str]) -> Tuple[Optional[str], bool]:
+    truncated = text_value is not None and len(text_value) > RECORDS_PREVIEW_CHARS
+    return (text_value[:RECORDS_PREVIEW_CHARS] if truncated else text_value), truncated
+
+
+def read_previews(names, values) -> Tuple[Dict[str, Tuple[Optional[str], bool]], bool]:
+    """
+    preview_columns 결과 → (필드별 (미리보기, 잘렸는지), 완전한지)
+
+    압축 데이터 앞부분으로 미리보기를 채우지 못한 경우(앞부분 블록이 없는 이전 형식 등) 완전하지 않음으로 표시하며,
+    이때 response는 full_response_previews로 다시 채운다.
+    """
+    values = iter(values)
+    previews = {}
+    complete = True
+    for name in names:
+        text_value = next(values)
+        if name == "response":
+            prefix = next(values)
+            if text_value is None and prefix is not None:
+                prefix = bytes(prefix)
+                text_value = decompress_preview(prefix, RECORDS_PREVIEW_CHARS)
+                if len(text_value) <= RECORDS_PREVIEW_CHARS and len(prefix) >= preview_prefix_bytes():
+                    complete = False
+        previews[name] = _preview(text_value)
+    return previews, complete
+
+
+async def full_response_previews(db: AsyncSession, record_ids) -> Dict[int, Tuple[Optional[str], bool]]:
+    """압축 데이터 전체를 읽어 response 미리보기 생성 (read_previews가 완전하지 않은 레코드만)"""
+    rows = await db.execute(
+        select(AnalysisRecord.id, AnalysisRecord.response_compressed).where(AnalysisRecord.id.in_(record_ids))
+    )
+    return {record_id: _preview(decompress_text(bytes(blob))) for record_id, blob in rows}
+
+
+def keyset_before(created_column, id_column, created_at: datetime, record_id: int, dialect: str):
+    """
+    최신순 정렬에서 커서 다음 행들의 조건: (created_at, id) < (커서 created_at, 커서 id)
+
+    행 값 비교를 그대로 쓰므로 (…, created_at, id) 복합 인덱스의 범위 조회가 된다.
+    """
+    if dialect == "sqlite":
+        # SQLite는 created_at을 CURRENT_TIMESTAMP 문자열로 저장하므로 같은 형식의 문자열로 비교
+        fmt = "%Y-%m-%d %H:%M:%S.%f" if created_at.microsecond else "%Y-%m-%d %H:%M:%S"
+        return tuple_(type_coerce(created_column, String), id_column) < tuple_(
+            literal(created_at.strftime(fmt), String), literal(record_id)
+        )
+    return tuple_(created_column, id_column) < tuple_(literal(created_at, created_column.type), literal(record_id))
+
+
+class CountCache:
+    """필터별 정확한 개수를 잠시 보관 (같은 필터로 페이지를 넘길 때 다시 세지 않음), 필터 수로 제한되는 LRU"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = RECORDS_COUNT_CACHE_SECONDS,
+        max_entries: int = RECORDS_COUNT_CACHE_MAX_ENTRIES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Any, Tuple[int, float]]" = OrderedDict()
+
+    def get(self, key) -> Optional[int]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value: int):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            metrics.inc("records_count_cache_evictions")
+
+
+async def _planner_estimate(db: AsyncSession, stmt) -> int:
+    """PostgreSQL 플래너의 예상 행 수 (테이블을 읽지 않음)"""
+    compiled = stmt.compile(dialect=db.bind.dialect, compile_kwargs={"literal_binds": True})
+    plan = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}"))).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_rows(db: AsyncSession, stmt, mode: str, cache_key=None) -> Tuple[Optional[int], Optional[str]]:
+    """
+    stmt 결과 행 수 → (개수, 종류)
+
+    종류: exact(방금 셈), cached(최근에 센 값), estimate(플래너 추정치), 생략하면 (None, None)
+    estimate 모드에서 추정치를 낼 수 없는 DB(SQLite)는 한 번 세어 캐시한다.
+    """
+    if mode == "none":
+        return None, None
+    if mode == "estimate":
+        cached = count_cache.get(cache_key)
+        if cached is not None:
+            return cached, "cached"
+        if db.bind.dialect.name == "postgresql":
+            return await _planner_estimate(db, stmt), "estimate"
+
+    start = time.perf_counter()
+    total = (await db.execute(select(func.count()).select_from(stmt.subquery()))).scalar()
+    metrics.observe("records_count_ms", (time.perf_counter() - start) * 1000)
+    count_cache.put(cache_key, total)
+    return total, "exact"
+
+
+# 서버 전역 개수 캐시
+count_cache = CountCache()
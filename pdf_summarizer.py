@@ -0,0 +1,308 @@
+"""
+PDF 요약 파이프라인
+PDF를 임시 파일로 받아 페이지를 하나씩 꺼내 처리한다.
+텍스트 레이어가 있는 페이지는 텍스트로, 이미지뿐인 페이지만 렌더링하여 비전 입력으로 요약하고,
+페이지 요약은 동시성 제한 하에 Ollama로 보낸 뒤 계층적으로 합쳐 하나의 요약을 만든다.
+"""
+import os
+import base64
+import asyncio
+import tempfile
+import importlib.util
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+
+from image_fetcher import image_fetcher
+from image_processing import image_preprocessor, preprocess_image_bytes
+from models import AnalysisRecord, Document
+from ollama_client import ollama_client
+from record_writer import record_writer
+from scheduler import PRIORITY_BATCH
+from summarization import reduce_summaries, SUMMARY_CONCURRENCY
+
+# .env 파일 로드
+load_dotenv()
+
+# PyMuPDF(fitz)가 설치된 경우에만 PDF 요약 사용 가능
+PDF_SUPPORT = importlib.util.find_spec("fitz") is not None
+
+# PDF 처리 설정
+PDF_MAX_BYTES = int(os.getenv("PDF_MAX_BYTES", str(100 * 1024 * 1024)))  # 기본 100MB
+PDF_DOWNLOAD_TIMEOUT = float(os.getenv("PDF_DOWNLOAD_TIMEOUT", "120"))
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "500"))
+PDF_TEXT_MIN_CHARS = int(os.getenv("PDF_TEXT_MIN_CHARS", "50"))  # 이보다 짧으면 이미지 페이지로 간주
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "144"))
+PDF_PAGE_CONCURRENCY = int(os.getenv("PDF_PAGE_CONCURRENCY", str(SUMMARY_CONCURRENCY)))
+
+PDF_ENDPOINT = "/api/summarize/pdf"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+PAGE_TEXT_PROMPT = "다음은 PDF 문서의 {page}페이지 내용입니다. 이 페이지의 핵심 내용을 간결하게 요약해주세요."
+PAGE_IMAGE_PROMPT = "이 이미지는 PDF 문서의 {page}페이지입니다. 이 페이지의 핵심 내용을 간결하게 요약해주세요."
+
+
+class PdfError(Exception):
+    """PDF를 읽거나 받을 수 없음"""
+
+
+def count_pdf_pages(path: str) -> int:
+    """PDF 페이지 수 확인 (프로세스 풀 워커에서 실행)"""
+    import fitz
+
+    with fitz.open(path) as doc:
+        if doc.needs_pass:
+            raise PdfError("암호화된 PDF는 지원하지 않습니다.")
+        return doc.page_count
+
+
+def extract_pdf_page(path: str, index: int, min_chars: int, dpi: int) -> Dict[str, Any]:
+    """
+    PDF 한 페이지 추출 (프로세스 풀 워커에서 실행)
+
+    텍스트 레이어가 충분하면 텍스트를, 아니면 렌더링 후 전처리한 이미지 바이트를 반환한다.
+    """
+    import fitz
+
+    with fitz.open(path) as doc:
+        page = doc.load_page(index)
+        text = page.get_text("text").strip()
+        if len(text) >= min_chars:
+            return {"page": index + 1, "mode": "text", "text": text}
+        png = page.get_pixmap(dpi=dpi).tobytes("png")
+
+    return {"page": index + 1, "mode": "image", "image": preprocess_image_bytes(png).content}
+
+
+async def save_upload_to_temp(upload: UploadFile, max_bytes: int = PDF_MAX_BYTES) -> str:
+    """업로드 파일을 크기 제한 하에 임시 파일로 저장"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    total = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                total += len(chunk)
+                if total > max_bytes:
+                    raise PdfError(f"PDF 크기가 제한({max_bytes} bytes)을 초과합니다.")
+                f.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+async def download_pdf_to_temp(url: str, max_bytes: int = PDF_MAX_BYTES) -> str:
+    """URL의 PDF를 크기 제한 하에 임시 파일로 스트리밍"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            await image_fetcher.download_to_file(url, f, max_bytes=max_bytes, timeout=PDF_DOWNLOAD_TIMEOUT)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def remove_temp_pdf(path: str):
+    """임시 PDF 삭제 (이미 삭제된 경우 무시)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def _save_document(db: AsyncSession, document: Document):
+    """문서 상태 저장 (실패해도 요약은 계속 진행)"""
+    try:
+        db.add(document)
+        await db.commit()
+    except Exception as db_error:
+        await db.rollback()
+        print(f"⚠️  문서 저장 실패 (요약은 계속 진행): {db_error}")
+
+
+async def _save_record(record: AnalysisRecord) -> Optional[int]:
+    """분석 기록을 write-behind 큐로 저장 → record_id (실패해도 요약은 계속 진행)"""
+    try:
+        return await record_writer.enqueue(record)
+    except Exception as db_error:
+        print(f"⚠️  DB 저장 실패 (요약은 계속 진행): {db_error}")
+        return None
+
+
+def _with_instruction(prompt: str, instruction: Optional[str]) -> str:
+    return f"{prompt}\n요약 지침: {instruction}" if instruction else prompt
+
+
+async def summarize_pdf(
+    path: str,
+    document: Document,
+    db: AsyncSession,
+    model: str,
+    instruction: Optional[str] = None,
+    temperature: Optional[float] = 0.3,
+    max_tokens: Optional[int] = 1000,
+    concurrency: int = PDF_PAGE_CONCURRENCY,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    PDF 요약 진행 상황을 이벤트(dict)로 yield
+
+    이벤트 종류: started, page, reduce, done, error
+    모든 페이지/통합 호출은 배치 우선순위로 스케줄링되며,
+    document_id로 연결된 AnalysisRecord로 저장된다 (write-behind 큐, done/error 전에 모두 저장).
+    """
+    events: asyncio.Queue = asyncio.Queue()
+    options = {"temperature": temperature, "num_predict": max_tokens}
+    # 저장 실패 후 롤백되면 document가 만료되어 비동기 세션에서 다시 읽을 수 없으므로 미리 보관
+    document_id = document.id
+    source_url = document.source_url
+
+    async def save_document():
+        # 페이지 기록이 문서보다 먼저 조회되지 않도록 큐에 남은 기록까지 저장한 뒤 문서 상태 갱신
+        await record_writer.flush()
+        await _save_document(db, document)
+
+    async def generate(record: AnalysisRecord, payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+        """Ollama 호출 후 결과를 레코드로 저장 → (요약, record_id), 실패 시 요약은 None"""
+        try:
+            result = await ollama_client.generate(payload, priority=PRIORITY_BATCH)
+        except Exception as e:
+            record.success = False
+            record.error_message = str(e)
+            return None, await _save_record(record)
+        record.response = result.get("response", "")
+        record.success = True
+        record.total_duration = result.get("total_duration")
+        record.load_duration = result.get("load_duration")
+        record.prompt_eval_count = result.get("prompt_eval_count")
+        record.prompt_eval_duration = result.get("prompt_eval_duration")
+        record.eval_count = result.get("eval_count")
+        record.backend = result.get("backend")
+        return record.response, await _save_record(record)
+
+    def new_record(prompt: str, page_number: Optional[int], has_image: bool) -> AnalysisRecord:
+        return AnalysisRecord(
+            endpoint=PDF_ENDPOINT,
+            prompt=prompt,
+            has_image=has_image,
+            image_url=source_url,
+            document_id=document_id,
+            page_number=page_number,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            model=model
+        )
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    mode_counts = {"text": 0, "image": 0}
+
+    async def process_page(index: int) -> Optional[str]:
+        # 세마포어를 잡은 뒤에 추출하므로 메모리에는 동시 처리 중인 페이지만 올라온다
+        async with semaphore:
+            try:
+                page = await image_preprocessor.run(
+                    extract_pdf_page, path, index, PDF_TEXT_MIN_CHARS, PDF_RENDER_DPI
+                )
+            except Exception as e:
+                await events.put({"event": "page", "page": index + 1, "success": False, "error": str(e)})
+                return None
+
+            mode_counts[page["mode"]] += 1
+            if page["mode"] == "text":
+                prompt = _with_instruction(PAGE_TEXT_PROMPT.format(page=page["page"]), instruction)
+                prompt = f"{prompt}\n\n{page['text']}"
+                payload = {"model": model, "prompt": prompt, "options": options}
+            else:
+                prompt = _with_instruction(PAGE_IMAGE_PROMPT.format(page=page["page"]), instruction)
+                payload = {
+                    "model": model,
+                    "prompt": prompt,
+                    "images": [base64.b64encode(page["image"]).decode("utf-8")],
+                    "options": options
+                }
+
+            record = new_record(prompt, page["page"], page["mode"] == "image")
+            summary, record_id = await generate(record, payload)
+            await events.put({
+                "event": "page",
+                "page": page["page"],
+                "mode": page["mode"],
+                "success": summary is not None,
+                "summary": summary,
+                "error": record.error_message,
+                "record_id": record_id
+            })
+            return summary
+
+    async def reduce_step(prompt: str, level: int, group: int) -> str:
+        record = new_record(prompt, None, False)
+        summary, record_id = await generate(record, {"model": model, "prompt": prompt, "options": options})
+        await events.put({
+            "event": "reduce",
+            "level": level,
+            "group": group,
+            "success": summary is not None,
+            "record_id": record_id
+        })
+        if summary is None:
+            raise PdfError(f"요약 통합 실패 (단계 {level}, 그룹 {group}): {record.error_message}")
+        return summary
+
+    async def run():
+        try:
+            page_count = await image_preprocessor.run(count_pdf_pages, path)
+            if page_count > PDF_MAX_PAGES:
+                raise PdfError(f"페이지 수({page_count})가 제한({PDF_MAX_PAGES})을 초과합니다.")
+            document.page_count = page_count
+            await _save_document(db, document)
+            await events.put({"event": "started", "document_id": document_id, "page_count": page_count})
+
+            page_summaries = await asyncio.gather(*(process_page(i) for i in range(page_count)))
+            succeeded: List[str] = [s for s in page_summaries if s]
+            if not succeeded:
+                raise PdfError("요약에 성공한 페이지가 없습니다.")
+
+            summary = await reduce_summaries(
+                succeeded, reduce_step, instruction=instruction, concurrency=concurrency
+            )
+
+            document.text_pages = mode_counts["text"]
+            document.image_pages = mode_counts["image"]
+            document.summary = summary
+            document.status = "completed"
+            document.success = True
+            await save_document()
+            await events.put({
+                "event": "done",
+                "document_id": document_id,
+                "summary": summary,
+                "pages_succeeded": len(succeeded),
+                "pages_failed": page_count - len(succeeded)
+            })
+        except Exception as e:
+            document.text_pages = mode_counts["text"]
+            document.image_pages = mode_counts["image"]
+            document.status = "failed"
+            document.success = False
+            document.error_message = str(e)
+            await save_document()
+            await events.put({"event": "error", "document_id": document_id, "error": str(e)})
+        finally:
+            await events.put(None)
+
+    task = asyncio.ensure_future(run())
+    try:
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+    finally:
+        # 클라이언트가 연결을 끊으면 남은 페이지 처리를 중단
+        if not task.done():
+            task.cancel()
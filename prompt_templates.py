@@ -0,0 +1,150 @@
+"""
+프롬프트 템플릿 레지스트리
+긴 지시문을 서버가 템플릿으로 관리하여, 고정 접두부(system)는 호출마다 바이트 단위로 동일하게 보내고
+요청별로 달라지는 부분은 접미부(suffix)에만 넣는다. 접두부가 같으면 Ollama가 프롬프트 KV 캐시를 재사용한다.
+"""
+import os
+import json
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+# .env 파일 로드
+load_dotenv()
+
+# 템플릿 파일 (없으면 기본 템플릿만 사용)
+PROMPT_TEMPLATES_FILE = os.getenv("PROMPT_TEMPLATES_FILE", "prompt_templates.json")
+
+# 기본 템플릿 (같은 id가 파일에 있으면 파일이 우선)
+DEFAULT_TEMPLATES: List[Dict[str, Any]] = [
+    {
+        "id": "image_analysis",
+        "description": "이미지 상세 분석",
+        "system": (
+            "당신은 이미지를 정확하게 분석하는 어시스턴트입니다.\n"
+            "- 이미지에 실제로 보이는 내용만 설명합니다.\n"
+            "- 텍스트가 있으면 원문 그대로 인용합니다.\n"
+            "- 답변은 한국어로, 항목별 글머리표 형식으로 작성합니다."
+        ),
+        "suffix": "{prompt}",
+    },
+    {
+        "id": "document_ocr",
+        "description": "문서 이미지 텍스트 추출",
+        "system": (
+            "당신은 문서 이미지에서 텍스트를 추출하는 OCR 어시스턴트입니다.\n"
+            "- 보이는 순서(위에서 아래, 왼쪽에서 오른쪽)대로 텍스트를 옮깁니다.\n"
+            "- 표는 Markdown 표로 변환합니다.\n"
+            "- 설명이나 요약을 덧붙이지 않습니다."
+        ),
+        "suffix": "{prompt}",
+    },
+    {
+        "id": "summarize",
+        "description": "텍스트 요약",
+        "system": (
+            "당신은 긴 글을 요약하는 어시스턴트입니다.\n"
+            "- 핵심 주장과 결론을 먼저 제시합니다.\n"
+            "- 원문에 없는 내용은 추가하지 않습니다.\n"
+            "- 답변은 한국어로 작성합니다."
+        ),
+        "suffix": "요약 길이: {length}\n\n{prompt}",
+        "defaults": {"length": "5문장 이내"},
+    },
+]
+
+
+class TemplateError(ValueError):
+    """알 수 없는 템플릿 또는 누락된 변수"""
+
+
+class _Variables(dict):
+    def __missing__(self, key):
+        raise TemplateError(f"템플릿 변수가 누락되었습니다: {key}")
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """고정 접두부(system) + 가변 접미부(suffix) 템플릿"""
+    id: str
+    system: str
+    suffix: str = "{prompt}"
+    description: str = ""
+    defaults: Optional[Dict[str, str]] = None
+
+    @property
+    def prefix_hash(self) -> str:
+        """접두부 바이트의 해시 (접두부가 바뀌었는지 확인용)"""
+        return hashlib.sha256(self.system.encode("utf-8")).hexdigest()[:16]
+
+    def render(self, prompt: str = "", variables: Optional[Dict[str, Any]] = None) -> str:
+        """
+        접미부 생성
+
+        접미부의 {prompt}에는 요청의 prompt가, 나머지 {변수}에는 variables(없으면 defaults)가 들어간다.
+        접미부에 {prompt}가 없는데 prompt가 있으면 끝에 덧붙인다.
+
+        Raises:
+            TemplateError: 필요한 변수가 없음
+        """
+        values = _Variables({**(self.defaults or {}), **(variables or {}), "prompt": prompt})
+        rendered = self.suffix.format_map(values)
+        if prompt and "{prompt}" not in self.suffix:
+            rendered = f"{rendered}\n\n{prompt}"
+        return rendered
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "description": self.description,
+            "system": self.system,
+            "suffix": self.suffix,
+            "defaults": self.defaults or {},
+            "prefix_hash": self.prefix_hash,
+        }
+
+
+class TemplateRegistry:
+    """id로 조회하는 템플릿 모음 (서버 시작 시 한 번 로드, 접두부 문자열은 이후 변경되지 않음)"""
+
+    def __init__(self, path: Optional[str] = PROMPT_TEMPLATES_FILE):
+        self._templates: Dict[str, PromptTemplate] = {}
+        for item in DEFAULT_TEMPLATES:
+            self._add(item)
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    self._add(item)
+
+    def _add(self, item: Dict[str, Any]):
+        template = PromptTemplate(
+            id=item["id"],
+            system=item["system"],
+            suffix=item.get("suffix", "{prompt}"),
+            description=item.get("description", ""),
+            defaults=item.get("defaults"),
+        )
+        self._templates[template.id] = template
+
+    def get(self, template_id: str) -> PromptTemplate:
+        """
+        템플릿 조회
+
+        Raises:
+            TemplateError: 등록되지 않은 id
+        """
+        template = self._templates.get(template_id)
+        if template is None:
+            raise TemplateError(
+                f"알 수 없는 템플릿입니다: {template_id} (사용 가능: {', '.join(sorted(self._templates))})"
+            )
+        return template
+
+    def all(self) -> List[PromptTemplate]:
+        return [self._templates[k] for k in sorted(self._templates)]
+
+
+# 서버 전역 템플릿 레지스트리
+template_registry = TemplateRegistry()
@@ -0,0 +1,198 @@
+"""
+분석 기록 텍스트 저장 방식
+compact 모드에서는 같은 프롬프트를 prompt_texts 테이블에 한 번만 저장해 id로 참조하고,
+큰 응답은 압축(zstd, 없으면 zlib)해서 저장한다. 읽을 때는 모델 계층에서 원문으로 복원된다.
+"""
+import os
+import zlib
+import hashlib
+import threading
+import importlib.util
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from metrics import metrics
+
+# .env 파일 로드
+load_dotenv()
+
+# zstandard가 설치된 경우에만 zstd 압축 사용 가능
+ZSTD_SUPPORT = importlib.util.find_spec("zstandard") is not None
+
+# 저장 설정
+RECORD_STORAGE_MODE = os.getenv("RECORD_STORAGE_MODE", "plain")  # plain: 원문 그대로, compact: 중복 제거 + 압축
+RECORD_COMPRESSION = os.getenv("RECORD_COMPRESSION", "zstd" if ZSTD_SUPPORT else "zlib")
+RECORD_COMPRESSION_LEVEL = os.getenv("RECORD_COMPRESSION_LEVEL")  # 없으면 zstd 3, zlib 6
+RECORD_COMPRESS_MIN_BYTES = int(os.getenv("RECORD_COMPRESS_MIN_BYTES", "1024"))  # 이보다 짧은 응답은 원문 저장
+PROMPT_ID_CACHE_SIZE = int(os.getenv("PROMPT_ID_CACHE_SIZE", "10000"))  # 메모리에 둘 프롬프트 해시 → id 수
+
+# 목록 미리보기 길이 (글자 수)
+RECORDS_PREVIEW_CHARS = int(os.getenv("RECORDS_PREVIEW_CHARS", "200"))
+# 압축 데이터 앞부분만으로 복원할 수 있도록 따로 블록을 끝내는 원문 앞부분 (UTF-8 최악의 경우 글자당 4바이트)
+PREVIEW_HEAD_BYTES = (RECORDS_PREVIEW_CHARS + 1) * 4
+
+STORAGE_MODES = ("plain", "compact")
+COMPRESSIONS = ("zstd", "zlib")
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+if RECORD_STORAGE_MODE not in STORAGE_MODES:
+    raise ValueError(f"RECORD_STORAGE_MODE는 {', '.join(STORAGE_MODES)} 중 하나여야 합니다: {RECORD_STORAGE_MODE}")
+if RECORD_COMPRESSION not in COMPRESSIONS:
+    raise ValueError(f"RECORD_COMPRESSION은 {', '.join(COMPRESSIONS)} 중 하나여야 합니다: {RECORD_COMPRESSION}")
+if RECORD_COMPRESSION == "zstd" and not ZSTD_SUPPORT:
+    print("⚠️  zstandard가 설치되지 않아 zlib으로 압축합니다. (pip install zstandard)")
+    RECORD_COMPRESSION = "zlib"
+
+COMPACT_STORAGE = RECORD_STORAGE_MODE == "compact"
+
+
+def compress_text(value: str) -> Optional[bytes]:
+    """
+    응답 압축 → 압축 바이트 (짧거나 압축해도 줄지 않으면 None, 원문 그대로 저장)
+
+    zstd 프레임은 매직 넘버로 구분되므로 형식 표시 없이 저장한다 (복원 시 zstd/zlib 자동 판별).
+    원문 앞부분(PREVIEW_HEAD_BYTES)은 블록을 따로 끝내 두어, 압축 데이터 앞부분만 읽어도 미리보기를 복원할 수 있다.
+    (zstd는 블록 단위로만 출력하므로 블록을 끝내지 않으면 앞부분에서 아무것도 나오지 않음)
+    """
+    raw = value.encode("utf-8")
+    if len(raw) < RECORD_COMPRESS_MIN_BYTES:
+        return None
+    head, rest = raw[:PREVIEW_HEAD_BYTES], raw[PREVIEW_HEAD_BYTES:]
+    if RECORD_COMPRESSION == "zstd":
+        import zstandard
+        level = int(RECORD_COMPRESSION_LEVEL or 3)
+        compressor = zstandard.ZstdCompressor(level=level).compressobj(size=len(raw))
+        blob = (
+            compressor.compress(head) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            + compressor.compress(rest) + compressor.flush()
+        )
+    else:
+        level = int(RECORD_COMPRESSION_LEVEL or 6)
+        compressor = zlib.compressobj(level)
+        blob = (
+            compressor.compress(head) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            + compressor.compress(rest) + compressor.flush()
+        )
+    return blob if len(blob) < len(raw) else None
+
+
+def _decompressobj(blob: bytes):
+    if blob[:4] == ZSTD_MAGIC:
+        if not ZSTD_SUPPORT:
+            raise RuntimeError("zstd로 압축된 응답을 읽으려면 zstandard가 필요합니다. (pip install zstandard)")
+        import zstandard
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+
+def decompress_text(blob: bytes) -> str:
+    """압축된 응답 → 원문"""
+    return _decompressobj(blob).decompress(blob).decode("utf-8")
+
+
+def decompress_preview(prefix: bytes, max_chars: int) -> str:
+    """
+    압축 데이터의 앞부분만으로 원문 앞부분 복원 (목록 미리보기용)
+
+    잘린 스트림은 복원 가능한 만큼만 풀리며, 최대 max_chars + 1글자를 돌려준다 (잘렸는지 판단용).
+    """
+    data = _decompressobj(prefix).decompress(prefix)
+    return data.decode("utf-8", errors="ignore")[:max_chars + 1]
+
+
+def preview_prefix_bytes() -> int:
+    """앞부분 블록(PREVIEW_HEAD_BYTES)을 모두 담는 압축 데이터 앞부분 길이 (압축되지 않는 최악의 경우 포함)"""
+    return PREVIEW_HEAD_BYTES + 64
+
+
+def prompt_hash(value: str) -> str:
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+
+class PromptStore:
+    """
+    프롬프트 본문 → prompt_texts.id (내용 해시로 중복 제거)
+
+    레코드 INSERT와 같은 연결/트랜잭션에서 prompt_texts 행을 만들고,
+    트랜잭션이 커밋된 id만 메모리 캐시에 올린다 (롤백된 id를 재사용하지 않도록).
+    """
+
+    def __init__(self, cache_size: int = PROMPT_ID_CACHE_SIZE):
+        self.cache_size = max(1, cache_size)
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def resolve(self, conn, value: str) -> int:
+        """
+        프롬프트 id (없으면 prompt_texts에 추가)
+
+        Args:
+            conn: 레코드를 INSERT하는 연결 (flush 중인 연결)
+        """
+        digest = prompt_hash(value)
+        with self._lock:
+            prompt_id = self._ids.get(digest)
+            if prompt_id is not None:
+                self._ids.move_to_end(digest)
+                self._hits += 1
+                return prompt_id
+            self._misses += 1
+
+        conn.execute(
+            text(
+                "INSERT INTO prompt_texts (sha256, content) VALUES (:sha256, :content) "
+                "ON CONFLICT (sha256) DO NOTHING"
+            ),
+            {"sha256": digest, "content": value},
+        )
+        prompt_id = conn.execute(
+            text("SELECT id FROM prompt_texts WHERE sha256 = :sha256"), {"sha256": digest}
+        ).scalar()
+        conn.info.setdefault("pending_prompt_ids", {})[digest] = prompt_id
+        metrics.inc("prompt_text_lookups")
+        return prompt_id
+
+    def _committed(self, conn):
+        pending: Optional[Dict[str, int]] = conn.info.pop("pending_prompt_ids", None)
+        if not pending:
+            return
+        with self._lock:
+            self._ids.update(pending)
+            while len(self._ids) > self.cache_size:
+                self._ids.popitem(last=False)
+
+    def _discarded(self, conn):
+        conn.info.pop("pending_prompt_ids", None)
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._ids),
+            "cache_size": self.cache_size,
+            "hits": self._hits,
+            "misses": self._misses,
+        }
+
+
+def storage_stats() -> dict:
+    """저장 방식과 프롬프트 id 캐시 상태"""
+    return {
+        "mode": RECORD_STORAGE_MODE,
+        "compression": RECORD_COMPRESSION,
+        "compress_min_bytes": RECORD_COMPRESS_MIN_BYTES,
+        "prompt_ids": prompt_store.stats(),
+    }
+
+
+# 서버 전역 프롬프트 저장소
+prompt_store = PromptStore()
+
+# 동기/비동기 엔진 모두의 트랜잭션 경계에서 대기 중인 프롬프트 id를 캐시에 올리거나 버림
+event.listen(Engine, "begin", prompt_store._discarded)
+event.listen(Engine, "commit", prompt_store._committed)
+event.listen(Engine, "rollback", prompt_store._discarded)
@@ -0,0 +1,298 @@
+"""
+분석 기록 write-behind 저장
+핸들러는 미리 할당받은 id로 레코드를 큐에 넣고 바로 응답하며,
+백그라운드 writer가 N개 또는 M밀리초마다 모아서 한 번의 트랜잭션(다중 행 INSERT)으로 저장한다.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from typing import Deque, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event, text
+
+from database import SessionLocal, engine, DATABASE_URL
+from metrics import metrics
+from models import AnalysisRecord, restore_record_text
+
+# .env 파일 로드
+load_dotenv()
+
+# write-behind 설정
+RECORD_WRITER_ENABLED = os.getenv("RECORD_WRITER_ENABLED", "true").lower() == "true"
+RECORD_WRITER_BATCH_SIZE = int(os.getenv("RECORD_WRITER_BATCH_SIZE", "100"))  # 한 번에 저장할 최대 레코드 수
+RECORD_WRITER_FLUSH_MS = float(os.getenv("RECORD_WRITER_FLUSH_MS", "200"))  # 레코드가 큐에 머무는 최대 시간
+RECORD_WRITER_MAX_PENDING = int(os.getenv("RECORD_WRITER_MAX_PENDING", "10000"))  # 메모리에 둘 최대 레코드 수
+RECORD_WRITER_OVERFLOW = os.getenv("RECORD_WRITER_OVERFLOW", "sync")  # 큐가 가득 찼을 때: sync, block, drop
+RECORD_ID_BLOCK_SIZE = int(os.getenv("RECORD_ID_BLOCK_SIZE", "100"))  # 한 번에 할당받을 id 수
+
+OVERFLOW_POLICIES = ("sync", "block", "drop")
+IS_POSTGRES = "postgresql" in DATABASE_URL or "postgres" in DATABASE_URL
+
+
+class IdAllocator:
+    """
+    analysis_records id 블록 할당 (hi/lo)
+
+    PostgreSQL은 테이블의 시퀀스에서 블록 단위로 nextval을 받으므로 다른 프로세스나
+    자동 증가 INSERT와 겹치지 않는다. SQLite는 단일 프로세스를 전제로 MAX(id) 다음부터 메모리에서 센다.
+
+    이벤트 루프에서는 next_id_async를 쓴다. 스레드 락을 잡은 채 DB를 기다리면 루프 전체가 멈추므로,
+    루프 안의 대기는 asyncio.Lock으로 하고 블록 조회는 스레드 풀에서 한다.
+    """
+
+    def __init__(self, block_size: int = RECORD_ID_BLOCK_SIZE):
+        self.block_size = max(1, block_size)
+        self._ids: Deque[int] = deque()
+        self._next_local: Optional[int] = None
+        self._lock = threading.Lock()
+        self._async_lock: Optional[asyncio.Lock] = None  # 이벤트 루프 안에서 생성
+
+    def _fetch_block(self, conn) -> List[int]:
+        if IS_POSTGRES:
+            rows = conn.execute(
+                text(
+                    "SELECT nextval(pg_get_serial_sequence('analysis_records', 'id')) "
+                    "FROM generate_series(1, :n)"
+                ),
+                {"n": self.block_size},
+            )
+            return [row[0] for row in rows]
+        if self._next_local is None:
+            current = conn.execute(text("SELECT COALESCE(MAX(id), 0) FROM analysis_records")).scalar()
+            self._next_local = int(current) + 1
+        start = self._next_local
+        self._next_local += self.block_size
+        return list(range(start, start + self.block_size))
+
+    def next_id(self, conn=None) -> int:
+        """
+        다음 id (블록이 비었을 때만 DB 조회)
+
+        Args:
+            conn: 사용할 연결 (INSERT 도중이면 해당 연결, 없으면 새 연결)
+        """
+        with self._lock:
+            if not self._ids:
+                if conn is not None:
+                    self._ids.extend(self._fetch_block(conn))
+                else:
+                    with engine.begin() as new_conn:
+                        self._ids.extend(self._fetch_block(new_conn))
+                metrics.inc("record_id_blocks")
+            return self._ids.popleft()
+
+    async def next_id_async(self) -> int:
+        """다음 id (이벤트 루프용, 블록이 비었으면 한 코루틴만 스레드 풀에서 새 블록 조회)"""
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            if not self._ids:
+                await asyncio.get_running_loop().run_in_executor(None, self._refill)
+            with self._lock:
+                if self._ids:
+                    return self._ids.popleft()
+        # 다른 스레드가 방금 남은 id를 가져간 경우
+        return await asyncio.get_running_loop().run_in_executor(None, self.next_id)
+
+    def _refill(self):
+        with self._lock:
+            if not self._ids:
+                with engine.begin() as conn:
+                    self._ids.extend(self._fetch_block(conn))
+                metrics.inc("record_id_blocks")
+
+
+class RecordWriter:
+    """
+    AnalysisRecord write-behind 큐
+
+    큐가 가득 찼을 때(overflow):
+        sync: 해당 레코드를 큐를 거치지 않고 바로 저장 (응답이 느려지지만 유실 없음)
+        block: 자리가 날 때까지 대기
+        drop: 저장하지 않고 버림 (record_id는 None)
+    """
+
+    def __init__(
+        self,
+        enabled: bool = RECORD_WRITER_ENABLED,
+        batch_size: int = RECORD_WRITER_BATCH_SIZE,
+        flush_ms: float = RECORD_WRITER_FLUSH_MS,
+        max_pending: int = RECORD_WRITER_MAX_PENDING,
+        overflow: str = RECORD_WRITER_OVERFLOW,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"RECORD_WRITER_OVERFLOW는 {', '.join(OVERFLOW_POLICIES)} 중 하나여야 합니다: {overflow}")
+        self.enabled = enabled
+        self.batch_size = max(1, batch_size)
+        self.flush_ms = flush_ms
+        self.max_pending = max(1, max_pending)
+        self.overflow = overflow
+        self._pending: Deque[AnalysisRecord] = deque()
+        self._task: Optional[asyncio.Task] = None
+        # asyncio 객체는 이벤트 루프 안에서 생성 (start)
+        self._has_pending: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+        self._written = 0
+        self._failed = 0
+        self._dropped = 0
+        self._sync_writes = 0
+        self._batches = 0
+
+    def _write(self, records: List[AnalysisRecord]) -> int:
+        """레코드 일괄 저장 (스레드 풀에서 실행), 저장된 수 반환"""
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            db.add_all(records)
+            db.commit()
+            return len(records)
+        except Exception as e:
+            db.rollback()
+            # 롤백된 prompt_texts id를 가리키지 않도록 변환 전 상태로 되돌린 뒤 재시도
+            for record in records:
+                restore_record_text(record)
+            if len(records) == 1:
+                print(f"⚠️  분석 기록 저장 실패 (id={records[0].id}): {e}")
+                return 0
+            # 문제 레코드만 걸러내기 위해 하나씩 다시 저장
+            print(f"⚠️  분석 기록 일괄 저장 실패, 개별 저장으로 재시도: {e}")
+        finally:
+            db.close()
+        return sum(self._write([record]) for record in records)
+
+    async def _write_async(self, records: List[AnalysisRecord]) -> int:
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        written = await loop.run_in_executor(None, self._write, records)
+        metrics.observe("record_flush_ms", (time.perf_counter() - start) * 1000)
+        metrics.observe("record_flush_size", len(records))
+        self._written += written
+        self._failed += len(records) - written
+        return written
+
+    async def enqueue(self, record: AnalysisRecord) -> Optional[int]:
+        """
+        레코드 저장 요청 → 할당된 id (저장은 백그라운드에서, drop된 경우 None)
+
+        writer가 꺼져 있거나 시작 전이면 바로 저장한다 (이벤트 루프는 막지 않음).
+        """
+        if record.id is None:
+            record.id = await id_allocator.next_id_async()
+        if not self.enabled or self._task is None:
+            await self._write_async([record])
+            return record.id
+
+        if len(self._pending) >= self.max_pending:
+            metrics.inc("record_writer_overflows")
+            if self.overflow == "drop":
+                self._dropped += 1
+                print(f"⚠️  기록 큐가 가득 차 분석 기록을 버립니다 (id={record.id})")
+                return None
+            if self.overflow == "sync":
+                self._sync_writes += 1
+                await self._write_async([record])
+                return record.id
+            while len(self._pending) >= self.max_pending:
+                self._space.clear()
+                await self._space.wait()
+
+        self._pending.append(record)
+        self._has_pending.set()
+        if len(self._pending) >= self.batch_size:
+            self._batch_full.set()
+        return record.id
+
+    async def _flush_batch(self):
+        """큐 앞쪽에서 최대 batch_size개를 꺼내 저장"""
+        async with self._write_lock:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popleft())
+            if len(self._pending) < self.batch_size:
+                self._batch_full.clear()
+            if not self._pending:
+                self._has_pending.clear()
+            self._space.set()
+            if batch:
+                self._batches += 1
+                await self._write_async(batch)
+
+    async def _loop(self):
+        while True:
+            await self._has_pending.wait()
+            if len(self._pending) < self.batch_size:
+                # 배치가 찰 때까지 최대 flush_ms만큼 더 모은다
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), timeout=self.flush_ms / 1000)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self._flush_batch()
+            except Exception as e:
+                print(f"⚠️  분석 기록 저장 루프 오류: {e}")
+
+    async def flush(self):
+        """지금까지 큐에 들어온 레코드를 모두 저장할 때까지 대기"""
+        if self._write_lock is None:
+            return
+        while self._pending:
+            await self._flush_batch()
+        async with self._write_lock:
+            pass  # 진행 중인 저장이 끝날 때까지 대기
+
+    def start(self):
+        """writer 시작 (lifespan에서 호출)"""
+        if self._task is None and self.enabled:
+            self._has_pending = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._space = asyncio.Event()
+            self._write_lock = asyncio.Lock()
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        """writer 중지 후 남은 레코드 저장"""
+        if self._task is not None:
+            remaining = len(self._pending)
+            await self.flush()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            # flush 도중 들어온 레코드까지 저장 (이후 enqueue는 바로 저장됨)
+            await self.flush()
+            if remaining:
+                print(f"💾 남은 분석 기록 {remaining}건 저장 완료")
+
+    def stats(self) -> dict:
+        """큐 상태"""
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "max_pending": self.max_pending,
+            "batch_size": self.batch_size,
+            "flush_ms": self.flush_ms,
+            "overflow": self.overflow,
+            "written": self._written,
+            "failed": self._failed,
+            "dropped": self._dropped,
+            "sync_writes": self._sync_writes,
+            "batches": self._batches,
+        }
+
+
+# 서버 전역 id 할당기 / 기록 writer
+id_allocator = IdAllocator()
+record_writer = RecordWriter()
+
+
+@event.listens_for(AnalysisRecord, "before_insert")
+def _assign_record_id(mapper, connection, target):
+    """큐를 거치지 않는 동기 INSERT(스크립트 등)도 같은 id 공간을 사용하도록 id 할당"""
+    if target.id is None:
+        if connection.dialect.is_async:
+            # 이벤트 루프 스레드에서 스레드 락을 잡은 채 DB를 기다리면 서버 전체가 멈추므로 허용하지 않음
+            raise RuntimeError("비동기 세션의 분석 기록은 record_writer.enqueue로 저장해야 합니다.")
+        target.id = id_allocator.next_id(connection)
@@ -0,0 +1,120 @@
+"""
+생성 결과 캐시
+(모델, 프롬프트, 이미지 해시, temperature, max_tokens)가 같은 결정적 요청의 Ollama 결과를 재사용한다.
+"""
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+# .env 파일 로드
+load_dotenv()
+
+# 캐시 설정
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "5000"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 기본 64MB
+
+# 캐시 히트는 GPU 시간을 쓰지 않으므로 시간 메트릭과 처리 노드는 저장하지 않는다
+_TIMING_FIELDS = ("total_duration", "load_duration", "prompt_eval_duration", "eval_duration", "backend")
+
+
+def is_cacheable(temperature: Optional[float], opt_in: Optional[bool] = None) -> bool:
+    """
+    결과 캐시 사용 여부
+
+    opt_in이 None이면 temperature가 0인 결정적 요청만 캐시하고,
+    True/False이면 호출자의 선택을 따른다.
+    """
+    if not RESULT_CACHE_ENABLED:
+        return False
+    if opt_in is not None:
+        return opt_in
+    return temperature == 0
+
+
+def make_result_key(
+    model: str,
+    prompt: str,
+    image_hash: Optional[str],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    system: Optional[str] = None,
+) -> str:
+    """캐시 키 생성 (system은 템플릿 접두부가 있을 때만 키에 포함)"""
+    parts = [model, prompt, image_hash, temperature, max_tokens]
+    if system is not None:
+        parts.append(system)
+    raw = json.dumps(parts, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """TTL과 항목 수/바이트 예산으로 제한되는 LRU 결과 캐시"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        max_bytes: int = RESULT_CACHE_MAX_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, size, result)
+        self._bytes = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """캐시 조회 (만료된 항목은 제거)"""
+        item = self._entries.get(key)
+        if item is None:
+            metrics.inc("result_cache_misses")
+            return None
+        expires_at, size, result = item
+        if expires_at < time.time():
+            self._remove(key)
+            metrics.inc("result_cache_misses")
+            return None
+        self._entries.move_to_end(key)
+        metrics.inc("result_cache_hits")
+        return dict(result)
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """결과 저장 (시간 메트릭/처리 노드 제외)"""
+        result = {k: v for k, v in result.items() if k not in _TIMING_FIELDS}
+        size = len(json.dumps(result, ensure_ascii=False))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.time() + self.ttl_seconds, size, result)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            metrics.inc("result_cache_evictions")
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> dict:
+        """캐시 상태"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# 서버 전역 결과 캐시
+result_cache = ResultCache()
@@ -0,0 +1,446 @@
+"""
+Ollama 호출 승인 제어 및 우선순위 스케줄러
+동시에 Ollama로 보내는 생성 요청 수를 제한하고, 나머지는 우선순위 대기열에서 기다리게 한다.
+대기열이 가득 차면 받아들일 수 없는 작업을 즉시 429(Retry-After)로 거절한다.
+"""
+import os
+import heapq
+import itertools
+import asyncio
+import time
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+# .env 파일 로드
+load_dotenv()
+
+# 스케줄러 설정 (기본 동시 실행 수는 노드별 OLLAMA_NUM_PARALLEL x 노드 수)
+_BACKEND_COUNT = len([h for h in os.getenv("OLLAMA_HOSTS", "").split(",") if h.strip()]) or 1
+OLLAMA_MAX_CONCURRENCY = int(os.getenv(
+    "OLLAMA_MAX_CONCURRENCY", str(int(os.getenv("OLLAMA_NUM_PARALLEL", "1")) * _BACKEND_COUNT)
+))
+SCHEDULER_MAX_QUEUE = int(os.getenv("SCHEDULER_MAX_QUEUE", "32"))  # 대기열 최대 길이
+SCHEDULER_QUEUE_TIMEOUT = float(os.getenv("SCHEDULER_QUEUE_TIMEOUT", "120"))  # 대기 기한 (초)
+
+# 모델 친화 스케줄링 (같은 우선순위 안에서는 이미 올라와 있는 모델의 요청을 먼저 실행)
+SCHEDULER_WARM_MODELS = int(os.getenv("SCHEDULER_WARM_MODELS", "1"))  # 로드된 상태로 간주할 최근 모델 수
+SCHEDULER_AFFINITY_MAX_WAIT = float(os.getenv("SCHEDULER_AFFINITY_MAX_WAIT", "10"))  # 다른 모델 요청의 최대 양보 시간 (초)
+
+# 적응형 동시성 (관측된 eval 처리량/지연 시간으로 동시 실행 수를 자동 조정)
+SCHEDULER_ADAPTIVE = os.getenv("SCHEDULER_ADAPTIVE", "true").lower() == "true"
+SCHEDULER_MIN_CONCURRENCY = int(os.getenv("SCHEDULER_MIN_CONCURRENCY", "1"))
+SCHEDULER_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", str(OLLAMA_MAX_CONCURRENCY * 4)))
+SCHEDULER_ADAPTIVE_WINDOW = int(os.getenv("SCHEDULER_ADAPTIVE_WINDOW", "8"))  # 판단 단위 (완료 건수)
+SCHEDULER_LATENCY_TOLERANCE = float(os.getenv("SCHEDULER_LATENCY_TOLERANCE", "2.0"))  # 토큰당 지연 허용 배수
+SCHEDULER_HISTORY_SIZE = int(os.getenv("SCHEDULER_HISTORY_SIZE", "100"))
+
+# 우선순위 (숫자가 작을수록 먼저 처리)
+PRIORITY_INTERACTIVE = 0  # 스트리밍 등 사용자가 기다리는 요청
+PRIORITY_DEFAULT = 1
+PRIORITY_BATCH = 2  # 배치/작업 큐/문서 요약
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_DEFAULT: "default",
+    PRIORITY_BATCH: "batch",
+}
+
+
+# 요청 처리 흐름 전체에 적용할 우선순위 (배치/작업 큐가 엔드포인트 코드를 재사용할 때 설정)
+current_priority: contextvars.ContextVar = contextvars.ContextVar("ollama_priority", default=None)
+
+
+def resolve_priority(priority: Optional[int], default: int = PRIORITY_DEFAULT) -> int:
+    """명시적 우선순위 → 컨텍스트 우선순위 → 기본값 순으로 결정"""
+    if priority is not None:
+        return priority
+    context_priority = current_priority.get()
+    return context_priority if context_priority is not None else default
+
+
+class SchedulerRejectedError(Exception):
+    """스케줄러가 요청을 받아들이지 않음"""
+
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.headers = {"Retry-After": str(retry_after)}
+
+
+class QueueFullError(SchedulerRejectedError):
+    """대기열이 가득 참 (429)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Ollama 대기열이 가득 찼습니다. 잠시 후 다시 시도하세요.", 429, retry_after)
+
+
+class QueueTimeoutError(SchedulerRejectedError):
+    """대기 기한 안에 실행 슬롯을 얻지 못함 (503)"""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Ollama 대기 시간이 초과되었습니다. 잠시 후 다시 시도하세요.", 503, retry_after)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future", "enqueued_at", "model")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future, model: Optional[str] = None):
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+        self.model = model
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class AdaptiveLimit:
+    """
+    AIMD 방식 동시성 한도
+
+    완료된 호출의 eval_count/eval_duration(디코딩 처리량)과 토큰당 지연 시간
+    (슬롯 점유 시간에서 모델 로드/프롬프트 처리 시간을 뺀 값 / eval_count)을 윈도우 단위로 모아 판단한다.
+    - 한도까지 꽉 찬 상태에서 전체 처리량(tokens/s)이 직전 한도보다 늘었으면 +1 (가산 증가)
+    - 토큰당 지연이 최저치의 허용 배수를 넘거나, 처리량이 오히려 줄었으면 x0.75 (승산 감소)
+    - 토큰당 지연을 쓰므로 prefill이 큰 이미지 프롬프트와 디코딩 위주의 텍스트 프롬프트가 섞여도 비교 가능하다
+    """
+
+    GAIN_THRESHOLD = 0.05  # 이 비율 이상 처리량이 늘어야 증가 유지
+    DECREASE_FACTOR = 0.75
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = SCHEDULER_MIN_CONCURRENCY,
+        maximum: int = SCHEDULER_MAX_CONCURRENCY,
+        window: int = SCHEDULER_ADAPTIVE_WINDOW,
+        latency_tolerance: float = SCHEDULER_LATENCY_TOLERANCE,
+        history_size: int = SCHEDULER_HISTORY_SIZE,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.window = max(1, window)
+        self.latency_tolerance = latency_tolerance
+        self.history: deque = deque(maxlen=history_size)
+        self._throughput_by_limit: Dict[int, float] = {}  # 한도별 처리량 EWMA
+        self._min_token_latency: Optional[float] = None  # 관측된 최저 토큰당 지연 (초)
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = time.monotonic()
+        self._samples = 0
+        self._tokens = 0
+        self._token_latency_sum = 0.0
+        self._saturated = False
+
+    def mark_saturated(self):
+        """윈도우 동안 한도가 꽉 차 대기가 발생했음을 기록"""
+        self._saturated = True
+
+    def observe(self, result: Dict[str, Any], elapsed: float) -> Optional[int]:
+        """
+        완료된 호출 하나를 반영
+
+        Args:
+            result: Ollama 응답 (eval_count, eval_duration 등, 시간 단위 ns)
+            elapsed: 슬롯 점유 시간 (초)
+
+        Returns:
+            한도가 바뀌었으면 새 한도, 아니면 None
+        """
+        eval_count = result.get("eval_count")
+        eval_duration = result.get("eval_duration")
+        if not eval_count or not eval_duration:
+            return None  # 디코딩 정보가 없는 응답
+
+        metrics.observe("ollama_eval_tokens_per_second", eval_count / (eval_duration / 1e9))
+        prefill = ((result.get("load_duration") or 0) + (result.get("prompt_eval_duration") or 0)) / 1e9
+        token_latency = max(elapsed - prefill, eval_duration / 1e9) / eval_count
+        self._samples += 1
+        self._tokens += eval_count
+        self._token_latency_sum += token_latency
+        if self._min_token_latency is None or token_latency < self._min_token_latency:
+            self._min_token_latency = token_latency
+
+        if self._samples < max(self.window, self.limit):
+            return None
+        return self._decide()
+
+    def _decide(self) -> Optional[int]:
+        elapsed = max(time.monotonic() - self._window_start, 1e-6)
+        throughput = self._tokens / elapsed
+        token_latency = self._token_latency_sum / self._samples
+        saturated = self._saturated
+        self._reset_window()
+
+        previous = self._throughput_by_limit.get(self.limit)
+        self._throughput_by_limit[self.limit] = (
+            throughput if previous is None else 0.5 * previous + 0.5 * throughput
+        )
+        lower = self._throughput_by_limit.get(self.limit - 1)
+
+        old_limit = self.limit
+        if token_latency > self._min_token_latency * self.latency_tolerance:
+            reason = "latency"
+            self.limit = max(self.minimum, int(self.limit * self.DECREASE_FACTOR))
+        elif lower is not None and throughput < lower * (1 - self.GAIN_THRESHOLD):
+            reason = "throughput_drop"
+            self.limit = max(self.minimum, int(self.limit * self.DECREASE_FACTOR))
+        elif saturated and (lower is None or throughput >= lower * (1 + self.GAIN_THRESHOLD)):
+            reason = "throughput_gain"
+            self.limit = min(self.maximum, self.limit + 1)
+        else:
+            reason = "hold"
+
+        self.history.append({
+            "at": time.time(),
+            "limit": self.limit,
+            "previous_limit": old_limit,
+            "reason": reason,
+            "throughput_tps": round(throughput, 2),
+            "token_latency_ms": round(token_latency * 1000, 2),
+        })
+        if self.limit != old_limit:
+            metrics.inc(f"scheduler_limit_{'up' if self.limit > old_limit else 'down'}")
+            return self.limit
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "min": self.minimum,
+            "max": self.maximum,
+            "throughput_by_limit": {k: round(v, 2) for k, v in sorted(self._throughput_by_limit.items())},
+            "min_token_latency_ms": (
+                round(self._min_token_latency * 1000, 2) if self._min_token_latency is not None else None
+            ),
+            "history": list(self.history),
+        }
+
+
+class Scheduler:
+    """
+    동시 실행 슬롯 + 우선순위 대기열
+
+    - 슬롯이 남아 있고 대기자가 없으면 즉시 실행
+    - 그 외에는 (우선순위, 도착 순서)로 정렬된 대기열에서 기다림
+    - 배치 우선순위는 호출자 쪽 워커 수로 이미 제한되므로 대기열 길이 제한에서 제외
+    - adaptive가 켜져 있으면 완료된 호출의 처리량에 따라 동시 실행 수(limit)가 조정됨
+    - 같은 우선순위 안에서는 실행 중이거나 최근에 실행한 모델(warm)의 요청을 먼저 꺼내
+      모델 교체(언로드/재로드)를 줄이며, 다른 모델 요청은 affinity_max_wait 이상 양보하지 않음
+    """
+
+    def __init__(
+        self,
+        limit: int = OLLAMA_MAX_CONCURRENCY,
+        max_queue: int = SCHEDULER_MAX_QUEUE,
+        queue_timeout: float = SCHEDULER_QUEUE_TIMEOUT,
+        adaptive: bool = SCHEDULER_ADAPTIVE,
+        warm_models: int = SCHEDULER_WARM_MODELS,
+        affinity_max_wait: float = SCHEDULER_AFFINITY_MAX_WAIT,
+    ):
+        self.adaptive: Optional[AdaptiveLimit] = AdaptiveLimit(limit) if adaptive else None
+        self.limit = self.adaptive.limit if self.adaptive else max(1, limit)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._avg_service_seconds = 30.0  # 슬롯 점유 시간 EWMA (Retry-After 추정용)
+        self.warm_models = max(1, warm_models)
+        self.affinity_max_wait = affinity_max_wait
+        self._running: Dict[str, int] = {}  # 모델별 실행 중 슬롯 수
+        self._recent: "OrderedDict[str, None]" = OrderedDict()  # 최근 실행한 모델 (LRU)
+        self.model_switches = 0
+
+    def queue_depth(self) -> int:
+        return sum(1 for w in self._waiters if not w.future.done())
+
+    def retry_after(self) -> int:
+        """대기열이 비워질 때까지의 예상 시간 (초)"""
+        backlog = self.queue_depth() + self.active
+        return max(1, int(self._avg_service_seconds * backlog / self.limit))
+
+    def _rejects(self, priority: int) -> bool:
+        return priority != PRIORITY_BATCH and self.queue_depth() >= self.max_queue
+
+    def ensure_capacity(self, priority: int = PRIORITY_DEFAULT):
+        """
+        응답을 시작하기 전에 승인 여부만 확인 (스트리밍 엔드포인트용)
+
+        Raises:
+            QueueFullError: 대기열이 가득 참
+        """
+        if self._rejects(priority):
+            metrics.inc("scheduler_rejected")
+            raise QueueFullError(self.retry_after())
+
+    def _warm(self) -> set:
+        return set(self._running) | set(self._recent)
+
+    def _start(self, model: Optional[str]):
+        """슬롯 점유 시작 (모델별 실행 수/최근 모델 갱신)"""
+        self.active += 1
+        if model is None:
+            return
+        if model not in self._warm():
+            self.model_switches += 1
+            metrics.inc("scheduler_model_switches")
+        self._running[model] = self._running.get(model, 0) + 1
+        self._recent[model] = None
+        self._recent.move_to_end(model)
+        while len(self._recent) > self.warm_models:
+            self._recent.popitem(last=False)
+
+    async def acquire(
+        self,
+        priority: int = PRIORITY_DEFAULT,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+    ):
+        """실행 슬롯 획득 (배치 외에는 기본 대기 기한 적용)"""
+        if self.active < self.limit and not self.queue_depth():
+            self._start(model)
+            metrics.observe("scheduler_wait_ms", 0)
+            return
+
+        self.ensure_capacity(priority)
+        if self.adaptive:
+            self.adaptive.mark_saturated()
+
+        if timeout is None and priority != PRIORITY_BATCH:
+            timeout = self.queue_timeout
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future(), model)
+        heapq.heappush(self._waiters, waiter)
+        metrics.inc(f"scheduler_queued_{PRIORITY_NAMES.get(priority, priority)}")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 기한 직전에 슬롯을 받았으면 그대로 사용
+                pass
+            else:
+                waiter.future.cancel()
+                metrics.inc("scheduler_timeouts")
+                raise QueueTimeoutError(self.retry_after())
+        except asyncio.CancelledError:
+            # 호출자가 취소됨: 이미 받은 슬롯은 반납
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(model=model)
+            else:
+                waiter.future.cancel()
+            raise
+        metrics.observe("scheduler_wait_ms", (time.monotonic() - waiter.enqueued_at) * 1000)
+
+    def release(self, service_seconds: Optional[float] = None, model: Optional[str] = None):
+        """슬롯 반납 후 다음 대기자에게 전달"""
+        if service_seconds is not None:
+            self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * service_seconds
+        self.active -= 1
+        if model is not None:
+            remaining = self._running.get(model, 0) - 1
+            if remaining > 0:
+                self._running[model] = remaining
+            else:
+                self._running.pop(model, None)
+        self._wake()
+
+    def observe(self, result: Dict[str, Any], elapsed: float):
+        """완료된 Ollama 응답의 처리량을 적응형 한도에 반영"""
+        if self.adaptive is None:
+            return
+        new_limit = self.adaptive.observe(result, elapsed)
+        if new_limit is not None:
+            self.limit = new_limit
+            self._wake()  # 한도가 늘었으면 대기자를 바로 실행
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """
+        다음에 실행할 대기자 선택
+
+        가장 높은 우선순위의 맨 앞 대기자가 warm이 아닌 모델이고 아직 양보 한도 안이면,
+        같은 우선순위의 warm 모델 대기자를 먼저 꺼낸다.
+        """
+        while self._waiters and self._waiters[0].future.done():
+            heapq.heappop(self._waiters)  # 기한 초과/취소된 대기자
+        if not self._waiters:
+            return None
+
+        head = self._waiters[0]
+        warm = self._warm()
+        if (
+            head.model is None
+            or head.model in warm
+            or time.monotonic() - head.enqueued_at >= self.affinity_max_wait
+        ):
+            return heapq.heappop(self._waiters)
+
+        candidates = [
+            w for w in self._waiters
+            if w.priority == head.priority and w.model in warm and not w.future.done()
+        ]
+        if not candidates:
+            return heapq.heappop(self._waiters)
+        chosen = min(candidates)
+        self._waiters.remove(chosen)
+        heapq.heapify(self._waiters)
+        metrics.inc("scheduler_affinity_reorders")
+        return chosen
+
+    def _wake(self):
+        while self.active < self.limit:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            self._start(waiter.model)
+            waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        priority: int = PRIORITY_DEFAULT,
+        timeout: Optional[float] = None,
+        model: Optional[str] = None,
+    ):
+        """실행 슬롯을 점유하는 컨텍스트"""
+        await self.acquire(priority, timeout, model)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start, model)
+
+    def _queued_by_model(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for w in self._waiters:
+            if not w.future.done():
+                key = w.model or "unknown"
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def stats(self) -> dict:
+        """스케줄러 상태"""
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "queued": self.queue_depth(),
+            "max_queue": self.max_queue,
+            "avg_service_seconds": round(self._avg_service_seconds, 2),
+            "running_models": dict(self._running),
+            "warm_models": list(self._recent),
+            "queued_by_model": self._queued_by_model(),
+            "model_switches": self.model_switches,
+            "adaptive": self.adaptive.stats() if self.adaptive else None,
+        }
+
+
+# 모든 Ollama 생성 호출이 거치는 스케줄러
+ollama_scheduler = Scheduler()
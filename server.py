@@ -3,26 +3,81 @@ Ollama Gemma3 API Server
 텍스트 프롬프트를 입력받아 ollama의 gemma3:27b 모델로 처리하는 서버
 """
 import os
+import time
 import base64
-from typing import Optional
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-import requests
 import json
-from io import BytesIO
-from PIL import Image
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
 # 환경 변수 로드
 load_dotenv()
 
 # DB 관련 import
-from database import get_db, init_db
-from models import AnalysisRecord
+from database import close_db, get_async_db, init_db, pool_stats
+from models import AnalysisRecord, AnalysisImage, Document, Job
+from ollama_client import (
+    OLLAMA_HOST,
+    OLLAMA_HOSTS,
+    ollama_client,
+    OllamaAPIError,
+    OllamaConnectionError,
+    OllamaTimeoutError,
+)
+from image_fetcher import image_fetcher, FetchResult, ImageFetchError, ImageTooLargeError, IMAGE_MAX_BYTES
+from image_cache import image_cache, CachedImage, UrlEntry, IMAGE_CACHE_ENABLED, sha256_hex
+from result_cache import result_cache, is_cacheable, make_result_key
+from singleflight import image_flights, generation_flights, stream_flights
+from scheduler import (
+    ollama_scheduler,
+    current_priority,
+    SchedulerRejectedError,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+)
+from image_processing import image_preprocessor, InvalidImageError
+from metrics import metrics
+from summarization import summarize_long_text
+from model_routing import MODEL_NAME, ModelSelectionError, allowed_models, select_model
+from jobs import job_queue
+from warmup import model_warmer
+from sessions import session_store
+from prompt_templates import template_registry, TemplateError
+from health import health_monitor
+from record_writer import record_writer
+from record_storage import storage_stats
+from pagination import (
+    COUNT_MODES,
+    RECORD_PREVIEW_FIELDS,
+    InvalidCursorError,
+    InvalidFieldsError,
+    count_rows,
+    decode_cursor,
+    encode_cursor,
+    keyset_before,
+    full_response_previews,
+    load_options,
+    preview_columns,
+    read_previews,
+    resolve_fields,
+)
+from pdf_summarizer import (
+    PDF_SUPPORT,
+    PdfError,
+    download_pdf_to_temp,
+    remove_temp_pdf,
+    save_upload_to_temp,
+    summarize_pdf,
+)
 
 
 # 최신 FastAPI lifespan 이벤트 핸들러
@@ -38,10 +93,33 @@ async def lifespan(app: FastAPI):
         print(f"⚠️  데이터베이스 초기화 실패: {e}")
         print("⚠️  DB 기능 없이 서버를 시작합니다. DB 설정을 확인하세요.")
     
+    ollama_client.start()
+    print(f"✅ Ollama 노드 헬스체크 시작 ({len(OLLAMA_HOSTS)}개 노드)")
+    
+    # 모델 예열은 백그라운드로 진행 (완료 전까지 /health는 warming)
+    model_warmer.start()
+    health_monitor.start()
+    record_writer.start()
+    
+    try:
+        await job_queue.start(execute_job)
+        print("✅ 작업 큐 워커 시작")
+    except Exception as e:
+        print(f"⚠️  작업 큐 시작 실패: {e}")
+    
     yield
     
     # Shutdown
     print("🛑 서버 종료 중...")
+    await job_queue.stop()
+    # 큐에 남은 분석 기록 저장 (Ollama/DB 연결을 닫기 전에)
+    await record_writer.stop()
+    await health_monitor.stop()
+    await model_warmer.stop()
+    await ollama_client.close()
+    await image_fetcher.close()
+    image_preprocessor.shutdown()
+    await close_db()
 
 
 app = FastAPI(
@@ -60,9 +138,16 @@ app.add_middleware(
     allow_headers=["*"],  # 모든 헤더 허용
 )
 
-# Ollama API 설정
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-MODEL_NAME = os.getenv("MODEL_NAME", "gemma3:27b")
+# Ollama API 설정 (OLLAMA_HOST는 ollama_client, 모델 선택은 model_routing에서 관리)
+
+# 배치 처리 설정
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "5000"))
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "2"))  # 동시 Ollama 호출 수 기본값
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "8"))
+BATCH_PREFETCH = int(os.getenv("BATCH_PREFETCH", "8"))  # GPU 단계 앞에 준비해 둘 항목 수
+
+# 다중 이미지 요청 설정
+IMAGE_MAX_COUNT = int(os.getenv("IMAGE_MAX_COUNT", "8"))  # 한 번의 호출에 보낼 최대 이미지 수
 
 
 class TextPromptRequest(BaseModel):
@@ -70,6 +155,15 @@ class TextPromptRequest(BaseModel):
     prompt: str
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 2000
+    cache: Optional[bool] = None  # 결과 캐시 사용 (None이면 temperature=0일 때만)
+    long_input: Optional[bool] = False  # 긴 입력 모드 (청크 분할 후 map-reduce 요약)
+    instruction: Optional[str] = None  # 긴 입력 모드의 요약 지침 (prompt는 요약할 본문)
+    chunk_tokens: Optional[int] = None  # 긴 입력 모드의 청크당 토큰 예산
+    model: Optional[str] = None  # 사용할 모델 (없으면 tier 또는 라우팅 정책)
+    tier: Optional[str] = None  # 모델 등급 (small, large)
+    session_id: Optional[str] = None  # 대화 세션 (이전 턴의 context에서 이어서 생성)
+    template_id: Optional[str] = None  # 서버 프롬프트 템플릿 (고정 접두부 + prompt/variables로 채우는 접미부)
+    variables: Optional[Dict[str, Any]] = None  # 템플릿 접미부 변수
 
 
 def encode_image_to_base64(image_bytes: bytes) -> str:
@@ -77,16 +171,6 @@ def encode_image_to_base64(image_bytes: bytes) -> str:
     return base64.b64encode(image_bytes).decode('utf-8')
 
 
-def validate_image(image_bytes: bytes) -> bool:
-    """이미지 유효성 검증"""
-    try:
-        img = Image.open(BytesIO(image_bytes))
-        img.verify()
-        return True
-    except Exception:
-        return False
-
-
 @app.get("/")
 async def root():
     """서버 상태 확인"""
@@ -94,111 +178,403 @@ async def root():
         "status": "running",
         "message": "Ollama Gemma3 API Server",
         "model": MODEL_NAME,
-        "ollama_host": OLLAMA_HOST
+        "models": allowed_models(),
+        "ollama_host": OLLAMA_HOST,
+        "ollama_hosts": OLLAMA_HOSTS
     }
 
 
 @app.get("/health")
 async def health_check():
-    """헬스체크 및 ollama 연결 확인"""
-    try:
-        # Ollama 서버 연결 확인
-        response = requests.get(f"{OLLAMA_HOST}/api/tags", timeout=5)
-        if response.status_code == 200:
-            models = response.json().get("models", [])
-            model_exists = any(MODEL_NAME in model.get("name", "") for model in models)
-            
-            return {
-                "status": "healthy",
-                "ollama_connected": True,
-                "model_loaded": model_exists,
-                "available_models": [model.get("name") for model in models]
-            }
-        else:
-            return JSONResponse(
-                status_code=503,
-                content={
-                    "status": "unhealthy",
-                    "ollama_connected": False,
-                    "error": "Ollama server is not responding properly"
-                }
-            )
-    except Exception as e:
-        return JSONResponse(
-            status_code=503,
-            content={
-                "status": "unhealthy",
-                "ollama_connected": False,
-                "error": str(e)
-            }
-        )
+    """헬스체크 및 ollama 연결 확인 (백그라운드 스냅샷 기준, Ollama를 직접 호출하지 않음)"""
+    readiness = health_monitor.readiness()
+    body = {
+        "status": "healthy",
+        "ollama_connected": readiness.get("ollama_connected", False),
+        "model_loaded": readiness.get("model_installed", False),
+        "available_models": readiness.get("available_models", []),
+        "warmup": model_warmer.status(),
+        "snapshot_age_seconds": readiness["snapshot_age_seconds"]
+    }
+    if readiness["status"] == "warming" or "starting" in readiness["reasons"]:
+        # 첫 스냅샷 전(시작 직후)이거나 예열 대상 모델이 아직 메모리에 올라오지 않음 (중단이 아님)
+        body["status"] = "starting" if "starting" in readiness["reasons"] else "warming"
+        return JSONResponse(status_code=503, content=body)
+    if not body["ollama_connected"]:
+        body["status"] = "unhealthy"
+        body["error"] = "Ollama server is not responding properly"
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
+@app.get("/health/live")
+async def liveness_probe():
+    """liveness 프로브 (스냅샷 폴러가 멈추지 않았는지만 확인)"""
+    body = health_monitor.liveness()
+    if body["status"] != "alive":
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
+@app.get("/health/ready")
+async def readiness_probe():
+    """readiness 프로브 (Ollama/DB/예열/대기열 상태를 스냅샷에서 판단)"""
+    body = health_monitor.readiness()
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """서버 내부 메트릭 조회 (다운로드 시간/크기 등)"""
+    return {
+        "success": True,
+        **metrics.snapshot(),
+        "image_cache": image_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "sessions": session_store.stats(),
+        "record_writer": record_writer.stats(),
+        "db_pool": pool_stats(),
+        "record_storage": storage_stats(),
+        "scheduler": ollama_scheduler.stats(),
+        "backends": ollama_client.stats(),
+        "warmup": model_warmer.status(),
+        "in_flight": {
+            "images": image_flights.in_flight(),
+            "generations": generation_flights.in_flight(),
+            "streams": stream_flights.in_flight()
+        }
+    }
 
 
 class ImageUrlRequest(BaseModel):
-    """이미지 URL로 요청하는 모델"""
-    image_url: str
+    """이미지 URL로 요청하는 모델 (image_url, image_urls 중 하나 이상 필요)"""
+    image_url: Optional[str] = None
+    image_urls: Optional[List[str]] = None  # 여러 이미지 (모두 한 번의 Ollama 호출로 전송, image_url 다음 순서)
     prompt: str
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = 2000
+    cache: Optional[bool] = None  # 결과 캐시 사용 (None이면 temperature=0일 때만)
+    model: Optional[str] = None  # 사용할 모델 (없으면 tier 또는 라우팅 정책)
+    tier: Optional[str] = None  # 모델 등급 (small, large)
+    session_id: Optional[str] = None  # 대화 세션 (이전 턴의 context에서 이어서 생성)
+    template_id: Optional[str] = None  # 서버 프롬프트 템플릿 (고정 접두부 + prompt/variables로 채우는 접미부)
+    variables: Optional[Dict[str, Any]] = None  # 템플릿 접미부 변수
 
 
-def download_image_from_url(url: str) -> bytes:
-    """URL에서 이미지를 다운로드"""
+async def fetch_image_from_url(
+    url: str,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None
+) -> FetchResult:
+    """URL에서 이미지를 다운로드 (비동기, 크기 제한, 조건부 요청)"""
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
-        return response.content
-    except Exception as e:
+        return await image_fetcher.fetch_conditional(url, etag=etag, last_modified=last_modified)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"이미지 다운로드 실패: {str(e)}")
+    except ImageFetchError as e:
         raise HTTPException(status_code=400, detail=f"이미지 다운로드 실패: {str(e)}")
 
 
+async def download_image_from_url(url: str) -> bytes:
+    """URL에서 이미지를 다운로드 (비동기, 크기 제한)"""
+    result = await fetch_image_from_url(url)
+    return result.content
+
+
+async def prepare_image(image_bytes: bytes, content_hash: str) -> Optional[CachedImage]:
+    """
+    이미지 검증 및 전처리(축소/메타데이터 제거/재인코딩) 후 base64로 인코딩
+    
+    검증과 전처리는 프로세스 풀에서 한 번의 호출로 실행되며,
+    원본 메타데이터와 원본/전송 바이트 수를 함께 반환한다.
+    
+    Returns:
+        CachedImage, 유효하지 않거나 제한을 초과한 이미지이면 None
+    """
+    try:
+        info, processed_bytes = await image_preprocessor.prepare(image_bytes)
+    except InvalidImageError as e:
+        print(f"⚠️  이미지 검증 실패: {e}")
+        return None
+    
+    return CachedImage(
+        sha256=content_hash,
+        image_base64=encode_image_to_base64(processed_bytes),
+        size=info.size,
+        processed_size=len(processed_bytes),
+        format=info.format,
+        width=info.width,
+        height=info.height,
+        mode=info.mode
+    )
+
+
+def choose_model(model: Optional[str], tier: Optional[str], prompt: str, has_image: bool) -> str:
+    """요청에 사용할 모델 결정 (허용되지 않은 모델/등급은 400)"""
+    try:
+        return select_model(model, tier, prompt, has_image)
+    except ModelSelectionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def render_template(
+    template_id: Optional[str], variables: Optional[Dict[str, Any]], prompt: str
+) -> Tuple[Optional[str], str]:
+    """
+    템플릿 적용 → (system 접두부, 접미부 프롬프트)
+    
+    템플릿이 없으면 (None, prompt)를 그대로 반환한다. 알 수 없는 템플릿이나 누락된 변수는 400.
+    """
+    if not template_id:
+        return None, prompt
+    try:
+        template = template_registry.get(template_id)
+        return template.system, template.render(prompt, variables)
+    except TemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def session_model(conversation, prompt: str, has_image: bool) -> str:
+    """세션의 모델 (생성 시 정하지 않았으면 첫 턴의 프롬프트/이미지로 정하고 이후 턴은 같은 모델 유지)"""
+    if conversation.model is None:
+        conversation.model = choose_model(None, None, prompt, has_image=has_image)
+    return conversation.model
+
+
+def open_session(session_id: Optional[str]):
+    """요청의 대화 세션 조회 (없거나 만료되었으면 404)"""
+    if not session_id:
+        return None
+    conversation = session_store.get(session_id)
+    if conversation is None:
+        raise HTTPException(status_code=404, detail="세션을 찾을 수 없거나 만료되었습니다.")
+    return conversation
+
+
+async def save_failed_record(record: AnalysisRecord, error_message: str):
+    """실패한 요청 기록 (write-behind 큐로 저장, 저장 실패는 응답에 영향 없음)"""
+    record.success = False
+    record.error_message = error_message
+    try:
+        await record_writer.enqueue(record)
+    except Exception as db_error:
+        print(f"⚠️  DB 저장 실패 (에러 기록 불가): {db_error}")
+
+
+def set_image_metadata(
+    record: AnalysisRecord,
+    image: CachedImage,
+    image_url: Optional[str] = None,
+    filename: Optional[str] = None
+):
+    """
+    검증 단계 메타데이터를 레코드에 기록
+    
+    이미지마다 analysis_images 행을 추가하고, 레코드의 image_* 컬럼에는 첫 이미지를 기록한다.
+    """
+    if not record.images:
+        record.image_format = image.format
+        record.image_width = image.width
+        record.image_height = image.height
+        record.image_size = image.size
+    record.images.append(AnalysisImage(
+        position=len(record.images),
+        image_url=image_url,
+        filename=filename,
+        sha256=image.sha256,
+        image_format=image.format,
+        image_width=image.width,
+        image_height=image.height,
+        image_size=image.size,
+        processed_size=image.processed_size
+    ))
+
+
+async def read_upload_image(upload: UploadFile, max_bytes: int = IMAGE_MAX_BYTES) -> bytes:
+    """업로드 이미지를 크기 제한 하에 읽기"""
+    image_bytes = await upload.read(max_bytes + 1)
+    if len(image_bytes) > max_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"이미지 크기가 제한({max_bytes} bytes)을 초과합니다: {upload.filename}"
+        )
+    return image_bytes
+
+
+async def load_upload_image(image_bytes: bytes) -> Optional[CachedImage]:
+    """업로드 이미지 검증/인코딩 (같은 내용의 페이로드가 캐시에 있으면 재사용)"""
+    content_hash = sha256_hex(image_bytes)
+    image = await image_cache.get_blob(content_hash) if IMAGE_CACHE_ENABLED else None
+    if image is not None:
+        metrics.inc("image_cache_dedup_hits")
+        return image
+    return await prepare_image(image_bytes, content_hash)
+
+
+async def load_images(
+    urls: List[str],
+    uploads: Optional[List[Tuple[str, bytes]]] = None
+) -> List[Optional[CachedImage]]:
+    """
+    여러 이미지를 동시에 로드 (URL 다음 업로드 순서, 유효하지 않은 이미지는 None)
+    
+    각 URL은 load_image와 같은 경로(캐시, 조건부 요청, 동시 요청 병합)를 거친다.
+    """
+    tasks = [image_flights.do(url, lambda url=url: load_image(url)) for url in urls]
+    tasks += [load_upload_image(image_bytes) for _, image_bytes in uploads or []]
+    return list(await asyncio.gather(*tasks))
+
+
+def combined_image_hash(images: List[CachedImage]) -> str:
+    """이미지 묶음의 식별 해시 (한 장이면 그 이미지의 해시 그대로)"""
+    if len(images) == 1:
+        return images[0].sha256
+    return sha256_hex(",".join(image.sha256 for image in images).encode())
+
+
+async def load_image(url: str) -> Optional[CachedImage]:
+    """
+    이미지 URL을 검증/인코딩이 끝난 페이로드로 변환 (캐시 우선)
+    
+    캐시 히트 시 다운로드, 검증, base64 인코딩을 모두 건너뛰고,
+    신선도가 지난 항목은 ETag/Last-Modified로 재검증한다.
+    
+    Returns:
+        CachedImage, 유효하지 않은 이미지이면 None
+    """
+    if not IMAGE_CACHE_ENABLED:
+        image_bytes = await download_image_from_url(url)
+        return await prepare_image(image_bytes, sha256_hex(image_bytes))
+    
+    entry = await image_cache.get_url(url)
+    cached = await image_cache.get_blob(entry.sha256) if entry else None
+    if cached and entry.is_fresh():
+        metrics.inc("image_cache_hits")
+        return cached
+    
+    # 캐시된 페이로드가 있으면 조건부 요청으로 재검증
+    result = await fetch_image_from_url(
+        url,
+        etag=entry.etag if cached else None,
+        last_modified=entry.last_modified if cached else None
+    )
+    if result.not_modified and cached:
+        await image_cache.revalidated(url, entry)
+        metrics.inc("image_cache_revalidated")
+        return cached
+    
+    metrics.inc("image_cache_misses")
+    image_bytes = result.content
+    content_hash = sha256_hex(image_bytes)
+    
+    # 다른 URL로 이미 처리된 동일 콘텐츠인지 확인
+    image = await image_cache.get_blob(content_hash)
+    if image is not None:
+        metrics.inc("image_cache_dedup_hits")
+    else:
+        image = await prepare_image(image_bytes, content_hash)
+        if image is None:
+            return None
+    
+    await image_cache.put(
+        url,
+        UrlEntry(
+            sha256=content_hash,
+            etag=result.etag,
+            last_modified=result.last_modified,
+            validated_at=time.time()
+        ),
+        image
+    )
+    return image
+
+
 @app.post("/api/generate")
-async def generate_with_image(request: ImageUrlRequest, db: Session = Depends(get_db)):
+async def generate_with_image(request: ImageUrlRequest):
     """
     이미지 URL과 프롬프트를 받아서 Gemma3 모델로 처리
     
+    image_urls로 여러 이미지를 보내면 동시에 다운로드/전처리한 뒤 한 번의 Ollama 호출로 함께 전송한다.
+    
     Args:
         request: 이미지 URL, 프롬프트, 생성 옵션을 포함한 요청
-        db: 데이터베이스 세션
     
     Returns:
         모델의 응답 텍스트
     """
+    return await run_image_generation(request)
+
+
+async def run_image_generation(
+    request: ImageUrlRequest,
+    uploads: Optional[List[Tuple[str, bytes]]] = None,
+    endpoint: str = "/api/generate"
+) -> dict:
+    """
+    이미지(URL 및 업로드) + 프롬프트 생성 공통 처리
+    
+    Args:
+        request: 이미지 URL, 프롬프트, 생성 옵션을 포함한 요청
+        uploads: 업로드 이미지 (파일명, 바이트) 목록, URL 이미지 뒤에 붙는다
+        endpoint: 레코드에 기록할 엔드포인트
+    """
+    uploads = uploads or []
+    urls = ([request.image_url] if request.image_url else []) + (request.image_urls or [])
+    if not urls and not uploads:
+        raise HTTPException(status_code=400, detail="image_url, image_urls 또는 업로드 이미지가 하나 이상 필요합니다.")
+    if len(urls) + len(uploads) > IMAGE_MAX_COUNT:
+        raise HTTPException(status_code=400, detail=f"이미지는 요청당 최대 {IMAGE_MAX_COUNT}장입니다.")
+    
+    system, prompt = render_template(request.template_id, request.variables, request.prompt)
+    
+    # 세션이 있으면 세션의 모델로 이어서 생성 (context는 모델별 토큰 배열)
+    conversation = open_session(request.session_id)
+    if conversation is not None:
+        model = session_model(conversation, prompt, has_image=True)
+    else:
+        model = choose_model(request.model, request.tier, prompt, has_image=True)
+    
     # DB 레코드 초기화
     record = AnalysisRecord(
-        endpoint="/api/generate",
-        prompt=request.prompt,
+        endpoint=endpoint,
+        prompt=prompt,
         has_image=True,
-        image_url=request.image_url,
+        image_url=urls[0] if urls else None,
+        image_filename=uploads[0][0] if not urls else None,
         temperature=request.temperature,
         max_tokens=request.max_tokens,
-        model=MODEL_NAME
+        model=model,
+        session_id=request.session_id,
+        template_id=request.template_id
     )
     
+    if conversation is not None:
+        # 같은 세션의 턴은 순서대로 처리
+        await conversation.lock.acquire()
     try:
-        # URL에서 이미지 다운로드
-        image_bytes = download_image_from_url(request.image_url)
+        # 이미지 로드 (캐시 → 다운로드 → 검증 → 인코딩, 여러 장은 동시에, 같은 URL 동시 요청은 병합)
+        images = await load_images(urls, uploads)
+        sources = [(url, None) for url in urls] + [(None, filename) for filename, _ in uploads]
         
         # 이미지 유효성 검증
-        if not validate_image(image_bytes):
-            try:
-                db.rollback()
-                record.success = False
-                record.error_message = "유효하지 않은 이미지 형식입니다."
-                db.add(record)
-                db.commit()
-            except Exception:
-                db.rollback()
-            raise HTTPException(status_code=400, detail="유효하지 않은 이미지 형식입니다.")
-        
-        # 이미지를 base64로 인코딩
-        image_base64 = encode_image_to_base64(image_bytes)
+        invalid = [position for position, image in enumerate(images) if image is None]
+        if invalid:
+            detail = "유효하지 않은 이미지 형식입니다."
+            if len(images) > 1:
+                detail = f"유효하지 않은 이미지 형식입니다. (순서: {', '.join(str(p) for p in invalid)})"
+            await save_failed_record(record, detail)
+            raise HTTPException(status_code=400, detail=detail)
+        for image, (image_url, filename) in zip(images, sources):
+            set_image_metadata(record, image, image_url, filename)
+        images_hash = combined_image_hash(images)
         
-        # Ollama API 요청 준비
+        # Ollama API 요청 준비 (base64 인코딩된 페이로드, 캐시 히트 시 재인코딩 없음)
         payload = {
-            "model": MODEL_NAME,
-            "prompt": request.prompt,
-            "images": [image_base64],
+            "model": model,
+            "prompt": prompt,
+            "images": [image.image_base64 for image in images],
             "stream": False,
             "options": {
                 "temperature": request.temperature,
@@ -206,28 +582,46 @@ async def generate_with_image(request: ImageUrlRequest, db: Session = Depends(ge
             }
         }
         
-        # Ollama API 호출
-        response = requests.post(
-            f"{OLLAMA_HOST}/api/generate",
-            json=payload,
-            timeout=300  # 5분 타임아웃 (큰 모델이므로)
+        if conversation is not None and conversation.context:
+            # 이전 턴에서 이어서 생성 (같은 이미지는 이미 context에 있으므로 다시 보내지 않음)
+            payload["context"] = conversation.context
+            if conversation.image_sha256 == images_hash:
+                payload.pop("images")
+        elif system is not None:
+            # 고정 접두부는 system으로 분리 (바이트 단위로 같으면 Ollama가 프롬프트 KV 캐시 재사용)
+            payload["system"] = system
+        
+        # 결정적 요청이면 결과 캐시 확인 (세션 턴은 이전 대화에 의존하므로 제외)
+        result_key = make_result_key(
+            model, prompt, images_hash, request.temperature, request.max_tokens, system
         )
+        cacheable = conversation is None and is_cacheable(request.temperature, request.cache)
+        result = result_cache.get(result_key) if cacheable else None
+        cache_hit = result is not None
         
-        if response.status_code != 200:
-            try:
-                db.rollback()
-                record.success = False
-                record.error_message = f"Ollama API 오류: {response.text}"
-                db.add(record)
-                db.commit()
-            except Exception:
-                db.rollback()
+        async def run_generation():
+            generated = await ollama_client.generate(payload)
+            if cacheable:
+                result_cache.put(result_key, generated)
+            return generated
+        
+        # Ollama API 호출 (공유 커넥션 풀, 이벤트 루프 비차단, 동일 요청 병합)
+        try:
+            if conversation is not None:
+                result = await ollama_client.generate(payload)
+            elif not cache_hit:
+                result = await generation_flights.do(result_key, run_generation)
+        except OllamaAPIError as e:
+            await save_failed_record(record, f"Ollama API 오류: {e.text}")
             raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Ollama API 오류: {response.text}"
+                status_code=e.status_code,
+                detail=f"Ollama API 오류: {e.text}"
             )
         
-        result = response.json()
+        if conversation is not None:
+            conversation.context = result.get("context") or conversation.context
+            conversation.image_sha256 = images_hash
+            session_store.save(conversation)
         
         # DB에 성공 결과 저장
         record_id = None
@@ -237,93 +631,149 @@ async def generate_with_image(request: ImageUrlRequest, db: Session = Depends(ge
             record.total_duration = result.get("total_duration")
             record.load_duration = result.get("load_duration")
             record.prompt_eval_count = result.get("prompt_eval_count")
+            record.prompt_eval_duration = result.get("prompt_eval_duration")
             record.eval_count = result.get("eval_count")
-            db.add(record)
-            db.commit()
-            db.refresh(record)
-            record_id = record.id
+            record.cache_hit = cache_hit
+            record.backend = result.get("backend")
+            record_id = await record_writer.enqueue(record)
         except Exception as db_error:
             # DB 저장 실패 시 롤백하고 계속 진행 (API 응답은 성공)
-            db.rollback()
             print(f"⚠️  DB 저장 실패 (응답은 정상 반환): {db_error}")
         
         return {
             "success": True,
             "response": result.get("response", ""),
-            "model": MODEL_NAME,
-            "prompt": request.prompt,
+            "model": model,
+            "prompt": prompt,
             "done": result.get("done", False),
             "context": result.get("context", []),
             "total_duration": result.get("total_duration"),
             "load_duration": result.get("load_duration"),
             "prompt_eval_count": result.get("prompt_eval_count"),
+            "prompt_eval_duration": result.get("prompt_eval_duration"),
             "eval_count": result.get("eval_count"),
+            "cached": cache_hit,
+            "session_id": request.session_id,
+            "template_id": request.template_id,
+            "image_count": len(images),
+            "image_bytes": {
+                "original": sum(image.size for image in images),
+                "processed": sum(image.processed_size for image in images)
+            },
             "record_id": record_id  # DB 레코드 ID 추가 (실패 시 None)
         }
         
-    except requests.exceptions.Timeout:
-        try:
-            db.rollback()
-            record.success = False
-            record.error_message = "Ollama 서버 응답 시간 초과"
-            db.add(record)
-            db.commit()
-        except Exception:
-            db.rollback()
+    except OllamaTimeoutError:
+        await save_failed_record(record, "Ollama 서버 응답 시간 초과")
         raise HTTPException(status_code=504, detail="Ollama 서버 응답 시간 초과")
-    except requests.exceptions.ConnectionError:
-        try:
-            db.rollback()
-            record.success = False
-            record.error_message = "Ollama 서버에 연결할 수 없습니다."
-            db.add(record)
-            db.commit()
-        except Exception:
-            db.rollback()
+    except OllamaConnectionError:
+        await save_failed_record(record, "Ollama 서버에 연결할 수 없습니다.")
         raise HTTPException(status_code=503, detail="Ollama 서버에 연결할 수 없습니다.")
+    except SchedulerRejectedError as e:
+        # 대기열 포화/대기 기한 초과: Retry-After와 함께 거절
+        await save_failed_record(record, str(e))
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except HTTPException:
         # HTTPException은 이미 처리됨
         raise
     except Exception as e:
-        try:
-            db.rollback()
-            record.success = False
-            record.error_message = str(e)
-            db.add(record)
-            db.commit()
-        except Exception as db_error:
-            db.rollback()
-            print(f"⚠️  DB 저장 실패 (에러 기록 불가): {db_error}")
+        await save_failed_record(record, str(e))
         raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+    finally:
+        if conversation is not None:
+            conversation.lock.release()
+
+
+@app.post("/api/generate/upload")
+async def generate_with_uploads(
+    files: List[UploadFile] = File(...),
+    prompt: str = Form(...),
+    image_urls: Optional[List[str]] = Form(None),
+    temperature: Optional[float] = Form(0.7),
+    max_tokens: Optional[int] = Form(2000),
+    cache: Optional[bool] = Form(None),
+    model: Optional[str] = Form(None),
+    tier: Optional[str] = Form(None),
+    session_id: Optional[str] = Form(None),
+    template_id: Optional[str] = Form(None),
+    variables: Optional[str] = Form(None)
+):
+    """
+    업로드한 이미지(여러 장 가능)와 프롬프트를 한 번의 Ollama 호출로 처리
+    
+    Args:
+        files: 업로드 이미지 (업로드 순서대로 전송)
+        prompt: 프롬프트
+        image_urls: 함께 보낼 이미지 URL (업로드 이미지 앞에 붙음)
+        variables: 템플릿 변수 (JSON 객체 문자열)
+    """
+    if len(files) + len(image_urls or []) > IMAGE_MAX_COUNT:
+        raise HTTPException(status_code=400, detail=f"이미지는 요청당 최대 {IMAGE_MAX_COUNT}장입니다.")
+    try:
+        template_variables = json.loads(variables) if variables else None
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"variables가 올바른 JSON이 아닙니다: {e}")
+    if template_variables is not None and not isinstance(template_variables, dict):
+        raise HTTPException(status_code=400, detail="variables는 JSON 객체여야 합니다.")
+    
+    uploads = [(upload.filename, await read_upload_image(upload)) for upload in files]
+    request = ImageUrlRequest(
+        image_urls=image_urls,
+        prompt=prompt,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        cache=cache,
+        model=model,
+        tier=tier,
+        session_id=session_id,
+        template_id=template_id,
+        variables=template_variables
+    )
+    return await run_image_generation(request, uploads=uploads, endpoint="/api/generate/upload")
 
 
 @app.post("/api/generate/text")
-async def generate_text_only(request: TextPromptRequest, db: Session = Depends(get_db)):
+async def generate_text_only(request: TextPromptRequest):
     """
     텍스트만 처리 (이미지 없이)
     
     Args:
         request: 프롬프트와 생성 옵션을 포함한 요청
-        db: 데이터베이스 세션
     
     Returns:
         모델의 응답 텍스트
     """
+    if request.session_id and request.long_input:
+        raise HTTPException(status_code=400, detail="long_input 모드는 session_id와 함께 사용할 수 없습니다.")
+    if request.template_id and request.long_input:
+        raise HTTPException(status_code=400, detail="long_input 모드는 template_id와 함께 사용할 수 없습니다.")
+    system, prompt = render_template(request.template_id, request.variables, request.prompt)
+    conversation = open_session(request.session_id)
+    if conversation is not None:
+        model = session_model(conversation, prompt, has_image=False)
+    else:
+        model = choose_model(request.model, request.tier, prompt, has_image=False)
+    
     # DB 레코드 초기화
     record = AnalysisRecord(
         endpoint="/api/generate/text",
-        prompt=request.prompt,
+        prompt=prompt,
         has_image=False,
         temperature=request.temperature,
         max_tokens=request.max_tokens,
-        model=MODEL_NAME
+        model=model,
+        session_id=request.session_id,
+        template_id=request.template_id
     )
     
+    if conversation is not None:
+        # 같은 세션의 턴은 순서대로 처리
+        await conversation.lock.acquire()
     try:
         # Ollama API 요청 준비
         payload = {
-            "model": MODEL_NAME,
-            "prompt": request.prompt,
+            "model": model,
+            "prompt": prompt,
             "stream": False,
             "options": {
                 "temperature": request.temperature,
@@ -331,28 +781,66 @@ async def generate_text_only(request: TextPromptRequest, db: Session = Depends(g
             }
         }
         
-        # Ollama API 호출
-        response = requests.post(
-            f"{OLLAMA_HOST}/api/generate",
-            json=payload,
-            timeout=300
+        if conversation is not None and conversation.context:
+            # 이전 턴에서 이어서 생성
+            payload["context"] = conversation.context
+        elif system is not None:
+            # 고정 접두부는 system으로 분리 (바이트 단위로 같으면 Ollama가 프롬프트 KV 캐시 재사용)
+            payload["system"] = system
+        
+        # 결정적 요청이면 결과 캐시 확인 (세션 턴은 이전 대화에 의존하므로 제외)
+        result_key = make_result_key(
+            model, prompt, None, request.temperature, request.max_tokens, system
         )
+        cacheable = (
+            not request.long_input
+            and conversation is None
+            and is_cacheable(request.temperature, request.cache)
+        )
+        result = result_cache.get(result_key) if cacheable else None
+        cache_hit = result is not None
+        long_result = None
         
-        if response.status_code != 200:
-            try:
-                db.rollback()
-                record.success = False
-                record.error_message = f"Ollama API 오류: {response.text}"
-                db.add(record)
-                db.commit()
-            except Exception:
-                db.rollback()
+        async def run_generation():
+            generated = await ollama_client.generate(payload)
+            if cacheable:
+                result_cache.put(result_key, generated)
+            return generated
+        
+        # Ollama API 호출 (공유 커넥션 풀, 이벤트 루프 비차단, 동일 요청 병합)
+        try:
+            if request.long_input:
+                # 긴 입력 모드: 토큰 예산 청크로 나누어 병렬 요약 후 통합
+                long_result = await summarize_long_text(
+                    prompt,
+                    model=model,
+                    instruction=request.instruction,
+                    temperature=request.temperature,
+                    max_tokens=request.max_tokens,
+                    **({"chunk_tokens": request.chunk_tokens} if request.chunk_tokens else {})
+                )
+                result = {
+                    "response": long_result["summary"],
+                    "done": True,
+                    "total_duration": long_result["total_duration"],
+                    "load_duration": long_result["load_duration"],
+                    "prompt_eval_count": long_result["prompt_eval_count"],
+                    "eval_count": long_result["eval_count"]
+                }
+            elif conversation is not None:
+                result = await ollama_client.generate(payload)
+            elif not cache_hit:
+                result = await generation_flights.do(result_key, run_generation)
+        except OllamaAPIError as e:
+            await save_failed_record(record, f"Ollama API 오류: {e.text}")
             raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Ollama API 오류: {response.text}"
+                status_code=e.status_code,
+                detail=f"Ollama API 오류: {e.text}"
             )
         
-        result = response.json()
+        if conversation is not None:
+            conversation.context = result.get("context") or conversation.context
+            session_store.save(conversation)
         
         # DB에 성공 결과 저장
         record_id = None
@@ -362,96 +850,623 @@ async def generate_text_only(request: TextPromptRequest, db: Session = Depends(g
             record.total_duration = result.get("total_duration")
             record.load_duration = result.get("load_duration")
             record.prompt_eval_count = result.get("prompt_eval_count")
+            record.prompt_eval_duration = result.get("prompt_eval_duration")
             record.eval_count = result.get("eval_count")
-            db.add(record)
-            db.commit()
-            db.refresh(record)
-            record_id = record.id
+            record.cache_hit = cache_hit
+            record.backend = result.get("backend")
+            record_id = await record_writer.enqueue(record)
         except Exception as db_error:
             # DB 저장 실패 시 롤백하고 계속 진행
-            db.rollback()
             print(f"⚠️  DB 저장 실패 (응답은 정상 반환): {db_error}")
         
-        return {
+        response_body = {
             "success": True,
             "response": result.get("response", ""),
-            "model": MODEL_NAME,
-            "prompt": request.prompt,
+            "model": model,
+            "prompt": prompt,
             "done": result.get("done", False),
+            "cached": cache_hit,
+            "session_id": request.session_id,
+            "template_id": request.template_id,
             "record_id": record_id  # DB 레코드 ID 추가 (실패 시 None)
         }
+        if long_result is not None:
+            # 청크별 처리 시간 및 토큰 수
+            response_body["chunks"] = long_result["chunks"]
+            response_body["reduce_calls"] = long_result["reduce_calls"]
+        return response_body
         
-    except requests.exceptions.Timeout:
-        try:
-            db.rollback()
-            record.success = False
-            record.error_message = "Ollama 서버 응답 시간 초과"
-            db.add(record)
-            db.commit()
-        except Exception:
-            db.rollback()
+    except OllamaTimeoutError:
+        await save_failed_record(record, "Ollama 서버 응답 시간 초과")
         raise HTTPException(status_code=504, detail="Ollama 서버 응답 시간 초과")
-    except requests.exceptions.ConnectionError:
-        try:
-            db.rollback()
-            record.success = False
-            record.error_message = "Ollama 서버에 연결할 수 없습니다."
-            db.add(record)
-            db.commit()
-        except Exception:
-            db.rollback()
+    except OllamaConnectionError:
+        await save_failed_record(record, "Ollama 서버에 연결할 수 없습니다.")
         raise HTTPException(status_code=503, detail="Ollama 서버에 연결할 수 없습니다.")
+    except SchedulerRejectedError as e:
+        # 대기열 포화/대기 기한 초과: Retry-After와 함께 거절
+        await save_failed_record(record, str(e))
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except HTTPException:
         # HTTPException은 이미 처리됨
         raise
     except Exception as e:
+        await save_failed_record(record, str(e))
+        raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+    finally:
+        if conversation is not None:
+            conversation.lock.release()
+
+
+class BatchItem(BaseModel):
+    """배치 항목 (image_url이 없으면 텍스트 전용)"""
+    id: Optional[str] = None  # 클라이언트 측 식별자 (결과에 그대로 반환)
+    image_url: Optional[str] = None
+    prompt: str
+    temperature: Optional[float] = 0.7
+    max_tokens: Optional[int] = 2000
+    cache: Optional[bool] = None
+    model: Optional[str] = None
+    tier: Optional[str] = None
+    template_id: Optional[str] = None
+    variables: Optional[Dict[str, Any]] = None
+
+
+class BatchRequest(BaseModel):
+    """배치 생성 요청"""
+    items: List[BatchItem]
+    parallelism: Optional[int] = None  # 동시 Ollama 호출 수
+
+
+@app.post("/api/generate/batch")
+async def generate_batch(request: BatchRequest):
+    """
+    여러 (image_url, prompt) 항목을 한 번에 처리
+    
+    이미지 다운로드/전처리는 GPU 단계보다 앞서 진행되고(파이프라이닝),
+    Ollama 호출은 parallelism 만큼 동시에 실행된다.
+    결과는 완료 순서대로 NDJSON으로 전송되며, 항목별 실패는 배치를 중단하지 않는다.
+    레코드는 write-behind 큐(record_writer)로 저장되고, summary 전에 모두 저장된다.
+    """
+    items = request.items
+    if not items:
+        raise HTTPException(status_code=400, detail="items가 비어 있습니다.")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"배치 항목 수는 최대 {BATCH_MAX_ITEMS}개입니다.")
+    parallelism = max(1, min(request.parallelism or BATCH_PARALLELISM, BATCH_MAX_PARALLELISM))
+    
+    async def prepare_item(index: int, item: BatchItem) -> dict:
+        """다운로드 → 검증 → 전처리 (GPU 단계 이전)"""
+        prepared = {"index": index, "item": item, "image": None, "error": None}
+        if item.image_url:
+            try:
+                image = await image_flights.do(item.image_url, lambda: load_image(item.image_url))
+                if image is None:
+                    prepared["error"] = "유효하지 않은 이미지 형식입니다."
+                prepared["image"] = image
+            except HTTPException as e:
+                prepared["error"] = e.detail
+            except Exception as e:
+                # 전처리 풀 오류, 디코딩 오류 등도 해당 항목만 실패 처리 (배치는 계속)
+                prepared["error"] = f"이미지 준비 실패: {e}"
+        return prepared
+    
+    async def run_item(prepared: dict) -> tuple:
+        """Ollama 호출 후 (결과 라인, 레코드) 반환"""
+        item: BatchItem = prepared["item"]
+        image: Optional[CachedImage] = prepared["image"]
+        system, prompt = None, item.prompt
         try:
-            db.rollback()
+            if item.template_id:
+                template = template_registry.get(item.template_id)
+                system, prompt = template.system, template.render(item.prompt, item.variables)
+            model = select_model(item.model, item.tier, prompt, has_image=bool(item.image_url))
+        except (ModelSelectionError, TemplateError) as e:
+            model = None
+            prepared["error"] = prepared["error"] or str(e)
+        record = AnalysisRecord(
+            endpoint="/api/generate/batch",
+            prompt=prompt,
+            has_image=bool(item.image_url),
+            image_url=item.image_url,
+            temperature=item.temperature,
+            max_tokens=item.max_tokens,
+            model=model,
+            template_id=item.template_id
+        )
+        line = {"index": prepared["index"], "id": item.id}
+        
+        if prepared["error"]:
+            record.success = False
+            record.error_message = prepared["error"]
+            line.update(success=False, error=prepared["error"])
+            return line, record
+        if image is not None:
+            set_image_metadata(record, image, item.image_url)
+        
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "options": {
+                "temperature": item.temperature,
+                "num_predict": item.max_tokens
+            }
+        }
+        if image is not None:
+            payload["images"] = [image.image_base64]
+        if system is not None:
+            payload["system"] = system
+        
+        result_key = make_result_key(
+            model, prompt, image.sha256 if image else None, item.temperature, item.max_tokens, system
+        )
+        cacheable = is_cacheable(item.temperature, item.cache)
+        result = result_cache.get(result_key) if cacheable else None
+        cache_hit = result is not None
+        
+        try:
+            if not cache_hit:
+                result = await generation_flights.do(
+                    result_key, lambda: ollama_client.generate(payload, priority=PRIORITY_BATCH)
+                )
+                if cacheable:
+                    result_cache.put(result_key, result)
+        except Exception as e:
             record.success = False
             record.error_message = str(e)
-            db.add(record)
-            db.commit()
+            line.update(success=False, error=str(e))
+            return line, record
+        
+        record.response = result.get("response", "")
+        record.success = True
+        record.total_duration = result.get("total_duration")
+        record.load_duration = result.get("load_duration")
+        record.prompt_eval_count = result.get("prompt_eval_count")
+        record.prompt_eval_duration = result.get("prompt_eval_duration")
+        record.eval_count = result.get("eval_count")
+        record.cache_hit = cache_hit
+        record.backend = result.get("backend")
+        line.update(
+            success=True,
+            response=record.response,
+            cached=cache_hit,
+            total_duration=record.total_duration,
+            eval_count=record.eval_count
+        )
+        return line, record
+    
+    async def save_record(record: AnalysisRecord) -> Optional[int]:
+        """레코드를 write-behind 큐로 저장 → record_id (저장 실패는 배치에 영향 없음)"""
+        try:
+            return await record_writer.enqueue(record)
+        except Exception as db_error:
+            print(f"⚠️  배치 레코드 저장 실패: {db_error}")
+            return None
+    
+    async def generate():
+        """완료 순서대로 결과 전송"""
+        ready: asyncio.Queue = asyncio.Queue()
+        done: asyncio.Queue = asyncio.Queue()
+        # 준비 중이거나 준비됐지만 워커가 아직 가져가지 않은 항목 수 (워커가 가져갈 때 반환)
+        prefetch_slots = asyncio.Semaphore(BATCH_PREFETCH)
+        
+        async def producer():
+            async def prefetch(index: int, item: BatchItem):
+                await ready.put(await prepare_item(index, item))
+            prefetching = []
+            try:
+                for index, item in enumerate(items):
+                    await prefetch_slots.acquire()
+                    prefetching.append(asyncio.ensure_future(prefetch(index, item)))
+                await asyncio.gather(*prefetching)
+            finally:
+                for task in prefetching:
+                    task.cancel()
+                # 준비 단계가 어떻게 끝나든 워커가 종료되도록
+                for _ in range(parallelism):
+                    ready.put_nowait(None)
+        
+        async def worker():
+            while True:
+                prepared = await ready.get()
+                if prepared is None:
+                    break
+                prefetch_slots.release()
+                try:
+                    result = await run_item(prepared)
+                except Exception as e:
+                    # 항목 하나의 오류로 결과 수가 모자라 스트림이 멈추지 않도록 실패 라인으로 기록
+                    item: BatchItem = prepared["item"]
+                    result = (
+                        {"index": prepared["index"], "id": item.id, "success": False, "error": str(e)},
+                        AnalysisRecord(
+                            endpoint="/api/generate/batch",
+                            prompt=item.prompt,
+                            has_image=bool(item.image_url),
+                            image_url=item.image_url,
+                            success=False,
+                            error_message=str(e)
+                        )
+                    )
+                await done.put(result)
+        
+        tasks = [asyncio.ensure_future(producer())]
+        tasks += [asyncio.ensure_future(worker()) for _ in range(parallelism)]
+        succeeded = failed = saved = 0
+        try:
+            for _ in range(len(items)):
+                line, record = await done.get()
+                if line["success"]:
+                    succeeded += 1
+                else:
+                    failed += 1
+                line["record_id"] = await save_record(record)
+                if line["record_id"] is not None:
+                    saved += 1
+                yield json.dumps(line, ensure_ascii=False).encode() + b'\n'
+            # summary 이후 바로 조회해도 보이도록 큐에 남은 기록까지 저장
+            await record_writer.flush()
+            yield json.dumps({
+                "event": "summary",
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": failed,
+                "records_saved": saved
+            }).encode() + b'\n'
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson"
+    )
+
+
+class JobRequest(BaseModel):
+    """비동기 작업 요청 (image_url, image_urls가 없으면 텍스트 전용)"""
+    image_url: Optional[str] = None
+    image_urls: Optional[List[str]] = None
+    prompt: str
+    temperature: Optional[float] = 0.7
+    max_tokens: Optional[int] = 2000
+    cache: Optional[bool] = None
+    model: Optional[str] = None
+    tier: Optional[str] = None
+    template_id: Optional[str] = None
+    variables: Optional[Dict[str, Any]] = None
+    webhook_url: Optional[str] = None  # 완료 시 작업 정보를 POST할 URL
+
+
+async def execute_job(kind: str, params: dict) -> dict:
+    """
+    작업 큐 워커에서 호출하는 실행 함수
+    
+    동기 엔드포인트와 같은 처리 경로(캐시, 병합, 레코드 저장)를 그대로 사용하되,
+    Ollama 호출은 배치 우선순위로 스케줄링한다.
+    """
+    token = current_priority.set(PRIORITY_BATCH)
+    try:
+        if kind == "generate":
+            result = await generate_with_image(ImageUrlRequest(**params))
+        elif kind == "text":
+            result = await generate_text_only(TextPromptRequest(**params))
+        else:
+            raise ValueError(f"알 수 없는 작업 종류: {kind}")
+        # 작업이 record_id를 참조하므로 기록이 저장된 뒤에 완료 처리
+        await record_writer.flush()
+        return result
+    finally:
+        current_priority.reset(token)
+
+
+@app.post("/api/jobs", status_code=202)
+async def submit_job(request: JobRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    긴 생성 작업을 큐에 넣고 즉시 작업 ID 반환
+    
+    결과는 GET /api/jobs/{job_id}로 조회하거나 webhook_url로 받는다.
+    """
+    # 잘못된 모델/등급/템플릿은 큐에 넣기 전에 거절
+    _, prompt = render_template(request.template_id, request.variables, request.prompt)
+    has_image = bool(request.image_url or request.image_urls)
+    choose_model(request.model, request.tier, prompt, has_image=has_image)
+    params = request.model_dump(exclude={"webhook_url"}, exclude_none=True)
+    kind = "generate" if has_image else "text"
+    
+    try:
+        job = await job_queue.submit(db, kind, params, webhook_url=request.webhook_url)
+    except Exception as db_error:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"작업 저장 실패: {str(db_error)}")
+    
+    return {
+        "success": True,
+        "job_id": job.id,
+        "status": job.status,
+        "queue_depth": job_queue.depth()
+    }
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    작업 상태 및 결과 조회
+    
+    Args:
+        job_id: 조회할 작업 ID
+        db: 데이터베이스 세션
+    """
+    job = (await db.execute(select(Job).where(Job.id == job_id))).scalar_one_or_none()
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="작업을 찾을 수 없습니다.")
+    
+    return {
+        "success": True,
+        "job": job.to_dict()
+    }
+
+
+class SessionCreateRequest(BaseModel):
+    """대화 세션 생성 요청"""
+    model: Optional[str] = None
+    tier: Optional[str] = None
+    system: Optional[str] = None  # /api/chat에서 사용할 시스템 프롬프트
+    template_id: Optional[str] = None  # system 대신 템플릿의 고정 접두부 사용
+
+
+@app.post("/api/sessions")
+async def create_session(request: SessionCreateRequest):
+    """
+    대화 세션 생성
+    
+    session_id를 /api/generate, /api/generate/text, /api/chat에 넘기면
+    이전 턴의 context(또는 대화 기록)에서 이어서 생성한다.
+    model/tier를 지정하지 않으면 첫 턴의 프롬프트와 이미지 여부로 라우팅 정책에 따라 모델을 정한다.
+    """
+    system, _ = render_template(request.template_id, None, "")
+    system = request.system or system
+    model = None
+    if request.model or request.tier:
+        model = choose_model(request.model, request.tier, "", has_image=False)
+    conversation = session_store.create(model)
+    if system:
+        conversation.messages.append({"role": "system", "content": system})
+    return {"success": True, **conversation.to_dict()}
+
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    """대화 세션 상태 조회"""
+    return {"success": True, **open_session(session_id).to_dict()}
+
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """대화 세션 삭제"""
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="세션을 찾을 수 없거나 만료되었습니다.")
+    return {"success": True, "session_id": session_id}
+
+
+class ChatRequest(BaseModel):
+    """대화 요청 (session_id가 없으면 새 세션 생성)"""
+    message: str
+    session_id: Optional[str] = None
+    image_url: Optional[str] = None
+    temperature: Optional[float] = 0.7
+    max_tokens: Optional[int] = 2000
+    model: Optional[str] = None  # 새 세션에만 적용
+    tier: Optional[str] = None
+
+
+@app.post("/api/chat")
+async def chat(request: ChatRequest):
+    """
+    대화 기록을 유지하는 채팅
+    
+    세션에 저장된 메시지 기록에 이번 메시지를 붙여 Ollama /api/chat으로 보내고,
+    응답을 기록에 추가한다. 기록은 SESSION_MAX_MESSAGES를 넘으면 오래된 것부터 제거된다.
+    """
+    conversation = open_session(request.session_id)
+    if conversation is None:
+        model = choose_model(request.model, request.tier, request.message, has_image=bool(request.image_url))
+        conversation = session_store.create(model)
+    else:
+        session_model(conversation, request.message, has_image=bool(request.image_url))
+    
+    record = AnalysisRecord(
+        endpoint="/api/chat",
+        prompt=request.message,
+        has_image=bool(request.image_url),
+        image_url=request.image_url,
+        temperature=request.temperature,
+        max_tokens=request.max_tokens,
+        model=conversation.model,
+        session_id=conversation.id
+    )
+    
+    # 같은 세션의 턴은 순서대로 처리
+    await conversation.lock.acquire()
+    try:
+        message = {"role": "user", "content": request.message}
+        if request.image_url:
+            image = await image_flights.do(request.image_url, lambda: load_image(request.image_url))
+            if image is None:
+                await save_failed_record(record, "유효하지 않은 이미지 형식입니다.")
+                raise HTTPException(status_code=400, detail="유효하지 않은 이미지 형식입니다.")
+            set_image_metadata(record, image, request.image_url)
+            message["images"] = [image.image_base64]
+        
+        payload = {
+            "model": conversation.model,
+            "messages": conversation.messages + [message],
+            "options": {
+                "temperature": request.temperature,
+                "num_predict": request.max_tokens
+            }
+        }
+        
+        try:
+            result = await ollama_client.chat(payload)
+        except OllamaAPIError as e:
+            await save_failed_record(record, f"Ollama API 오류: {e.text}")
+            raise HTTPException(
+                status_code=e.status_code,
+                detail=f"Ollama API 오류: {e.text}"
+            )
+        
+        reply = result.get("message") or {"role": "assistant", "content": ""}
+        conversation.messages.extend([message, {"role": "assistant", "content": reply.get("content", "")}])
+        session_store.save(conversation)
+        
+        # DB에 성공 결과 저장
+        record_id = None
+        try:
+            record.response = reply.get("content", "")
+            record.success = True
+            record.total_duration = result.get("total_duration")
+            record.load_duration = result.get("load_duration")
+            record.prompt_eval_count = result.get("prompt_eval_count")
+            record.prompt_eval_duration = result.get("prompt_eval_duration")
+            record.eval_count = result.get("eval_count")
+            record.backend = result.get("backend")
+            record_id = await record_writer.enqueue(record)
         except Exception as db_error:
-            db.rollback()
-            print(f"⚠️  DB 저장 실패 (에러 기록 불가): {db_error}")
+            print(f"⚠️  DB 저장 실패 (응답은 정상 반환): {db_error}")
+        
+        return {
+            "success": True,
+            "response": reply.get("content", ""),
+            "model": conversation.model,
+            "session_id": conversation.id,
+            "turn": conversation.turns,
+            "done": result.get("done", False),
+            "total_duration": result.get("total_duration"),
+            "load_duration": result.get("load_duration"),
+            "prompt_eval_count": result.get("prompt_eval_count"),
+            "prompt_eval_duration": result.get("prompt_eval_duration"),
+            "eval_count": result.get("eval_count"),
+            "record_id": record_id
+        }
+        
+    except OllamaTimeoutError:
+        await save_failed_record(record, "Ollama 서버 응답 시간 초과")
+        raise HTTPException(status_code=504, detail="Ollama 서버 응답 시간 초과")
+    except OllamaConnectionError:
+        await save_failed_record(record, "Ollama 서버에 연결할 수 없습니다.")
+        raise HTTPException(status_code=503, detail="Ollama 서버에 연결할 수 없습니다.")
+    except SchedulerRejectedError as e:
+        await save_failed_record(record, str(e))
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
+    except HTTPException:
+        raise
+    except Exception as e:
+        await save_failed_record(record, str(e))
         raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+    finally:
+        conversation.lock.release()
 
 
 @app.get("/api/records")
 async def get_analysis_records(
-    skip: int = 0,
     limit: int = 100,
     endpoint: Optional[str] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    count: str = "estimate",
+    view: str = "summary",
+    fields: Optional[str] = None,
+    skip: int = 0,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    저장된 분석 기록 조회
+    저장된 분석 기록 조회 (최신순)
+    
+    응답의 next_cursor를 다음 요청의 cursor로 넘기면 (created_at, id) 인덱스 범위 조회로
+    페이지 깊이와 관계없이 같은 비용으로 다음 페이지를 가져온다.
+    고른 필드의 컬럼만 읽으며, prompt/response/error_message는 앞부분만 읽어 보낸다
+    (잘린 필드는 truncated에 표시, 전체는 /api/records/{record_id}).
     
     Args:
-        skip: 건너뛸 레코드 수
         limit: 가져올 최대 레코드 수
         endpoint: 특정 엔드포인트로 필터링 (선택사항)
+        cursor: 이전 응답의 next_cursor (없으면 첫 페이지)
+        count: 전체 개수 (exact: 정확히 세기, estimate: 추정치 또는 캐시된 값, none: 생략)
+        view: 필드 묶음 (summary: 목록용 필드와 미리보기, full: 전체 컬럼과 전체 텍스트)
+        fields: 쉼표로 구분한 필드 목록 (view 대신 사용, 큰 텍스트는 미리보기)
+        skip: 건너뛸 레코드 수 (이전 클라이언트 호환용, cursor가 있으면 무시, 깊을수록 느림)
         db: 데이터베이스 세션
     
     Returns:
-        분석 기록 목록
+        분석 기록 목록과 다음 페이지 커서
     """
-    query = db.query(AnalysisRecord)
+    if count not in COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count는 {', '.join(COUNT_MODES)} 중 하나여야 합니다")
+    try:
+        position = decode_cursor(cursor) if cursor else None
+        names = resolve_fields(view, fields)
+    except (InvalidCursorError, InvalidFieldsError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 큰 텍스트는 컬럼 대신 앞부분(잘렸는지 알 수 있게 한 글자 더)만 읽는다
+    previews = [] if view == "full" and not fields else [name for name in names if name in RECORD_PREVIEW_FIELDS]
+    loaded = [name for name in names if name not in previews]
     
+    filters = []
     if endpoint:
-        query = query.filter(AnalysisRecord.endpoint == endpoint)
+        filters.append(AnalysisRecord.endpoint == endpoint)
     
-    records = query.order_by(AnalysisRecord.created_at.desc()).offset(skip).limit(limit).all()
+    query = (
+        select(AnalysisRecord)
+        .options(*load_options({*loaded, "created_at"}))
+        .add_columns(*preview_columns(previews))
+        .where(*filters)
+        .order_by(AnalysisRecord.created_at.desc(), AnalysisRecord.id.desc())
+    )
+    if position is not None:
+        query = query.where(
+            keyset_before(AnalysisRecord.created_at, AnalysisRecord.id, *position, db.bind.dialect.name)
+        )
+    elif skip:
+        query = query.offset(skip)
+    
+    # 한 건 더 가져와서 다음 페이지가 있는지 확인
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1][0].created_at, rows[-1][0].id) if has_more else None
+    
+    parsed = [(record, *read_previews(previews, texts)) for record, *texts in rows]
+    incomplete = [record.id for record, _, complete in parsed if not complete]
+    fallback = await full_response_previews(db, incomplete) if incomplete else {}
+    
+    items = []
+    for record, preview_values, _ in parsed:
+        if record.id in fallback:
+            preview_values["response"] = fallback[record.id]
+        values = record.to_dict(loaded)
+        values.update({name: text for name, (text, _) in preview_values.items()})
+        item = {name: values[name] for name in names}
+        if previews:
+            item["truncated"] = [name for name, (_, truncated) in preview_values.items() if truncated]
+        items.append(item)
+    
+    total, total_type = await count_rows(
+        db, select(AnalysisRecord.id).where(*filters), count, cache_key=endpoint
+    )
     
     return {
         "success": True,
-        "total": query.count(),
-        "records": [record.to_dict() for record in records]
+        "total": total,
+        "total_type": total_type,
+        "has_more": has_more,
+        "next_cursor": next_cursor,
+        "records": items
     }
 
 
 @app.get("/api/records/{record_id}")
-async def get_analysis_record(record_id: int, db: Session = Depends(get_db)):
+async def get_analysis_record(record_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     특정 분석 기록 조회
     
@@ -462,14 +1477,71 @@ async def get_analysis_record(record_id: int, db: Session = Depends(get_db)):
     Returns:
         분석 기록 상세 정보
     """
-    record = db.query(AnalysisRecord).filter(AnalysisRecord.id == record_id).first()
+    record = (
+        await db.execute(
+            select(AnalysisRecord)
+            .options(selectinload(AnalysisRecord.images), joinedload(AnalysisRecord.prompt_text))
+            .where(AnalysisRecord.id == record_id)
+        )
+    ).scalar_one_or_none()
     
     if not record:
         raise HTTPException(status_code=404, detail="레코드를 찾을 수 없습니다.")
     
     return {
         "success": True,
-        "record": record.to_dict()
+        "record": record.to_dict(),
+        "images": [image.to_dict() for image in record.images]
+    }
+
+
+@app.get("/api/templates")
+async def list_templates():
+    """등록된 프롬프트 템플릿 목록 (prefix_hash가 같으면 접두부 바이트가 같음)"""
+    return {
+        "success": True,
+        "templates": [template.to_dict() for template in template_registry.all()]
+    }
+
+
+@app.get("/api/templates/stats")
+async def get_template_stats(endpoint: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    """
+    템플릿별 프롬프트 평가 통계
+    
+    템플릿 요청의 prompt_eval_count/prompt_eval_duration이 템플릿 없는 요청보다 작으면
+    고정 접두부가 Ollama 프롬프트 캐시로 재사용되고 있는 것이다. (template_id가 NULL인 행이 비교 기준)
+    """
+    query = select(
+        AnalysisRecord.template_id,
+        func.count(AnalysisRecord.id),
+        func.avg(AnalysisRecord.prompt_eval_count),
+        func.avg(AnalysisRecord.prompt_eval_duration),
+        func.avg(AnalysisRecord.total_duration),
+        func.avg(AnalysisRecord.load_duration)
+    ).where(AnalysisRecord.success == True, AnalysisRecord.cache_hit == False)
+    
+    if endpoint:
+        query = query.where(AnalysisRecord.endpoint == endpoint)
+    
+    rows = (await db.execute(query.group_by(AnalysisRecord.template_id))).all()
+    
+    def ms(value):
+        return round(float(value) / 1e6, 1) if value is not None else None
+    
+    return {
+        "success": True,
+        "templates": [
+            {
+                "template_id": template_id,
+                "count": count,
+                "avg_prompt_eval_count": round(float(eval_count), 1) if eval_count is not None else None,
+                "avg_prompt_eval_ms": ms(eval_duration),
+                "avg_total_ms": ms(total_duration),
+                "avg_load_ms": ms(load_duration)
+            }
+            for template_id, count, eval_count, eval_duration, total_duration, load_duration in rows
+        ]
     }
 
 
@@ -478,49 +1550,49 @@ class ImageUrlStreamRequest(BaseModel):
     image_url: str
     prompt: str
     temperature: Optional[float] = 0.7
+    model: Optional[str] = None
+    tier: Optional[str] = None
+    template_id: Optional[str] = None
+    variables: Optional[Dict[str, Any]] = None
 
 
 @app.post("/api/generate/stream")
-async def generate_with_image_stream(request: ImageUrlStreamRequest, db: Session = Depends(get_db)):
+async def generate_with_image_stream(request: ImageUrlStreamRequest):
     """
     이미지 URL과 프롬프트를 받아서 스트리밍 방식으로 응답
     (실시간으로 결과를 받아볼 수 있음)
     """
+    system, prompt = render_template(request.template_id, request.variables, request.prompt)
+    model = choose_model(request.model, request.tier, prompt, has_image=True)
+    
     # DB 레코드 초기화
     record = AnalysisRecord(
         endpoint="/api/generate/stream",
-        prompt=request.prompt,
+        prompt=prompt,
         has_image=True,
         image_url=request.image_url,
         temperature=request.temperature,
-        model=MODEL_NAME
+        model=model,
+        template_id=request.template_id
     )
     
     try:
-        from fastapi.responses import StreamingResponse
-        
-        # URL에서 이미지 다운로드
-        image_bytes = download_image_from_url(request.image_url)
+        # 이미지 로드 (캐시 → 다운로드 → 검증 → 인코딩, 같은 URL 동시 요청은 병합)
+        image = await image_flights.do(request.image_url, lambda: load_image(request.image_url))
         
         # 이미지 유효성 검증
-        if not validate_image(image_bytes):
-            try:
-                db.rollback()
-                record.success = False
-                record.error_message = "유효하지 않은 이미지 형식입니다."
-                db.add(record)
-                db.commit()
-            except Exception:
-                db.rollback()
+        if image is None:
+            await save_failed_record(record, "유효하지 않은 이미지 형식입니다.")
             raise HTTPException(status_code=400, detail="유효하지 않은 이미지 형식입니다.")
+        set_image_metadata(record, image, request.image_url)
         
-        # 이미지를 base64로 인코딩
-        image_base64 = encode_image_to_base64(image_bytes)
+        # base64 인코딩된 페이로드 (캐시 히트 시 재인코딩 없음)
+        image_base64 = image.image_base64
         
         # Ollama API 요청 준비
         payload = {
-            "model": MODEL_NAME,
-            "prompt": request.prompt,
+            "model": model,
+            "prompt": prompt,
             "images": [image_base64],
             "stream": True,
             "options": {
@@ -528,33 +1600,40 @@ async def generate_with_image_stream(request: ImageUrlStreamRequest, db: Session
             }
         }
         
-        def generate():
+        if system is not None:
+            payload["system"] = system
+        
+        stream_key = make_result_key(
+            model, prompt, image.sha256, request.temperature, None, system
+        )
+        
+        # 응답 헤더를 보내기 전에 승인 여부 확인 (대기열이 가득 차면 429)
+        ollama_scheduler.ensure_capacity(PRIORITY_INTERACTIVE)
+        
+        async def generate():
             """스트리밍 응답 생성 및 DB에 저장"""
             full_response = []
             last_metrics = {}
             
             try:
-                response = requests.post(
-                    f"{OLLAMA_HOST}/api/generate",
-                    json=payload,
-                    stream=True,
-                    timeout=300
+                # 동일한 진행 중 스트림이 있으면 합류 (이미 전송된 청크부터 재생)
+                lines = stream_flights.subscribe(
+                    stream_key,
+                    lambda: ollama_client.generate_stream(payload)
                 )
-                
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            chunk_data = json.loads(line)
-                            # 응답 텍스트 수집
-                            if "response" in chunk_data:
-                                full_response.append(chunk_data["response"])
-                            # 메트릭 정보 수집
-                            if chunk_data.get("done"):
-                                last_metrics = chunk_data
-                        except json.JSONDecodeError:
-                            pass
-                        
-                        yield line + b'\n'
+                async for line in lines:
+                    try:
+                        chunk_data = json.loads(line)
+                        # 응답 텍스트 수집
+                        if "response" in chunk_data:
+                            full_response.append(chunk_data["response"])
+                        # 메트릭 정보 수집
+                        if chunk_data.get("done"):
+                            last_metrics = chunk_data
+                    except json.JSONDecodeError:
+                        pass
+                    
+                    yield line.encode() + b'\n'
                 
                 # 스트리밍 완료 후 DB에 저장
                 try:
@@ -563,23 +1642,16 @@ async def generate_with_image_stream(request: ImageUrlStreamRequest, db: Session
                     record.total_duration = last_metrics.get("total_duration")
                     record.load_duration = last_metrics.get("load_duration")
                     record.prompt_eval_count = last_metrics.get("prompt_eval_count")
+                    record.prompt_eval_duration = last_metrics.get("prompt_eval_duration")
                     record.eval_count = last_metrics.get("eval_count")
-                    db.add(record)
-                    db.commit()
+                    record.backend = last_metrics.get("backend")
+                    await record_writer.enqueue(record)
                 except Exception as db_error:
-                    db.rollback()
                     print(f"⚠️  DB 저장 실패 (스트리밍 완료): {db_error}")
                 
             except Exception as e:
-                try:
-                    db.rollback()
-                    record.success = False
-                    record.error_message = str(e)
-                    record.response = "".join(full_response) if full_response else None
-                    db.add(record)
-                    db.commit()
-                except Exception:
-                    db.rollback()
+                record.response = "".join(full_response) if full_response else None
+                await save_failed_record(record, str(e))
                 yield json.dumps({"error": str(e)}).encode() + b'\n'
         
         return StreamingResponse(
@@ -587,19 +1659,129 @@ async def generate_with_image_stream(request: ImageUrlStreamRequest, db: Session
             media_type="application/x-ndjson"
         )
         
+    except SchedulerRejectedError as e:
+        await save_failed_record(record, str(e))
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers)
     except HTTPException:
         raise
     except Exception as e:
+        await save_failed_record(record, str(e))
+        raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+
+
+@app.post("/api/summarize/pdf")
+async def summarize_pdf_document(
+    file: Optional[UploadFile] = File(None),
+    pdf_url: Optional[str] = Form(None),
+    prompt: Optional[str] = Form(None),
+    temperature: Optional[float] = Form(0.3),
+    max_tokens: Optional[int] = Form(1000),
+    model: Optional[str] = Form(None),
+    tier: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    PDF(업로드 또는 URL)를 페이지 단위로 요약한 뒤 하나의 요약으로 통합
+    
+    진행 상황은 NDJSON 이벤트(started, page, reduce, done, error)로 스트리밍되며,
+    각 페이지/통합 호출은 문서(documents)에 연결된 AnalysisRecord로 저장된다.
+    
+    Args:
+        file: 업로드한 PDF 파일
+        pdf_url: PDF URL (file이 없을 때)
+        prompt: 추가 요약 지침 (선택사항)
+        temperature: 생성 temperature
+        max_tokens: 호출당 최대 생성 토큰 수
+        model: 사용할 모델 (없으면 tier 또는 라우팅 정책)
+        tier: 모델 등급 (small, large)
+        db: 데이터베이스 세션
+    """
+    if not PDF_SUPPORT:
+        raise HTTPException(status_code=503, detail="PDF 요약을 사용하려면 PyMuPDF를 설치하세요.")
+    if file is None and not pdf_url:
+        raise HTTPException(status_code=400, detail="file 또는 pdf_url 중 하나가 필요합니다.")
+    # 페이지 이미지와 긴 본문을 다루므로 라우팅 정책에서는 이미지 요청으로 취급
+    model = choose_model(model, tier, prompt or "", has_image=True)
+    
+    # PDF를 임시 파일로 받기 (메모리에 전체를 올리지 않음)
+    try:
+        if file is not None:
+            path = await save_upload_to_temp(file)
+        else:
+            path = await download_pdf_to_temp(pdf_url)
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=413, detail=f"PDF 다운로드 실패: {str(e)}")
+    except (ImageFetchError, PdfError) as e:
+        raise HTTPException(status_code=400, detail=f"PDF 처리 실패: {str(e)}")
+    
+    try:
+        document = Document(
+            source_url=pdf_url if file is None else None,
+            filename=file.filename if file is not None else None,
+            status="processing",
+            model=model
+        )
         try:
-            db.rollback()
-            record.success = False
-            record.error_message = str(e)
-            db.add(record)
-            db.commit()
+            db.add(document)
+            await db.commit()
+            await db.refresh(document)
         except Exception as db_error:
-            db.rollback()
-            print(f"⚠️  DB 저장 실패 (에러 기록 불가): {db_error}")
-        raise HTTPException(status_code=500, detail=f"서버 오류: {str(e)}")
+            await db.rollback()
+            raise HTTPException(status_code=500, detail=f"문서 레코드 생성 실패: {str(db_error)}")
+    except BaseException:
+        # 응답을 돌려주기 전에 실패하면 바로 삭제
+        remove_temp_pdf(path)
+        raise
+    
+    async def generate():
+        """요약 진행 이벤트를 NDJSON으로 전송"""
+        async for event in summarize_pdf(
+            path,
+            document,
+            db,
+            model=model,
+            instruction=prompt,
+            temperature=temperature,
+            max_tokens=max_tokens
+        ):
+            yield json.dumps(event, ensure_ascii=False).encode() + b'\n'
+    
+    # 스트림이 끝나거나 본문을 보내기 전에 클라이언트가 끊어도 응답 처리 후 삭제
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(remove_temp_pdf, path)
+    )
+
+
+@app.get("/api/documents/{document_id}")
+async def get_document(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    요약 문서와 페이지별 기록 조회
+    
+    Args:
+        document_id: 조회할 문서 ID
+        db: 데이터베이스 세션
+    """
+    document = (await db.execute(select(Document).where(Document.id == document_id))).scalar_one_or_none()
+    
+    if not document:
+        raise HTTPException(status_code=404, detail="문서를 찾을 수 없습니다.")
+    
+    records = (
+        await db.execute(
+            select(AnalysisRecord)
+            .options(joinedload(AnalysisRecord.prompt_text))
+            .where(AnalysisRecord.document_id == document_id)
+            .order_by(AnalysisRecord.id)
+        )
+    ).scalars().all()
+    
+    return {
+        "success": True,
+        "document": document.to_dict(),
+        "records": [record.to_dict() for record in records]
+    }
 
 
 if __name__ == "__main__":
@@ -611,7 +1793,7 @@ if __name__ == "__main__":
     print(f"🚀 Ollama Gemma3 API Server 시작")
     print(f"📍 서버 주소: http://{host}:{port}")
     print(f"🤖 모델: {MODEL_NAME}")
-    print(f"🔗 Ollama 호스트: {OLLAMA_HOST}")
+    print(f"🔗 Ollama 호스트: {', '.join(OLLAMA_HOSTS)}")
     print(f"📚 API 문서: http://{host}:{port}/docs")
     
     uvicorn.run(
@@ -0,0 +1,153 @@
+"""
+대화 세션 저장소
+/api/generate 계열은 Ollama가 돌려준 context(토큰 배열)를, /api/chat은 메시지 기록을 세션별로 보관하여
+후속 질문이 이전 대화에서 이어지도록 한다. (이미지와 긴 프롬프트를 다시 평가하지 않음)
+세션은 메모리에만 있으며 TTL과 세션 수/바이트 예산으로 제한되는 LRU로 관리된다.
+"""
+import os
+import time
+import uuid
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from metrics import metrics
+
+# .env 파일 로드
+load_dotenv()
+
+# 세션 저장소 설정
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))  # 마지막 사용 후 유지 시간
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "1000"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(256 * 1024 * 1024)))  # 기본 256MB
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "40"))  # /api/chat 기록 최대 메시지 수
+
+
+@dataclass
+class Session:
+    """세션 하나의 대화 상태"""
+    id: str
+    model: Optional[str]  # 생성 시 지정하지 않았으면 첫 턴에서 결정
+    created_at: float = field(default_factory=time.time)
+    last_used_at: float = field(default_factory=time.time)
+    turns: int = 0
+    context: Optional[List[int]] = None  # /api/generate 계열의 마지막 context
+    image_sha256: Optional[str] = None  # context에 이미 포함된 이미지
+    messages: List[Dict[str, Any]] = field(default_factory=list)  # /api/chat 기록
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)  # 같은 세션의 턴 직렬화
+
+    def size(self) -> int:
+        """메모리 사용량 추정 (바이트)"""
+        size = 8 * len(self.context or [])
+        for message in self.messages:
+            size += len(message.get("content", "").encode("utf-8"))
+            size += sum(len(image) for image in message.get("images", []))
+        return size
+
+    def trim_messages(self, max_messages: int = SESSION_MAX_MESSAGES):
+        """오래된 메시지부터 제거 (system 메시지는 유지)"""
+        system = [m for m in self.messages if m.get("role") == "system"]
+        others = [m for m in self.messages if m.get("role") != "system"]
+        if len(others) > max_messages:
+            self.messages = system + others[-max_messages:]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.id,
+            "model": self.model,
+            "created_at": self.created_at,
+            "last_used_at": self.last_used_at,
+            "turns": self.turns,
+            "context_tokens": len(self.context or []),
+            "has_image": self.image_sha256 is not None,
+            "messages": len(self.messages),
+            "bytes": self.size(),
+        }
+
+
+class SessionStore:
+    """TTL과 세션 수/바이트 예산으로 제한되는 LRU 세션 저장소"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = SESSION_TTL_SECONDS,
+        max_sessions: int = SESSION_MAX_SESSIONS,
+        max_bytes: int = SESSION_MAX_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+
+    def create(self, model: Optional[str] = None) -> Session:
+        """새 세션 생성 (model이 없으면 첫 턴의 요청으로 결정)"""
+        session = Session(id=str(uuid.uuid4()), model=model)
+        self._sessions[session.id] = session
+        self._sizes[session.id] = 0
+        metrics.inc("sessions_created")
+        self._evict()
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """세션 조회 (만료된 세션은 제거)"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.last_used_at > self.ttl_seconds:
+            self._remove(session_id)
+            metrics.inc("sessions_expired")
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def save(self, session: Session):
+        """턴 완료 후 세션 크기 갱신 및 예산 초과분 정리"""
+        if session.id not in self._sessions:
+            return  # 턴 도중 삭제/축출됨
+        session.turns += 1
+        session.last_used_at = time.time()
+        session.trim_messages()
+        size = session.size()
+        self._bytes += size - self._sizes[session.id]
+        self._sizes[session.id] = size
+        self._sessions.move_to_end(session.id)
+        self._evict()
+
+    def delete(self, session_id: str) -> bool:
+        if session_id not in self._sessions:
+            return False
+        self._remove(session_id)
+        return True
+
+    def _evict(self):
+        now = time.time()
+        for session_id in [k for k, s in self._sessions.items() if now - s.last_used_at > self.ttl_seconds]:
+            self._remove(session_id)
+            metrics.inc("sessions_expired")
+        while len(self._sessions) > self.max_sessions or (self._bytes > self.max_bytes and len(self._sessions) > 1):
+            oldest = next(iter(self._sessions))
+            self._remove(oldest)
+            metrics.inc("sessions_evicted")
+
+    def _remove(self, session_id: str):
+        self._sessions.pop(session_id)
+        self._bytes -= self._sizes.pop(session_id, 0)
+
+    def stats(self) -> dict:
+        """세션 저장소 상태"""
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# 서버 전역 세션 저장소
+session_store = SessionStore()
@@ -0,0 +1,130 @@
+"""
+진행 중인 동일 요청 병합 (single-flight)
+같은 키로 동시에 들어온 요청은 하나의 업스트림 작업에 붙어 결과를 함께 받는다.
+영속 캐시가 아니므로 작업이 끝나면 키는 즉시 제거된다.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from metrics import metrics
+
+
+class SingleFlight:
+    """
+    비스트리밍 작업 병합
+
+    작업은 별도 태스크로 실행되므로 먼저 도착한 요청이 취소되어도
+    나머지 대기자는 결과를 그대로 받는다.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """키가 같은 진행 중 작업이 있으면 합류하고, 없으면 새로 시작"""
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _, key=key: self._tasks.pop(key, None))
+            metrics.inc(f"{self.name}_leaders")
+        else:
+            metrics.inc(f"{self.name}_shared")
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        """진행 중인 작업 수"""
+        return len(self._tasks)
+
+
+class _Broadcast:
+    """하나의 업스트림 스트림을 여러 구독자에게 전달 (이미 보낸 청크 재생 포함)"""
+
+    def __init__(self, source: AsyncIterator[Any], on_finish: Callable[["_Broadcast"], None]):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._cond = asyncio.Condition()
+        self._on_finish = on_finish
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    async def _pump(self, source: AsyncIterator[Any]):
+        try:
+            async for chunk in source:
+                async with self._cond:
+                    self.chunks.append(chunk)
+                    self._cond.notify_all()
+        except asyncio.CancelledError:
+            self.error = ConnectionError("모든 구독자가 연결을 종료했습니다.")
+        except Exception as e:
+            self.error = e
+        finally:
+            self._on_finish(self)
+            async with self._cond:
+                self.done = True
+                self._cond.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                async with self._cond:
+                    while index >= len(self.chunks) and not self.done:
+                        await self._cond.wait()
+                    pending = self.chunks[index:]
+                    index = len(self.chunks)
+                    finished = self.done
+                for chunk in pending:
+                    yield chunk
+                if finished and index >= len(self.chunks):
+                    if self.error is not None:
+                        raise self.error
+                    return
+        finally:
+            self.subscribers -= 1
+            # 남은 구독자가 없으면 업스트림 생성을 중단
+            if self.subscribers == 0 and not self.done:
+                self.task.cancel()
+
+
+class StreamFlight:
+    """
+    스트리밍 작업 병합
+
+    늦게 합류한 구독자도 처음부터 같은 청크 순서를 받는다.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._broadcasts: Dict[str, _Broadcast] = {}
+
+    def subscribe(self, key: str, source_factory: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        """키가 같은 진행 중 스트림에 합류하거나 새 스트림을 시작"""
+        broadcast = self._broadcasts.get(key)
+        if broadcast is None or broadcast.done:
+            broadcast = _Broadcast(
+                source_factory(),
+                on_finish=lambda finished, key=key: self._release(key, finished),
+            )
+            self._broadcasts[key] = broadcast
+            metrics.inc(f"{self.name}_leaders")
+        else:
+            metrics.inc(f"{self.name}_shared")
+        return broadcast.subscribe()
+
+    def _release(self, key: str, broadcast: _Broadcast):
+        if self._broadcasts.get(key) is broadcast:
+            del self._broadcasts[key]
+
+    def in_flight(self) -> int:
+        """진행 중인 스트림 수"""
+        return len(self._broadcasts)
+
+
+# 서버 전역 병합 그룹
+image_flights = SingleFlight("image_flight")
+generation_flights = SingleFlight("generation_flight")
+stream_flights = StreamFlight("stream_flight")
@@ -0,0 +1,235 @@
+"""
+요약 공통 로직 (map-reduce)
+긴 텍스트를 토큰 예산 단위 청크로 나누고, 부분 요약들을 fan-in 단위로 묶어
+동시성 제한 하에 계층적으로 합쳐 하나의 요약으로 만든다.
+"""
+import os
+import re
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from ollama_client import ollama_client
+
+# .env 파일 로드
+load_dotenv()
+
+# map-reduce 설정
+SUMMARY_REDUCE_FANIN = int(os.getenv("SUMMARY_REDUCE_FANIN", "8"))  # 한 번에 합칠 부분 요약 수
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))  # 동시에 보낼 Ollama 요청 수
+
+# 청크 설정 (토큰 수는 추정치)
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "3000"))
+SUMMARY_CHUNK_OVERLAP_TOKENS = int(os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", "200"))
+SUMMARY_NUM_CTX = int(os.getenv("SUMMARY_NUM_CTX", "8192"))  # 청크/통합 호출의 컨텍스트 길이
+
+CHUNK_PROMPT = "다음은 긴 문서의 {index}/{total}번째 부분입니다. 이 부분의 핵심 내용을 간결하게 요약해주세요."
+
+REDUCE_PROMPT = (
+    "다음은 하나의 문서를 나누어 작성한 부분 요약들입니다. "
+    "중복을 제거하고 순서를 유지하여 하나의 일관된 요약으로 통합해주세요."
+)
+
+
+def build_reduce_prompt(summaries: List[str], instruction: Optional[str] = None) -> str:
+    """부분 요약들을 합치는 프롬프트 생성"""
+    parts = [REDUCE_PROMPT]
+    if instruction:
+        parts.append(f"요약 지침: {instruction}")
+    for i, summary in enumerate(summaries, 1):
+        parts.append(f"[부분 {i}]\n{summary}")
+    return "\n\n".join(parts)
+
+
+async def reduce_summaries(
+    summaries: List[str],
+    summarize: Callable[[str, int, int], Awaitable[str]],
+    instruction: Optional[str] = None,
+    fan_in: int = SUMMARY_REDUCE_FANIN,
+    concurrency: int = SUMMARY_CONCURRENCY,
+) -> str:
+    """
+    부분 요약을 계층적으로 합쳐 최종 요약 생성
+
+    Args:
+        summaries: 순서대로 정렬된 부분 요약
+        summarize: (프롬프트, 단계, 그룹 번호)를 받아 요약 텍스트를 반환하는 함수
+        instruction: 호출자가 지정한 요약 지침
+        fan_in: 한 번에 합칠 부분 요약 수
+        concurrency: 한 단계 안에서 동시에 실행할 요약 수
+
+    Returns:
+        최종 요약 (부분 요약이 하나뿐이면 그대로 반환)
+    """
+    fan_in = max(2, fan_in)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    level = 1
+
+    async def run(group: List[str], index: int) -> str:
+        # 남은 요약이 하나뿐인 그룹은 다음 단계로 그대로 전달
+        if len(group) == 1:
+            return group[0]
+        async with semaphore:
+            return await summarize(build_reduce_prompt(group, instruction), level, index)
+
+    while len(summaries) > 1:
+        groups = [summaries[i:i + fan_in] for i in range(0, len(summaries), fan_in)]
+        summaries = list(await asyncio.gather(*(
+            run(group, index) for index, group in enumerate(groups)
+        )))
+        level += 1
+
+    return summaries[0] if summaries else ""
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    토큰 수 추정 (토크나이저 없이)
+
+    영문/숫자는 약 4자당 1토큰, 한글 등 비 ASCII 문자는 약 1.5자당 1토큰으로 계산한다.
+    """
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / 4 + other_chars / 1.5) + 1
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """문단 하나가 예산을 넘으면 문장 단위, 그래도 넘으면 글자 단위로 분할"""
+    pieces: List[str] = []
+    for sentence in re.split(r"(?<=[.!?。])\s+|\n", text):
+        if not sentence:
+            continue
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        step = max(1, int(len(sentence) * max_tokens / estimate_tokens(sentence)))
+        pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+    return pieces
+
+
+def split_into_chunks(
+    text: str,
+    max_tokens: int = SUMMARY_CHUNK_TOKENS,
+    overlap_tokens: int = SUMMARY_CHUNK_OVERLAP_TOKENS,
+) -> List[str]:
+    """
+    텍스트를 토큰 예산 단위 청크로 분할
+
+    문단 경계를 우선 유지하며, 앞 청크의 마지막 문단들(overlap_tokens 이내)을
+    다음 청크 앞에 반복하여 경계에서 문맥이 끊기지 않도록 한다.
+    """
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+    units: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            units.append(paragraph)
+        else:
+            units.extend(_split_oversized(paragraph, max_tokens))
+
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for unit in units:
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            # 겹침: 직전 청크 끝부분 단위들을 예산 내에서 이어받음
+            carried: List[str] = []
+            carried_tokens = 0
+            for previous in reversed(current):
+                previous_tokens = estimate_tokens(previous)
+                if carried_tokens + previous_tokens > overlap_tokens:
+                    break
+                carried.insert(0, previous)
+                carried_tokens += previous_tokens
+            current, current_tokens = carried, carried_tokens
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+async def summarize_long_text(
+    text: str,
+    model: str,
+    instruction: Optional[str] = None,
+    temperature: Optional[float] = 0.3,
+    max_tokens: Optional[int] = 1000,
+    chunk_tokens: int = SUMMARY_CHUNK_TOKENS,
+    overlap_tokens: int = SUMMARY_CHUNK_OVERLAP_TOKENS,
+    concurrency: int = SUMMARY_CONCURRENCY,
+) -> Dict[str, Any]:
+    """
+    긴 텍스트 map-reduce 요약
+
+    청크 요약을 동시성 제한 하에 병렬로 실행한 뒤 reduce_summaries로 통합한다.
+    Ollama 오류는 그대로 전파된다.
+
+    Returns:
+        summary, chunks(청크별 시간/토큰), reduce_calls, 합산 메트릭
+    """
+    options = {"temperature": temperature, "num_predict": max_tokens, "num_ctx": SUMMARY_NUM_CTX}
+    chunks = split_into_chunks(text, chunk_tokens, overlap_tokens)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    calls: List[Dict[str, Any]] = []
+
+    async def call(prompt: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        result = await ollama_client.generate({"model": model, "prompt": prompt, "options": options})
+        result["elapsed_ms"] = (time.perf_counter() - start) * 1000
+        calls.append(result)
+        return result
+
+    async def map_chunk(index: int, chunk: str) -> Dict[str, Any]:
+        prompt = CHUNK_PROMPT.format(index=index + 1, total=len(chunks))
+        if instruction:
+            prompt = f"{prompt}\n요약 지침: {instruction}"
+        async with semaphore:
+            result = await call(f"{prompt}\n\n{chunk}")
+        return {
+            "index": index,
+            "tokens_estimate": estimate_tokens(chunk),
+            "elapsed_ms": round(result["elapsed_ms"], 1),
+            "total_duration": result.get("total_duration"),
+            "prompt_eval_count": result.get("prompt_eval_count"),
+            "prompt_eval_duration": result.get("prompt_eval_duration"),
+            "eval_count": result.get("eval_count"),
+            "eval_duration": result.get("eval_duration"),
+            "summary": result.get("response", ""),
+        }
+
+    chunk_results = await asyncio.gather(*(map_chunk(i, c) for i, c in enumerate(chunks)))
+
+    reduce_calls = 0
+
+    async def reduce_step(prompt: str, level: int, group: int) -> str:
+        nonlocal reduce_calls
+        reduce_calls += 1
+        result = await call(prompt)
+        return result.get("response", "")
+
+    summary = await reduce_summaries(
+        [c["summary"] for c in chunk_results],
+        reduce_step,
+        instruction=instruction,
+        concurrency=concurrency,
+    )
+
+    def total(field: str) -> int:
+        return sum(c.get(field) or 0 for c in calls)
+
+    return {
+        "summary": summary,
+        "chunks": chunk_results,
+        "reduce_calls": reduce_calls,
+        "total_duration": total("total_duration"),
+        "load_duration": total("load_duration"),
+        "prompt_eval_count": total("prompt_eval_count"),
+        "eval_count": total("eval_count"),
+    }
@@ -0,0 +1,29 @@
+"""
+테스트 공통 설정
+서버 모듈은 import 시점에 환경 변수를 읽으므로, 임시 SQLite DB와 compact 저장 모드를 먼저 설정한다.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+
+import pytest
+
+_TMP_DIR = tempfile.mkdtemp()
+os.environ["DB_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+os.environ["RECORD_STORAGE_MODE"] = "compact"
+os.environ["RECORD_COMPRESSION"] = "zstd"
+os.environ["RECORD_WRITER_ENABLED"] = "false"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    """테이블 생성, 종료 시 연결 풀 정리 (aiosqlite 스레드가 남지 않도록)"""
+    from database import close_db, init_db
+    import record_writer  # noqa: F401  (id 할당 리스너 등록)
+
+    init_db()
+    yield
+    asyncio.run(close_db())
@@ -0,0 +1,81 @@
+"""
+작업 큐: 리스가 만료된 작업만 다시 대기 상태로, 선점 후 오류는 실패로 기록
+"""
+import uuid
+import asyncio
+from datetime import timedelta
+
+from database import SessionLocal
+from jobs import JobQueue, _now
+from models import Job
+
+
+def _add_job(status: str = "queued", request: str = "{}", **values) -> str:
+    job_id = str(uuid.uuid4())
+    db = SessionLocal()
+    try:
+        values.setdefault("attempts", 0 if status == "queued" else 1)
+        db.add(Job(id=job_id, kind="text", status=status, request=request, **values))
+        db.commit()
+    finally:
+        db.close()
+    return job_id
+
+
+def _add_running_job(worker_id, lease_expires_at) -> str:
+    return _add_job("running", worker_id=worker_id, lease_expires_at=lease_expires_at)
+
+
+def _job(job_id: str) -> Job:
+    db = SessionLocal()
+    try:
+        return db.get(Job, job_id)
+    finally:
+        db.close()
+
+
+def _status(job_id: str) -> str:
+    return _job(job_id).status
+
+
+def _run(job_id: str, executor):
+    queue = JobQueue()
+    queue._executor = executor
+    asyncio.run(queue._run(job_id))
+
+
+def test_recover_requeues_only_expired_leases():
+    live = _add_running_job("other-process", _now() + timedelta(minutes=5))
+    expired = _add_running_job("dead-process", _now() - timedelta(seconds=1))
+    legacy = _add_running_job(None, None)
+
+    requeued = asyncio.run(JobQueue()._recover_expired())
+
+    assert set(requeued) == {expired, legacy}
+    assert _status(live) == "running"
+    assert _status(expired) == "queued"
+    assert _status(legacy) == "queued"
+
+
+def test_unsaved_record_id_is_not_referenced():
+    async def executor(kind, request):
+        return {"success": True, "record_id": 987654321}
+
+    job_id = _add_job()
+    _run(job_id, executor)
+
+    job = _job(job_id)
+    assert job.status == "completed"
+    assert job.record_id is None
+
+
+def test_error_after_claim_marks_job_failed():
+    async def executor(kind, request):
+        raise AssertionError("요청을 읽지 못하면 실행되지 않아야 함")
+
+    job_id = _add_job(request="{잘못된 JSON")
+    _run(job_id, executor)
+
+    job = _job(job_id)
+    assert job.status == "failed"
+    assert job.finished_at is not None
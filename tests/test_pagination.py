@@ -0,0 +1,18 @@
+"""
+기록 목록 개수 캐시: 필터 수 제한
+"""
+from pagination import CountCache
+
+
+def test_count_cache_evicts_least_recently_used_filter():
+    cache = CountCache(ttl_seconds=60, max_entries=2)
+    cache.put("/api/generate", 1)
+    cache.put("/api/generate/text", 2)
+    assert cache.get("/api/generate") == 1  # 최근 사용으로 갱신
+
+    cache.put("/api/chat", 3)
+
+    assert cache.get("/api/generate/text") is None
+    assert cache.get("/api/generate") == 1
+    assert cache.get("/api/chat") == 3
+    assert len(cache._entries) == 2
@@ -0,0 +1,69 @@
+"""
+compact 저장 모드: 압축된 응답의 목록 미리보기
+"""
+import random
+import asyncio
+
+import zstandard
+
+from database import AsyncSessionLocal, SessionLocal
+from models import AnalysisRecord
+from record_storage import RECORDS_PREVIEW_CHARS, ZSTD_MAGIC, compress_text, decompress_text
+from server import get_analysis_records
+
+ENDPOINT = "/test/record-storage"
+
+
+def _random_text(seed: int, words: int = 2000) -> str:
+    """잘 압축되지 않는 긴 응답 (압축 블록이 미리보기 앞부분보다 길어지도록)"""
+    rng = random.Random(seed)
+    letters = "가나다라마바사아자차카타파하abcdefgh"
+    return " ".join("".join(rng.choice(letters) for _ in range(rng.randint(1, 6))) for _ in range(words))
+
+
+def _list_records(**params):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await get_analysis_records(
+                limit=params.get("limit", 100),
+                endpoint=ENDPOINT,
+                cursor=None,
+                count="none",
+                view="summary",
+                fields=None,
+                skip=0,
+                db=db,
+            )
+    return asyncio.run(run())
+
+
+def test_compress_text_round_trip_with_zstd():
+    value = _random_text(0)
+    blob = compress_text(value)
+
+    assert blob is not None
+    assert blob[:4] == ZSTD_MAGIC
+    assert decompress_text(blob) == value
+
+
+def test_list_previews_of_zstd_compressed_responses():
+    responses = [_random_text(seed) for seed in range(3)]
+    db = SessionLocal(expire_on_commit=False)
+    records = [AnalysisRecord(endpoint=ENDPOINT, prompt="같은 프롬프트", response=text) for text in responses]
+    # 앞부분 블록 없이 한 번에 압축된 이전 형식 (전체를 읽어 미리보기를 만들어야 함)
+    legacy_text = _random_text(99)
+    legacy = AnalysisRecord(endpoint=ENDPOINT, prompt="같은 프롬프트")
+    legacy.response_compressed = zstandard.ZstdCompressor().compress(legacy_text.encode("utf-8"))
+    db.add_all(records + [legacy])
+    db.commit()
+    db.close()
+    assert all(record.response_compressed is not None and record._response is None for record in records)
+
+    items = {item["id"]: item for item in _list_records()["records"]}
+
+    for record, text in zip(records, responses):
+        item = items[record.id]
+        assert item["response"] == text[:RECORDS_PREVIEW_CHARS]
+        assert "response" in item["truncated"]
+    assert items[legacy.id]["response"] == legacy_text[:RECORDS_PREVIEW_CHARS]
+    assert "response" in items[legacy.id]["truncated"]
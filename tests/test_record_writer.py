@@ -0,0 +1,56 @@
+"""
+write-behind 저장: 일괄 저장 실패 후 개별 재시도, 이벤트 루프에서의 id 할당
+"""
+import asyncio
+
+import pytest
+
+from database import AsyncSessionLocal, SessionLocal
+from models import AnalysisRecord, PromptText
+from record_writer import IdAllocator, RecordWriter
+
+from test_record_storage import _random_text
+
+
+def test_batch_failure_retries_good_record_with_original_text():
+    prompt = "일괄 저장 실패 후 재시도되는 프롬프트"
+    response = _random_text(7)
+    good = AnalysisRecord(endpoint="/test/record-writer", prompt=prompt, response=response)
+    bad = AnalysisRecord(endpoint=None, prompt="endpoint가 없어 저장에 실패하는 레코드")
+
+    written = RecordWriter(enabled=False)._write([good, bad])
+
+    assert written == 1
+    db = SessionLocal()
+    try:
+        stored = db.get(AnalysisRecord, good.id)
+        assert stored is not None
+        assert stored.prompt_id is not None
+        assert db.get(PromptText, stored.prompt_id) is not None
+        assert stored.prompt == prompt
+        assert stored.response_compressed is not None
+        assert stored.response == response
+    finally:
+        db.close()
+
+
+def test_concurrent_async_id_allocation_does_not_block_loop():
+    allocator = IdAllocator(block_size=3)
+
+    async def allocate():
+        return await asyncio.wait_for(
+            asyncio.gather(*(allocator.next_id_async() for _ in range(20))), timeout=10
+        )
+
+    ids = asyncio.run(allocate())
+    assert len(set(ids)) == 20
+
+
+def test_async_session_insert_without_id_is_rejected():
+    async def insert():
+        async with AsyncSessionLocal() as db:
+            db.add(AnalysisRecord(endpoint="/test/record-writer", prompt="비동기 세션 INSERT"))
+            await asyncio.wait_for(db.commit(), timeout=10)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(insert())
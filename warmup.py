@@ -0,0 +1,133 @@
+"""
+모델 예열 및 keep-alive 관리
+서버 시작 시 설정된 모델을 모든 Ollama 노드에 미리 로드하고,
+주기적으로 keep_alive를 갱신하여 유휴 구간에도 모델이 언로드되지 않도록 한다.
+"""
+import os
+import time
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from metrics import metrics
+from model_routing import MODEL_NAME
+from ollama_client import OLLAMA_KEEP_ALIVE, Backend, OllamaError, OllamaPool, ollama_client
+
+# .env 파일 로드
+load_dotenv()
+
+# 예열 설정
+OLLAMA_PRELOAD_MODELS: List[str] = [
+    m.strip() for m in os.getenv("OLLAMA_PRELOAD_MODELS", MODEL_NAME).split(",") if m.strip()
+]
+OLLAMA_PRELOAD_TIMEOUT = float(os.getenv("OLLAMA_PRELOAD_TIMEOUT", "600"))  # 모델 로드 대기 (초)
+OLLAMA_KEEP_ALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEP_ALIVE_INTERVAL", "240"))  # keep_alive 갱신 주기 (초)
+
+
+class ModelWarmer:
+    """
+    노드별 모델 예열 상태 관리
+
+    상태: pending → warming → ready (실패 시 failed, 다음 갱신 주기에 재시도)
+    모든 예열 대상 모델이 적어도 하나의 노드에서 ready가 되면 준비 완료로 본다.
+    """
+
+    def __init__(
+        self,
+        pool: OllamaPool = ollama_client,
+        models: List[str] = OLLAMA_PRELOAD_MODELS,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        interval: float = OLLAMA_KEEP_ALIVE_INTERVAL,
+    ):
+        self.pool = pool
+        self.models = models
+        self.keep_alive = keep_alive or "5m"
+        self.interval = interval
+        self._states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._ready_callbacks: List[Callable[[], None]] = []
+
+    def _state(self, backend: Backend, model: str) -> Dict[str, Any]:
+        key = (backend.host, model)
+        if key not in self._states:
+            self._states[key] = {"status": "pending", "load_ms": None, "refreshed_at": None, "error": None}
+        return self._states[key]
+
+    async def warm(self, backend: Backend, model: str):
+        """노드 하나에 모델 로드 (이미 로드되어 있으면 keep_alive만 갱신)"""
+        state = self._state(backend, model)
+        if state["status"] != "ready":
+            state["status"] = "warming"
+        start = time.perf_counter()
+        try:
+            result = await backend.client.load(model, self.keep_alive, timeout=OLLAMA_PRELOAD_TIMEOUT)
+        except OllamaError as e:
+            state.update(status="failed", error=str(e))
+            metrics.inc("model_warmup_failures")
+            print(f"⚠️  모델 예열 실패 ({backend.host}, {model}): {e}")
+            return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        load_ms = result.get("load_duration", 0) / 1e6 if result.get("load_duration") else elapsed_ms
+        if state["status"] != "ready":
+            print(f"🔥 모델 예열 완료 ({backend.host}, {model}): {load_ms:.0f}ms")
+            metrics.observe("model_warmup_ms", load_ms)
+        was_ready = self.ready()
+        state.update(status="ready", load_ms=round(load_ms, 1), refreshed_at=time.time(), error=None)
+        backend.loaded_models.add(model)
+        if not was_ready and self.ready():
+            for callback in self._ready_callbacks:
+                callback()
+
+    def on_ready(self, callback: Callable[[], None]):
+        """모든 예열 대상 모델이 준비되는 순간 호출할 함수 등록 (이벤트 루프에서 호출됨)"""
+        self._ready_callbacks.append(callback)
+
+    async def warm_all(self):
+        """모든 노드에 모든 예열 대상 모델 로드 (노드 간 병렬, 노드 안에서는 순차)"""
+        async def warm_backend(backend: Backend):
+            for model in self.models:
+                await self.warm(backend, model)
+
+        await asyncio.gather(*(warm_backend(b) for b in self.pool.backends if b.available))
+
+    async def _loop(self):
+        while True:
+            await self.warm_all()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """예열 및 keep-alive 갱신 시작 (lifespan에서 호출, 서버 시작을 막지 않음)"""
+        if self._task is None and self.models:
+            for backend in self.pool.backends:
+                for model in self.models:
+                    self._state(backend, model)
+            self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def ready(self) -> bool:
+        """예열 대상 모델이 모두 하나 이상의 노드에 로드되었는지"""
+        return all(
+            any(state["status"] == "ready" for (host, m), state in self._states.items() if m == model)
+            for model in self.models
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready(),
+            "models": self.models,
+            "keep_alive": self.keep_alive,
+            "nodes": [
+                {"host": host, "model": model, **state}
+                for (host, model), state in sorted(self._states.items())
+            ],
+        }
+
+
+# 서버 전역 모델 예열 관리자
+model_warmer = ModelWarmer()